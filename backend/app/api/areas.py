@@ -59,7 +59,7 @@ async def get_area_stats(key_code: str):
     try:
         async with pool.acquire() as conn:
             area = await conn.fetchrow(
-                "SELECT key_code, moji, ST_AsGeoJSON(geometry, 8, 0) AS geom_json FROM citydb.census_boundaries WHERE key_code = $1",
+                "SELECT key_code, moji, jinko, setai, ST_AsGeoJSON(geometry, 8, 0) AS geom_json FROM citydb.census_boundaries WHERE key_code = $1",
                 key_code,
             )
             if not area:
@@ -116,6 +116,8 @@ async def get_area_stats(key_code: str):
     return {
         "key_code": area["key_code"],
         "moji": area["moji"],
+        "population": area["jinko"],
+        "households": area["setai"],
         "counts": {
             "buildings": buildings,
             "vegetation": vegetation,
@@ -129,7 +131,7 @@ async def get_area_stats(key_code: str):
 @router.get("/areas/{key_code}/buildings")
 async def export_area_buildings(key_code: str):
     """Return GeoJSON FeatureCollection of all building footprints within the area."""
-    pool = await get_pool()
+    pool = await get_pool("export")
     try:
         async with pool.acquire() as conn:
             area = await conn.fetchrow(
@@ -186,7 +188,7 @@ async def export_area_buildings(key_code: str):
 async def get_area_detail(key_code: str):
     """Return attrs + GeoJSON boundary polygon for a single census tract."""
     sql = """
-        SELECT key_code, pref, city, s_area, moji, kcode1,
+        SELECT key_code, pref, city, s_area, moji, kcode1, jinko, setai,
                ST_AsGeoJSON(geometry, 8, 0) AS geom_json
         FROM citydb.census_boundaries
         WHERE key_code = $1
@@ -208,5 +210,7 @@ async def get_area_detail(key_code: str):
         "s_area": row["s_area"],
         "moji": row["moji"],
         "kcode1": row["kcode1"],
+        "population": row["jinko"],
+        "households": row["setai"],
         "geometry": json.loads(row["geom_json"]),
     }
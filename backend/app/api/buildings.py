@@ -8,8 +8,8 @@ Note: All geometry queries use ST_FlipCoordinates() because 3DCityDB stores
 coordinates in (lat, lon) order (JGD2011 axis convention), but GeoJSON requires
 (lon, lat) order.
 
-Building footprints for the map overview are served as MVT vector tiles by Martin,
-not by this API. See data/migrations/001_building_footprints_mv.sql.
+Building footprints for the map overview are served as MVT vector tiles by
+app/api/tiles.py, not by this API. See data/migrations/002_building_footprints_table.sql.
 """
 
 import json
@@ -17,10 +17,14 @@ from decimal import Decimal
 from typing import Literal
 from fastapi import APIRouter, HTTPException
 from fastapi import Query as QueryParam
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
-from app.database import get_pool
+from app.config import get_settings
+from app.database import get_pool, is_replica_pool
+from app.services.cache import building_detail_cache, current_epoch
+from app.services.cityjson import VertexCollector
+from app.services.gltf import LOD1_OBJECTCLASS, GlbBuilder, surfaces_origin
 
 router = APIRouter()
 
@@ -46,38 +50,33 @@ _EXPORT_ATTR_SQL = """
     LIMIT 1
 """
 
-# LOD2 surfaces with Z coordinates (no ST_Force2D)
-_LOD2_3D_SQL = """
-    SELECT
-        ts.objectclass_id,
-        ST_AsGeoJSON(ST_FlipCoordinates(sg.geometry), 15, 0) AS geom_json
-    FROM citydb.building b
-    JOIN citydb.cityobject co ON co.id = b.id
-    JOIN citydb.thematic_surface ts ON ts.building_id = b.id
-    JOIN citydb.surface_geometry sg ON sg.root_id = ts.lod2_multi_surface_id
-    WHERE co.gmlid = $1
-      AND sg.geometry IS NOT NULL
-"""
-
-# LOD2 surfaces projected to EPSG:6677 (JGD2011 Japan Plane Rectangular CS IX, meters)
-# Used for CityJSON export — CityJSON requires a projected metric CRS.
-# ST_FlipCoordinates + ST_SetSRID(4326) is required because PostGIS/PROJ fails to
-# transform directly from EPSG:6668 (axis-order issue in stored SRID definition).
-# JGD2011 and WGS84 are practically identical for this purpose (<1m difference).
-_LOD2_3D_PROJECTED_SQL = """
-    SELECT
-        ts.objectclass_id,
-        ST_AsGeoJSON(ST_Transform(ST_SetSRID(ST_FlipCoordinates(sg.geometry), 4326), 6677), 6, 0) AS geom_json
+# LOD2 surfaces with Z coordinates, pre-encoded per building in
+# citydb.building_lod2_cache (migration 008) as [{objectclass_id, geometry}, ...]:
+#   surfaces_wgs84 — lon/lat/z for GeoJSON 3D
+#   surfaces_6677  — EPSG:6677 (JGD2011 Japan Plane Rectangular CS IX, metres) for
+#                    CityJSON, which requires a projected metric CRS.
+# A building without LOD2 has no row.
+_LOD2_WGS84_SQL = "SELECT surfaces_wgs84 FROM citydb.building_lod2_cache WHERE gmlid = $1"
+_LOD2_6677_SQL = "SELECT surfaces_6677 FROM citydb.building_lod2_cache WHERE gmlid = $1"
+
+# LOD1 solid faces in the surfaces_6677 shape, for GLB export of buildings
+# without LOD2 (not cached: only used as a fallback).
+_LOD1_6677_SQL = f"""
+    SELECT co.gmlid,
+           json_agg(json_build_object(
+               'objectclass_id', {LOD1_OBJECTCLASS},
+               'geometry', ST_AsGeoJSON(
+                   ST_Transform(ST_SetSRID(ST_FlipCoordinates(sg.geometry), 4326), 6677), 6, 0
+               )::json
+           ) ORDER BY sg.id) AS surfaces
     FROM citydb.building b
     JOIN citydb.cityobject co ON co.id = b.id
-    JOIN citydb.thematic_surface ts ON ts.building_id = b.id
-    JOIN citydb.surface_geometry sg ON sg.root_id = ts.lod2_multi_surface_id
-    WHERE co.gmlid = $1
-      AND sg.geometry IS NOT NULL
+    JOIN citydb.surface_geometry sg ON sg.root_id = b.lod1_solid_id
+    WHERE co.gmlid = ANY($1) AND sg.geometry IS NOT NULL
+    GROUP BY co.gmlid
 """
 
 _SURFACE_PROP = {33: "roof", 34: "wall", 35: "ground"}
-_CITYJSON_TYPE = {33: "RoofSurface", 34: "WallSurface", 35: "GroundSurface"}
 
 CLASS_LABELS = {
     "3001": "普通建物",
@@ -139,197 +138,140 @@ async def search_buildings_by_bbox(
 @router.get("/buildings/{gmlid}")
 async def get_building_detail(gmlid: str):
     """Return attributes + LOD1 + LOD2 geometry for a single building."""
-    pool = await get_pool()
-
-    # --- 1. Attributes ---
-    attr_sql = """
-        SELECT
-            co.gmlid,
-            co.name,
-            b.measured_height,
-            b.storeys_above_ground,
-            b.storeys_below_ground,
-            b.usage,
-            b.class,
-            (b.lod2_solid_id IS NOT NULL) AS has_lod2
+    return await load_building_detail(gmlid)
+
+
+# Whole detail document in one round trip: the building row is looked up once and
+# LOD1 / LOD2 / generic attributes are correlated on its id; PostgreSQL returns
+# the final JSON text, which is cached and sent as-is (no json.loads / dumps).
+# Labels are passed as jsonb ($2 usage, $3 class) so the codelists stay in Python.
+# Objectclass ids verified against citydb.objectclass:
+#   33=BuildingRoofSurface, 34=BuildingWallSurface, 35=BuildingGroundSurface
+_DETAIL_SQL = """
+    WITH bld AS (
+        SELECT b.id, co.gmlid, co.name, b.measured_height,
+               b.storeys_above_ground, b.storeys_below_ground,
+               b.usage, b.class, b.lod1_solid_id, b.lod2_solid_id
         FROM citydb.building b
         JOIN citydb.cityobject co ON co.id = b.id
         WHERE co.gmlid = $1 AND b.building_root_id = b.id
         LIMIT 1
-    """
+    ),
+    lod1 AS (
+        -- Union all solid faces projected to 2D → preserves concave shapes correctly
+        SELECT ST_FlipCoordinates(ST_Union(ST_Force2D(sg.geometry))) AS geom
+        FROM bld
+        JOIN citydb.surface_geometry sg ON sg.root_id = bld.lod1_solid_id
+        WHERE sg.geometry IS NOT NULL
+    ),
+    lod2 AS (
+        -- Pre-encoded surfaces from citydb.building_lod2_cache (migration 008)
+        SELECT (surf ->> 'objectclass_id')::int AS oc,
+               json_build_object(
+                   'type', 'Feature',
+                   'geometry', surf -> 'geometry',
+                   'properties', json_build_object('surface_type', (surf ->> 'objectclass_id')::int)
+               ) AS feature
+        FROM bld
+        JOIN citydb.building_lod2_cache c ON c.gmlid = bld.gmlid
+        CROSS JOIN LATERAL json_array_elements(c.surfaces_wgs84) AS surf
+    )
+    SELECT json_build_object(
+        'gmlid', bld.gmlid,
+        'attributes', json_build_object(
+            'name',                 NULLIF(bld.name, ''),
+            'measured_height',      NULLIF(bld.measured_height, 0)::float8,
+            'usage',                bld.usage,
+            'usage_label',          COALESCE($2::jsonb ->> bld.usage, '不明'),
+            'storeys_above_ground', CASE WHEN bld.storeys_above_ground NOT IN (0, 9999)
+                                         THEN bld.storeys_above_ground END,
+            'storeys_below_ground', CASE WHEN bld.storeys_below_ground NOT IN (0, 9999)
+                                         THEN bld.storeys_below_ground END,
+            'class',                bld.class,
+            'class_label',          COALESCE($3::jsonb ->> bld.class, ''),
+            'has_lod2',             bld.lod2_solid_id IS NOT NULL
+        ),
+        'generic_attrs', COALESCE((
+            SELECT json_agg(json_build_object(
+                'name', ga.attrname,
+                'value', CASE
+                    WHEN ga.datatype = 2 THEN to_json(ga.intval)
+                    WHEN ga.datatype IN (3, 6) THEN to_json(round(ga.realval::numeric, 3)::float8)
+                    ELSE to_json(ga.strval)
+                END
+            ) ORDER BY ga.attrname)
+            FROM citydb.cityobject_genericattrib ga
+            WHERE ga.cityobject_id = bld.id
+        ), '[]'::json),
+        -- Height used for fill-extrusion in the frontend
+        'lod1', json_build_object('type', 'FeatureCollection', 'features', COALESCE((
+            SELECT json_agg(json_build_object(
+                'type', 'Feature',
+                'geometry', ST_AsGeoJSON(lod1.geom, 15, 0)::json,
+                'properties', json_build_object('height',
+                    CASE WHEN bld.measured_height > 0 THEN bld.measured_height::float8 ELSE 10.0 END)
+            ))
+            FROM lod1 WHERE lod1.geom IS NOT NULL
+        ), '[]'::json)),
+        'lod2', (
+            SELECT json_build_object(
+                'wall',   json_build_object('type', 'FeatureCollection', 'features',
+                              COALESCE(json_agg(feature) FILTER (WHERE oc = 34), '[]'::json)),
+                'roof',   json_build_object('type', 'FeatureCollection', 'features',
+                              COALESCE(json_agg(feature) FILTER (WHERE oc = 33), '[]'::json)),
+                'ground', json_build_object('type', 'FeatureCollection', 'features',
+                              COALESCE(json_agg(feature) FILTER (WHERE oc = 35), '[]'::json))
+            )
+            FROM lod2
+        )
+    )::text AS doc
+    FROM bld
+"""
 
-    # --- 4. Generic attributes (uro: ADE overflow attributes) ---
-    generic_sql = """
-        SELECT ga.attrname, ga.datatype, ga.strval, ga.intval, ga.realval
-        FROM citydb.cityobject_genericattrib ga
-        JOIN citydb.building b ON b.id = ga.cityobject_id
-        JOIN citydb.cityobject co ON co.id = b.id
-        WHERE co.gmlid = $1
-        ORDER BY ga.attrname
-    """
+_USAGE_LABELS_JSON = json.dumps(USAGE_LABELS, ensure_ascii=False)
+_CLASS_LABELS_JSON = json.dumps(CLASS_LABELS, ensure_ascii=False)
 
-    # --- 2. LOD1 geometry — return single 2D footprint polygon ---
-    # Union all solid faces projected to 2D → preserves concave shapes correctly.
-    lod1_sql = """
-        SELECT ST_AsGeoJSON(
-            ST_FlipCoordinates(ST_Union(ST_Force2D(sg.geometry))),
-            15, 0
-        ) AS geom_json
-        FROM citydb.building b
-        JOIN citydb.cityobject co ON co.id = b.id
-        JOIN citydb.surface_geometry sg ON sg.root_id = b.lod1_solid_id
-        WHERE co.gmlid = $1
-          AND sg.geometry IS NOT NULL
-    """
 
-    # --- 3. LOD2 thematic surfaces ---
-    lod2_sql = """
-        SELECT
-            ts.objectclass_id,
-            ST_AsGeoJSON(ST_FlipCoordinates(sg.geometry), 15, 0) AS geom_json
-        FROM citydb.building b
-        JOIN citydb.cityobject co ON co.id = b.id
-        JOIN citydb.thematic_surface ts ON ts.building_id = b.id
-        JOIN citydb.surface_geometry sg ON sg.root_id = ts.lod2_multi_surface_id
-        WHERE co.gmlid = $1
-          AND sg.geometry IS NOT NULL
+async def load_building_detail(gmlid: str, workload: str = "interactive") -> Response:
     """
+    Build the GET /api/buildings/{gmlid} response, served from building_detail_cache
+    when possible. Write endpoints pass workload="write" to read their own changes
+    from the primary.
+    """
+    doc = building_detail_cache.get(gmlid)
+    if doc is None:
+        epoch = current_epoch()
+        pool = await get_pool(workload)
+        try:
+            async with pool.acquire() as conn:
+                doc = await conn.fetchval(_DETAIL_SQL, gmlid, _USAGE_LABELS_JSON, _CLASS_LABELS_JSON)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-    try:
-        async with pool.acquire() as conn:
-            attr_rows = await conn.fetch(attr_sql, gmlid)
-            lod1_rows = await conn.fetch(lod1_sql, gmlid)
-            lod2_rows = await conn.fetch(lod2_sql, gmlid)
-            generic_rows = await conn.fetch(generic_sql, gmlid)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-    if not attr_rows:
-        raise HTTPException(status_code=404, detail=f"Building not found: {gmlid}")
-
-    attr = attr_rows[0]
-
-    def make_feature(geom_json: str, props: dict = None) -> dict:
-        geom = json.loads(geom_json)
-        return {"type": "Feature", "geometry": geom, "properties": props or {}}
+        if doc is None:
+            raise HTTPException(status_code=404, detail=f"Building not found: {gmlid}")
+        # A lagging replica can still return the row from before a committed edit
+        if not is_replica_pool(pool):
+            building_detail_cache.put(gmlid, doc, size=len(doc), epoch=epoch)
 
-    # Height used for fill-extrusion in the frontend
-    lod1_height = (
-        float(attr["measured_height"])
-        if attr["measured_height"] and float(attr["measured_height"]) > 0
-        else 10.0
-    )
-
-    lod1_features = [
-        make_feature(r["geom_json"], {"height": lod1_height})
-        for r in lod1_rows
-        if r["geom_json"]
-    ]
-    lod1_fc = {
-        "type": "FeatureCollection",
-        "features": lod1_features,
-    }
-
-    # Split LOD2 surfaces by type
-    # Verified against citydb.objectclass: 33=BuildingRoofSurface, 34=BuildingWallSurface, 35=BuildingGroundSurface
-    wall_features, roof_features, ground_features = [], [], []
-    for r in lod2_rows:
-        if not r["geom_json"]:
-            continue
-        feat = make_feature(r["geom_json"], {"surface_type": r["objectclass_id"]})
-        oc = r["objectclass_id"]
-        if oc == 33:
-            roof_features.append(feat)
-        elif oc == 34:
-            wall_features.append(feat)
-        elif oc == 35:
-            ground_features.append(feat)
-
-    def fc(features):
-        return {"type": "FeatureCollection", "features": features}
-
-    def _generic_value(r):
-        dt = r["datatype"]
-        if dt == 1:
-            return r["strval"]
-        elif dt == 2:
-            return r["intval"]
-        elif dt in (3, 6):
-            v = r["realval"]
-            return round(float(v), 3) if v is not None else None
-        else:
-            return r["strval"]
-
-    return {
-        "gmlid": attr["gmlid"],
-        "attributes": {
-            "name": attr["name"] or None,
-            "measured_height": float(attr["measured_height"]) if attr["measured_height"] else None,
-            "usage": attr["usage"],
-            "usage_label": USAGE_LABELS.get(attr["usage"] or "", "不明"),
-            "storeys_above_ground": (
-                attr["storeys_above_ground"]
-                if attr["storeys_above_ground"] and attr["storeys_above_ground"] != 9999
-                else None
-            ),
-            "storeys_below_ground": (
-                attr["storeys_below_ground"]
-                if attr["storeys_below_ground"] and attr["storeys_below_ground"] != 9999
-                else None
-            ),
-            "class": attr["class"],
-            "class_label": CLASS_LABELS.get(attr["class"] or "", ""),
-            "has_lod2": bool(attr["has_lod2"]),
-        },
-        "generic_attrs": [
-            {"name": r["attrname"], "value": _generic_value(r)}
-            for r in generic_rows
-        ],
-        "lod1": lod1_fc,
-        "lod2": {
-            "wall": fc(wall_features),
-            "roof": fc(roof_features),
-            "ground": fc(ground_features),
-        },
-    }
+    return Response(content=doc, media_type="application/json")
 
 
 @router.get("/buildings/{gmlid}/export/geojson3d")
 async def export_building_lod2_geojson(gmlid: str):
     """Return LOD2 3D surfaces as GeoJSON FeatureCollection (with Z coordinates) for download."""
-    pool = await get_pool()
+    pool = await get_pool("export")
     try:
         async with pool.acquire() as conn:
             attr_rows = await conn.fetch(_EXPORT_ATTR_SQL, gmlid)
-            lod2_rows = await conn.fetch(_LOD2_3D_SQL, gmlid)
+            surfaces_json = await conn.fetchval(_LOD2_WGS84_SQL, gmlid)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     if not attr_rows:
         raise HTTPException(status_code=404, detail=f"Building not found: {gmlid}")
 
-    attr = attr_rows[0]
-    height = (
-        float(attr["measured_height"])
-        if attr["measured_height"] and float(attr["measured_height"]) > 0
-        else None
-    )
-
-    features = []
-    for row in lod2_rows:
-        geom = json.loads(row["geom_json"])
-        oc = row["objectclass_id"]
-        features.append({
-            "type": "Feature",
-            "geometry": geom,
-            "properties": {
-                "gmlid": attr["gmlid"],
-                "surface_type": _SURFACE_PROP.get(oc, "unknown"),
-                "measured_height": height,
-                "usage": attr["usage"],
-            },
-        })
-
+    features = _building_geojson3d_features(gmlid, attr_rows[0], json.loads(surfaces_json or "[]"))
     fc = {"type": "FeatureCollection", "features": features}
     filename = f"{gmlid}_lod2_3d.geojson"
     return Response(
@@ -342,95 +284,32 @@ async def export_building_lod2_geojson(gmlid: str):
 @router.get("/buildings/{gmlid}/export/cityjson")
 async def export_building_cityjson(gmlid: str):
     """Return LOD2 3D surfaces as CityJSON 1.1 for download."""
-    pool = await get_pool()
+    pool = await get_pool("export")
     try:
         async with pool.acquire() as conn:
             attr_rows = await conn.fetch(_EXPORT_ATTR_SQL, gmlid)
-            lod2_rows = await conn.fetch(_LOD2_3D_PROJECTED_SQL, gmlid)
+            surfaces_json = await conn.fetchval(_LOD2_6677_SQL, gmlid)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     if not attr_rows:
         raise HTTPException(status_code=404, detail=f"Building not found: {gmlid}")
 
-    attr = attr_rows[0]
-    height = (
-        float(attr["measured_height"])
-        if attr["measured_height"] and float(attr["measured_height"]) > 0
-        else None
-    )
-    storeys = (
-        attr["storeys_above_ground"]
-        if attr["storeys_above_ground"] and attr["storeys_above_ground"] != 9999
-        else None
-    )
-
-    # Build CityJSON vertex list + Solid boundary references
-    vertices: list[list[float]] = []
-    vertex_map: dict[tuple, int] = {}
-    shell: list = []        # list of faces (each face = list of rings)
-    semantic_surfaces: list[dict] = []
-    semantic_values: list[int] = []
-
-    def get_vertex_idx(coord: list) -> int:
-        key = tuple(round(c, 10) for c in coord)
-        if key not in vertex_map:
-            vertex_map[key] = len(vertices)
-            vertices.append(list(key))
-        return vertex_map[key]
-
-    for row in lod2_rows:
-        geom = json.loads(row["geom_json"])
-        oc = row["objectclass_id"]
-        sem_idx = len(semantic_surfaces)
-        semantic_surfaces.append({"type": _CITYJSON_TYPE.get(oc, "WallSurface")})
-
-        polygons = (
-            [geom["coordinates"]] if geom["type"] == "Polygon"
-            else geom["coordinates"] if geom["type"] == "MultiPolygon"
-            else []
-        )
-        for poly_coords in polygons:
-            face = [[get_vertex_idx(v) for v in ring] for ring in poly_coords]
-            shell.append(face)
-            semantic_values.append(sem_idx)
-
-    # CityJSON Solid: boundaries = [shell], semantics.values = [shell_values]
-    geometry = []
-    if shell:
-        geometry = [{
-            "type": "Solid",
-            "lod": "2",
-            "boundaries": [shell],
-            "semantics": {
-                "surfaces": semantic_surfaces,
-                "values": [semantic_values],
-            },
-        }]
-
-    building_attrs = {"gmlid": attr["gmlid"]}
-    if height is not None:
-        building_attrs["measuredHeight"] = height
-    if attr["usage"]:
-        building_attrs["usage"] = attr["usage"]
-        building_attrs["usageLabel"] = USAGE_LABELS.get(attr["usage"], "不明")
-    if storeys is not None:
-        building_attrs["storeysAboveGround"] = storeys
+    precision = get_settings().cityjson_precision
+    collector = VertexCollector()
+    pending = collector.add_surfaces(json.loads(surfaces_json or "[]"))
+    vertices, transform = collector.finish(precision)
 
     cityjson = {
         "type": "CityJSON",
         "version": "1.1",
-        "transform": {"scale": [1.0, 1.0, 1.0], "translate": [0.0, 0.0, 0.0]},
+        "transform": transform,
         "metadata": {
             "referenceSystem": "urn:ogc:def:crs:EPSG::6677"
         },
         "vertices": vertices,
         "CityObjects": {
-            gmlid: {
-                "type": "Building",
-                "attributes": building_attrs,
-                "geometry": geometry,
-            }
+            gmlid: _building_cityobject(gmlid, attr_rows[0], pending.resolve(collector)),
         },
     }
 
@@ -442,22 +321,253 @@ async def export_building_cityjson(gmlid: str):
     )
 
 
+def _glb_extras(attr) -> dict:
+    extras = {"gmlid": attr["gmlid"]}
+    height = _export_height(attr)
+    if height is not None:
+        extras["measuredHeight"] = height
+    if attr["usage"]:
+        extras["usage"] = attr["usage"]
+    return extras
+
+
+@router.get("/buildings/{gmlid}/export/glb")
+async def export_building_glb(gmlid: str):
+    """Return LOD2 surfaces (LOD1 solid if no LOD2) triangulated as binary glTF for download."""
+    pool = await get_pool("export")
+    try:
+        async with pool.acquire() as conn:
+            attr_rows = await conn.fetch(_EXPORT_ATTR_SQL, gmlid)
+            surfaces_json = await conn.fetchval(_LOD2_6677_SQL, gmlid)
+            if attr_rows and surfaces_json is None:
+                lod1 = await conn.fetchrow(_LOD1_6677_SQL, [gmlid])
+                surfaces_json = lod1["surfaces"] if lod1 else None
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not attr_rows:
+        raise HTTPException(status_code=404, detail=f"Building not found: {gmlid}")
+
+    surfaces = json.loads(surfaces_json or "[]")
+    builder = GlbBuilder(surfaces_origin(surfaces))
+    builder.add_building(gmlid, surfaces, _glb_extras(attr_rows[0]))
+    if builder.is_empty:
+        raise HTTPException(status_code=404, detail=f"No 3D geometry for building: {gmlid}")
+
+    return Response(
+        content=builder.to_glb(),
+        media_type="model/gltf-binary",
+        headers={"Content-Disposition": f'attachment; filename="{gmlid}.glb"'},
+    )
+
+
 # ── Batch export ──
+#
+# geojson3d / geojsonseq / cityjsonseq stream from a server-side cursor ordered
+# by gmlid: one building is encoded and flushed at a time, so memory stays flat
+# however many buildings are selected (whole districts included).
+# cityjson (a single document) needs one shared vertex list for the whole file,
+# so it is still built in memory and keeps the 500-building cap. glb also has to
+# be assembled before its header can be written, but its typed-array buffers are
+# compact, so the cap is higher.
+
+_BATCH_CITYJSON_MAX = 500
+_BATCH_GLB_MAX = 5000
+
 
 class BatchExportRequest(BaseModel):
     gmlids: list[str]
-    format: Literal["geojson3d", "cityjson"]
+    format: Literal["geojson3d", "geojsonseq", "cityjson", "cityjsonseq", "glb"]
+
+
+_BATCH_STREAM_SQL = """
+    SELECT co.gmlid, b.measured_height, b.usage, b.class,
+           b.storeys_above_ground, c.{column} AS surfaces
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    LEFT JOIN citydb.building_lod2_cache c ON c.gmlid = co.gmlid
+    WHERE co.gmlid = ANY($1) AND b.building_root_id = b.id
+    ORDER BY co.gmlid
+"""
 
 
 @router.post("/buildings/export/batch")
 async def export_buildings_batch(body: BatchExportRequest):
-    """Export multiple buildings as GeoJSON 3D or CityJSON."""
+    """Export multiple buildings as GeoJSON 3D, GeoJSONSeq, CityJSON, CityJSONSeq or GLB."""
     if not body.gmlids:
         raise HTTPException(status_code=400, detail="No gmlids provided")
-    if len(body.gmlids) > 500:
-        raise HTTPException(status_code=400, detail="Too many buildings (max 500)")
     gmlids = list(dict.fromkeys(body.gmlids))  # deduplicate, preserve order
 
+    if body.format == "cityjson":
+        if len(gmlids) > _BATCH_CITYJSON_MAX:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many buildings for a single CityJSON file (max {_BATCH_CITYJSON_MAX}); "
+                       "use format=cityjsonseq",
+            )
+        return await _build_batch_cityjson(gmlids)
+
+    if body.format == "glb":
+        if len(gmlids) > _BATCH_GLB_MAX:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many buildings for a single GLB file (max {_BATCH_GLB_MAX})",
+            )
+        return await _build_batch_glb(gmlids)
+
+    if body.format == "geojson3d":
+        content, media_type, ext = _stream_geojson3d(gmlids), "application/geo+json", "geojson"
+    elif body.format == "geojsonseq":
+        content, media_type, ext = _stream_geojsonseq(gmlids), "application/geo+json-seq", "geojsons"
+    else:
+        content, media_type, ext = _stream_cityjsonseq(gmlids), "application/city+json-seq", "city.jsonl"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="batch_{len(gmlids)}bldg.{ext}"'},
+    )
+
+
+async def _iter_batch_rows(gmlids: list[str], column: str):
+    """Yield one row per building (attributes + pre-encoded surfaces) from a server-side cursor."""
+    pool = await get_pool("export")
+    async with pool.acquire() as conn:
+        async with conn.transaction(readonly=True):
+            async for row in conn.cursor(_BATCH_STREAM_SQL.format(column=column), gmlids, prefetch=100):
+                yield row
+
+
+def _export_height(attr) -> float | None:
+    if attr and attr["measured_height"] and float(attr["measured_height"]) > 0:
+        return float(attr["measured_height"])
+    return None
+
+
+def _building_geojson3d_features(gmlid: str, attr, surfaces: list) -> list[dict]:
+    height = _export_height(attr)
+    usage = attr["usage"] if attr else None
+    return [
+        {
+            "type": "Feature",
+            "geometry": surface["geometry"],
+            "properties": {
+                "gmlid": gmlid,
+                "surface_type": _SURFACE_PROP.get(surface["objectclass_id"], "unknown"),
+                "measured_height": height,
+                "usage": usage,
+            },
+        }
+        for surface in surfaces
+    ]
+
+
+def _building_cityobject(gmlid: str, attr, geometry: list) -> dict:
+    """CityJSON Building object from export attributes and resolved geometry."""
+    building_attrs = {"gmlid": gmlid}
+    if attr:
+        height = _export_height(attr)
+        storeys = (
+            attr["storeys_above_ground"]
+            if attr["storeys_above_ground"] and attr["storeys_above_ground"] != 9999
+            else None
+        )
+        if height is not None:
+            building_attrs["measuredHeight"] = height
+        if attr["usage"]:
+            building_attrs["usage"] = attr["usage"]
+            building_attrs["usageLabel"] = USAGE_LABELS.get(attr["usage"], "不明")
+        if storeys is not None:
+            building_attrs["storeysAboveGround"] = storeys
+
+    return {
+        "type": "Building",
+        "attributes": building_attrs,
+        "geometry": geometry,
+    }
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, cls=_DecimalEncoder)
+
+
+async def _stream_geojson3d(gmlids: list[str]):
+    """One FeatureCollection, written feature by feature."""
+    yield '{"type": "FeatureCollection", "features": ['
+    sep = ""
+    async for row in _iter_batch_rows(gmlids, "surfaces_wgs84"):
+        features = _building_geojson3d_features(row["gmlid"], row, json.loads(row["surfaces"] or "[]"))
+        if features:
+            yield sep + ", ".join(_dumps(f) for f in features)
+            sep = ", "
+    yield "]}"
+
+
+async def _stream_geojsonseq(gmlids: list[str]):
+    """GeoJSON Text Sequence (RFC 8142): RS + feature + LF per surface."""
+    async for row in _iter_batch_rows(gmlids, "surfaces_wgs84"):
+        features = _building_geojson3d_features(row["gmlid"], row, json.loads(row["surfaces"] or "[]"))
+        if features:
+            yield "".join(f"\x1e{_dumps(f)}\n" for f in features)
+
+
+def _cityjsonseq_header(translate: list[float]) -> str:
+    return _dumps({
+        "type": "CityJSON",
+        "version": "1.1",
+        "transform": {"scale": [get_settings().cityjson_precision] * 3, "translate": translate},
+        "metadata": {
+            "referenceSystem": "urn:ogc:def:crs:EPSG::6677"
+        },
+        "CityObjects": {},
+        "vertices": [],
+    }) + "\n"
+
+
+def _cityjsonseq_feature(row, collector: VertexCollector, pending, translate: list[float]) -> str:
+    gmlid = row["gmlid"]
+    vertices, _ = collector.finish(get_settings().cityjson_precision, translate)
+    return _dumps({
+        "type": "CityJSONFeature",
+        "id": gmlid,
+        "CityObjects": {gmlid: _building_cityobject(gmlid, row, pending.resolve(collector))},
+        "vertices": vertices,
+    }) + "\n"
+
+
+async def _stream_cityjsonseq(gmlids: list[str]):
+    """
+    CityJSON Text Sequence: a CityJSON header line, then one CityJSONFeature per building.
+
+    Feature vertices must use the header's transform, which is written before
+    the remaining geometry is known: translate is taken from the first building
+    with LOD2 surfaces (buildings without any are held back until then), and
+    later buildings simply get (possibly negative) offsets from it. The header
+    is written even when no building has geometry or none was found.
+    """
+    translate = None
+    held = []   # (row, collector, pending) of buildings without surfaces, before the header
+    async for row in _iter_batch_rows(gmlids, "surfaces_6677"):
+        surfaces = json.loads(row["surfaces"] or "[]")
+        collector = VertexCollector()
+        pending = collector.add_surfaces(surfaces)
+        if translate is None:
+            if not surfaces:
+                held.append((row, collector, pending))
+                continue
+            translate = collector.min_corner()
+            yield _cityjsonseq_header(translate)
+            for held_row, held_collector, held_pending in held:
+                yield _cityjsonseq_feature(held_row, held_collector, held_pending, translate)
+            held = []
+        yield _cityjsonseq_feature(row, collector, pending, translate)
+    if translate is None:
+        translate = [0.0, 0.0, 0.0]
+        yield _cityjsonseq_header(translate)
+        for held_row, held_collector, held_pending in held:
+            yield _cityjsonseq_feature(held_row, held_collector, held_pending, translate)
+
+
+async def _build_batch_cityjson(gmlids: list[str]) -> Response:
     attr_sql = """
         SELECT co.gmlid, b.measured_height, b.usage, b.class,
                b.storeys_above_ground, (b.lod2_solid_id IS NOT NULL) AS has_lod2
@@ -465,28 +575,12 @@ async def export_buildings_batch(body: BatchExportRequest):
         JOIN citydb.cityobject co ON co.id = b.id
         WHERE co.gmlid = ANY($1) AND b.building_root_id = b.id
     """
-    # GeoJSON 3D uses lon/lat; CityJSON uses projected metric CRS (EPSG:6677)
-    if body.format == "cityjson":
-        lod2_sql = """
-            SELECT co.gmlid, ts.objectclass_id,
-                   ST_AsGeoJSON(ST_Transform(ST_SetSRID(ST_FlipCoordinates(sg.geometry), 4326), 6677), 6, 0) AS geom_json
-            FROM citydb.building b
-            JOIN citydb.cityobject co ON co.id = b.id
-            JOIN citydb.thematic_surface ts ON ts.building_id = b.id
-            JOIN citydb.surface_geometry sg ON sg.root_id = ts.lod2_multi_surface_id
-            WHERE co.gmlid = ANY($1) AND sg.geometry IS NOT NULL
-        """
-    else:
-        lod2_sql = """
-            SELECT co.gmlid, ts.objectclass_id,
-                   ST_AsGeoJSON(ST_FlipCoordinates(sg.geometry), 15, 0) AS geom_json
-            FROM citydb.building b
-            JOIN citydb.cityobject co ON co.id = b.id
-            JOIN citydb.thematic_surface ts ON ts.building_id = b.id
-            JOIN citydb.surface_geometry sg ON sg.root_id = ts.lod2_multi_surface_id
-            WHERE co.gmlid = ANY($1) AND sg.geometry IS NOT NULL
-        """
-    pool = await get_pool()
+    lod2_sql = """
+        SELECT gmlid, surfaces_6677 AS surfaces
+        FROM citydb.building_lod2_cache
+        WHERE gmlid = ANY($1)
+    """
+    pool = await get_pool("export")
     try:
         async with pool.acquire() as conn:
             attr_rows = await conn.fetch(attr_sql, gmlids)
@@ -495,127 +589,22 @@ async def export_buildings_batch(body: BatchExportRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
     attrs = {r["gmlid"]: r for r in attr_rows}
-    surfaces_by_gmlid: dict[str, list] = {}
-    for r in lod2_rows:
-        surfaces_by_gmlid.setdefault(r["gmlid"], []).append(r)
-
-    if body.format == "geojson3d":
-        return _build_batch_geojson3d(gmlids, attrs, surfaces_by_gmlid)
-    return _build_batch_cityjson(gmlids, attrs, surfaces_by_gmlid)
-
-
-def _build_batch_geojson3d(gmlids, attrs, surfaces_by_gmlid):
-    features = []
-    for gmlid in gmlids:
-        attr = attrs.get(gmlid)
-        surfaces = surfaces_by_gmlid.get(gmlid, [])
-        height = None
-        usage = None
-        if attr:
-            height = (
-                float(attr["measured_height"])
-                if attr["measured_height"] and float(attr["measured_height"]) > 0
-                else None
-            )
-            usage = attr["usage"]
-        for row in surfaces:
-            geom = json.loads(row["geom_json"])
-            oc = row["objectclass_id"]
-            features.append({
-                "type": "Feature",
-                "geometry": geom,
-                "properties": {
-                    "gmlid": gmlid,
-                    "surface_type": _SURFACE_PROP.get(oc, "unknown"),
-                    "measured_height": height,
-                    "usage": usage,
-                },
-            })
-    fc = {"type": "FeatureCollection", "features": features}
-    return Response(
-        content=json.dumps(fc, ensure_ascii=False, cls=_DecimalEncoder),
-        media_type="application/geo+json",
-        headers={"Content-Disposition": f'attachment; filename="batch_{len(gmlids)}bldg.geojson"'},
-    )
-
-
-def _build_batch_cityjson(gmlids, attrs, surfaces_by_gmlid):
-    vertices: list[list[float]] = []
-    vertex_map: dict[tuple, int] = {}
-    city_objects: dict = {}
-
-    def get_vertex_idx(coord: list) -> int:
-        key = tuple(round(c, 10) for c in coord)
-        if key not in vertex_map:
-            vertex_map[key] = len(vertices)
-            vertices.append(list(key))
-        return vertex_map[key]
-
-    for gmlid in gmlids:
-        attr = attrs.get(gmlid)
-        surfaces = surfaces_by_gmlid.get(gmlid, [])
-
-        shell: list = []
-        semantic_surfaces: list[dict] = []
-        semantic_values: list[int] = []
-
-        for row in surfaces:
-            geom = json.loads(row["geom_json"])
-            oc = row["objectclass_id"]
-            sem_idx = len(semantic_surfaces)
-            semantic_surfaces.append({"type": _CITYJSON_TYPE.get(oc, "WallSurface")})
-            polygons = (
-                [geom["coordinates"]] if geom["type"] == "Polygon"
-                else geom["coordinates"] if geom["type"] == "MultiPolygon"
-                else []
-            )
-            for poly_coords in polygons:
-                face = [[get_vertex_idx(v) for v in ring] for ring in poly_coords]
-                shell.append(face)
-                semantic_values.append(sem_idx)
-
-        geometry = []
-        if shell:
-            geometry = [{
-                "type": "Solid",
-                "lod": "2",
-                "boundaries": [shell],
-                "semantics": {
-                    "surfaces": semantic_surfaces,
-                    "values": [semantic_values],
-                },
-            }]
-
-        building_attrs = {"gmlid": gmlid}
-        if attr:
-            height = (
-                float(attr["measured_height"])
-                if attr["measured_height"] and float(attr["measured_height"]) > 0
-                else None
-            )
-            storeys = (
-                attr["storeys_above_ground"]
-                if attr["storeys_above_ground"] and attr["storeys_above_ground"] != 9999
-                else None
-            )
-            if height is not None:
-                building_attrs["measuredHeight"] = height
-            if attr["usage"]:
-                building_attrs["usage"] = attr["usage"]
-                building_attrs["usageLabel"] = USAGE_LABELS.get(attr["usage"], "不明")
-            if storeys is not None:
-                building_attrs["storeysAboveGround"] = storeys
-
-        city_objects[gmlid] = {
-            "type": "Building",
-            "attributes": building_attrs,
-            "geometry": geometry,
-        }
+    surfaces_by_gmlid: dict[str, list] = {r["gmlid"]: json.loads(r["surfaces"]) for r in lod2_rows}
+
+    # One collector for the whole file so shared corners between adjoining
+    # buildings are stored once.
+    collector = VertexCollector()
+    pending = {gmlid: collector.add_surfaces(surfaces_by_gmlid.get(gmlid, [])) for gmlid in gmlids}
+    vertices, transform = collector.finish(get_settings().cityjson_precision)
+    city_objects: dict = {
+        gmlid: _building_cityobject(gmlid, attrs.get(gmlid), pending[gmlid].resolve(collector))
+        for gmlid in gmlids
+    }
 
     cityjson = {
         "type": "CityJSON",
         "version": "1.1",
-        "transform": {"scale": [1.0, 1.0, 1.0], "translate": [0.0, 0.0, 0.0]},
+        "transform": transform,
         "metadata": {
             "referenceSystem": "urn:ogc:def:crs:EPSG::6677"
         },
@@ -623,7 +612,43 @@ def _build_batch_cityjson(gmlids, attrs, surfaces_by_gmlid):
         "CityObjects": city_objects,
     }
     return Response(
-        content=json.dumps(cityjson, ensure_ascii=False, cls=_DecimalEncoder),
+        content=_dumps(cityjson),
         media_type="application/json",
         headers={"Content-Disposition": f'attachment; filename="batch_{len(gmlids)}bldg.city.json"'},
     )
+
+
+async def _build_batch_glb(gmlids: list[str]) -> Response:
+    """All selected buildings as nodes of one GLB, positioned around a shared origin."""
+    builder = None
+    lod1_attrs = {}   # buildings without LOD2 → LOD1 solid fallback
+    try:
+        async for row in _iter_batch_rows(gmlids, "surfaces_6677"):
+            if row["surfaces"] is None:
+                lod1_attrs[row["gmlid"]] = row
+                continue
+            surfaces = json.loads(row["surfaces"])
+            if builder is None:
+                builder = GlbBuilder(surfaces_origin(surfaces))
+            builder.add_building(row["gmlid"], surfaces, _glb_extras(row))
+
+        if lod1_attrs:
+            pool = await get_pool("export")
+            async with pool.acquire() as conn:
+                lod1_rows = await conn.fetch(_LOD1_6677_SQL, list(lod1_attrs))
+            for row in lod1_rows:
+                surfaces = json.loads(row["surfaces"])
+                if builder is None:
+                    builder = GlbBuilder(surfaces_origin(surfaces))
+                builder.add_building(row["gmlid"], surfaces, _glb_extras(lod1_attrs[row["gmlid"]]))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if builder is None or builder.is_empty:
+        raise HTTPException(status_code=404, detail="No 3D geometry for the selected buildings")
+
+    return Response(
+        content=builder.to_glb(),
+        media_type="model/gltf-binary",
+        headers={"Content-Disposition": f'attachment; filename="batch_{len(gmlids)}bldg.glb"'},
+    )
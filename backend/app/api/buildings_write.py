@@ -1,7 +1,9 @@
 """
 Building CRUD write endpoints.
 
+PATCH  /api/buildings               — update attributes of many buildings at once
 PATCH  /api/buildings/{gmlid}       — update attributes
+DELETE /api/buildings               — delete every building inside an area / polygon
 DELETE /api/buildings/{gmlid}       — cascade delete building
 PUT    /api/buildings/{gmlid}/lod1  — replace LOD1 footprint geometry
 PUT    /api/buildings/{gmlid}/lod2  — replace LOD2 thematic surfaces
@@ -10,16 +12,22 @@ Read path (GET /api/buildings/{gmlid}) remains in buildings.py, unchanged.
 """
 
 import json
-import uuid
 from typing import Literal, Optional
 
+import asyncpg
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, field_validator
 
 from app.database import get_pool
-from app.database_write import update_building_footprint, delete_building_footprint
+from app.database_write import (
+    delete_buildings,
+    replace_lod1_solid,
+    replace_lod2_surfaces,
+)
 from app.api.buildings import USAGE_LABELS
-from app.services.versioning import archive_and_next_version, insert_version
+from app.services import footprint_queue
+from app.services.cache import building_detail_cache, bump_write_epoch
+from app.services.versioning import record_version, record_versions
 
 router = APIRouter()
 
@@ -56,6 +64,71 @@ class BuildingPatch(BaseModel):
         return v
 
 
+class BuildingPatchItem(BuildingPatch):
+    gmlid: str
+
+
+def _validate_area_polygon(v: dict | None) -> dict | None:
+    """Shape check of a GeoJSON Polygon / MultiPolygon filter (lon/lat positions, closed rings)."""
+    if v is None:
+        return v
+    kind, coords = v.get("type"), v.get("coordinates")
+    if kind not in ("Polygon", "MultiPolygon") or not isinstance(coords, list) or not coords:
+        raise ValueError("polygon must be a GeoJSON Polygon or MultiPolygon with coordinates")
+    for polygon in ([coords] if kind == "Polygon" else coords):
+        if not isinstance(polygon, list) or not polygon:
+            raise ValueError("polygon has an empty or malformed polygon")
+        for ring in polygon:
+            if not isinstance(ring, list) or len(ring) < 4:
+                raise ValueError("polygon rings need at least 4 positions")
+            for pos in ring:
+                if (not isinstance(pos, list) or len(pos) not in (2, 3)
+                        or not all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in pos)):
+                    raise ValueError("polygon positions must be [lon, lat] numbers")
+            if ring[0][:2] != ring[-1][:2]:
+                raise ValueError("polygon rings must be closed (first position = last)")
+    return v
+
+
+class BuildingFilter(BaseModel):
+    gmlids: Optional[list[str]] = None
+    bbox: Optional[list[float]] = None   # lon_min, lat_min, lon_max, lat_max (WGS84)
+    area: Optional[str] = None           # census_boundaries.key_code
+    polygon: Optional[dict] = None       # GeoJSON Polygon / MultiPolygon (WGS84)
+    usage: Optional[str] = None
+
+    @field_validator("bbox")
+    @classmethod
+    def _validate_bbox(cls, v):
+        if v is not None and len(v) != 4:
+            raise ValueError("bbox must be [lon_min, lat_min, lon_max, lat_max]")
+        return v
+
+    @field_validator("polygon")
+    @classmethod
+    def _validate_polygon(cls, v):
+        return _validate_area_polygon(v)
+
+
+class BuildingBulkPatch(BaseModel):
+    """Either per-building patches, or one patch applied to every building matching a filter."""
+    patches: Optional[list[BuildingPatchItem]] = None
+    filter: Optional[BuildingFilter] = None
+    patch: Optional[BuildingPatch] = None
+
+
+class BuildingAreaDelete(BaseModel):
+    """A census tract (area) or a GeoJSON polygon; buildings entirely inside are deleted."""
+    area: Optional[str] = None
+    polygon: Optional[dict] = None
+    dry_run: bool = False
+
+    @field_validator("polygon")
+    @classmethod
+    def _validate_polygon(cls, v):
+        return _validate_area_polygon(v)
+
+
 class Lod1Put(BaseModel):
     polygon: dict   # GeoJSON Polygon (WGS84 lon/lat)
     height: float   # building height in metres
@@ -72,9 +145,15 @@ class Lod2Put(BaseModel):
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
 
+def _invalidate_caches(gmlid: str) -> None:
+    """Drop cached reads of this building once its write transaction has ended."""
+    building_detail_cache.invalidate(gmlid)
+    bump_write_epoch()
+
+
 async def _get_building_row(gmlid: str):
     """Return the building row (id, lod1_solid_id, lod2_solid_id) for a root building."""
-    pool = await get_pool()
+    pool = await get_pool("write")
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
             """
@@ -89,17 +168,16 @@ async def _get_building_row(gmlid: str):
     return row
 
 
-async def _get_building_version_snapshot(conn, building_id: int) -> dict:
-    row = await conn.fetchrow(
-        """
-        SELECT co.name, b.measured_height, b.storeys_above_ground, b.usage, b.class,
-               b.lod1_solid_id, b.lod2_solid_id
-        FROM citydb.building b
-        JOIN citydb.cityobject co ON co.id = b.id
-        WHERE b.id = $1
-        """,
-        building_id,
-    )
+_SNAPSHOT_SQL = """
+    SELECT b.id, co.gmlid, co.name, b.measured_height, b.storeys_above_ground, b.usage, b.class,
+           b.lod1_solid_id, b.lod2_solid_id
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    WHERE b.id = ANY($1)
+"""
+
+
+def _snapshot_from_row(row) -> dict:
     return {
         "name": row["name"],
         "measured_height": row["measured_height"],
@@ -111,6 +189,17 @@ async def _get_building_version_snapshot(conn, building_id: int) -> dict:
     }
 
 
+async def _get_building_version_snapshot(conn, building_id: int) -> dict:
+    row = (await conn.fetch(_SNAPSHOT_SQL, [building_id]))[0]
+    return _snapshot_from_row(row)
+
+
+async def _get_building_version_snapshots(conn, building_ids: list[int]) -> dict[int, tuple[str, dict]]:
+    """building id → (gmlid, version snapshot), one query for all of them."""
+    rows = await conn.fetch(_SNAPSHOT_SQL, building_ids)
+    return {r["id"]: (r["gmlid"], _snapshot_from_row(r)) for r in rows}
+
+
 def _build_lod1_faces(coordinates: list, height: float) -> list[str]:
     """
     Compute WKT POLYGON Z strings for LOD1 solid faces (ground, roof, walls).
@@ -171,6 +260,197 @@ def _geojson_polygon_to_wkt_6668(coords: list) -> str:
     return f"POLYGON Z({', '.join(rings)})"
 
 
+# ── PATCH /api/buildings ──────────────────────────────────────────────────────
+
+_BULK_PATCH_MAX = 5000
+
+# One row per building; each column is only written where its set_* flag is true
+_BULK_UPDATE_BUILDING_SQL = """
+    UPDATE citydb.building b
+    SET usage                = CASE WHEN p.set_usage   THEN p.usage           ELSE b.usage END,
+        measured_height      = CASE WHEN p.set_height  THEN p.measured_height ELSE b.measured_height END,
+        storeys_above_ground = CASE WHEN p.set_storeys THEN p.storeys         ELSE b.storeys_above_ground END
+    FROM unnest($1::bigint[], $2::bool[], $3::text[], $4::bool[], $5::float8[], $6::bool[], $7::int[])
+        AS p(id, set_usage, usage, set_height, measured_height, set_storeys, storeys)
+    WHERE b.id = p.id AND (p.set_usage OR p.set_height OR p.set_storeys)
+"""
+
+_BULK_UPDATE_NAME_SQL = """
+    UPDATE citydb.cityobject co
+    SET name = p.name
+    FROM unnest($1::bigint[], $2::text[]) AS p(id, name)
+    WHERE co.id = p.id
+"""
+
+
+def _patch_columns(patch: BuildingPatch) -> tuple:
+    """
+    (set_name, name, set_usage, usage, set_height, height, set_storeys, storeys) with the
+    same rules as PATCH /api/buildings/{gmlid}: an explicit null height or storey count
+    stores the "unknown" sentinel.
+    """
+    fields = patch.model_fields_set
+    set_height = patch.measured_height is not None or "measured_height" in fields
+    set_storeys = patch.storeys_above_ground is not None or "storeys_above_ground" in fields
+    return (
+        patch.name is not None, patch.name or None,
+        patch.usage is not None, patch.usage or None,
+        set_height, patch.measured_height if patch.measured_height is not None else -9999.0,
+        set_storeys, patch.storeys_above_ground if patch.storeys_above_ground is not None else 9999,
+    )
+
+
+# NULL when valid, else why not (self-intersections etc. would fail inside ST_Within)
+_POLYGON_INVALID_SQL = """
+    SELECT CASE WHEN NOT ST_IsValid(g) THEN ST_IsValidReason(g) END
+    FROM ST_GeomFromGeoJSON($1) AS g
+"""
+
+
+async def _select_filtered_buildings(conn, f: BuildingFilter) -> list:
+    """
+    Root buildings matching every given criterion of the filter. Raises
+    HTTPException(400) for a polygon PostGIS cannot use.
+    """
+    if f.polygon is not None:
+        try:
+            reason = await conn.fetchval(_POLYGON_INVALID_SQL, json.dumps(f.polygon))
+        except (asyncpg.DataError, asyncpg.InternalServerError) as e:
+            # ST_GeomFromGeoJSON reports parse errors as internal errors (XX000)
+            raise HTTPException(status_code=400, detail=f"Invalid polygon: {e}")
+        if reason:
+            raise HTTPException(status_code=400, detail=f"Invalid polygon: {reason}")
+    joins, conditions, args = [], ["b.building_root_id = b.id"], []
+    if f.gmlids is not None:
+        args.append(f.gmlids)
+        conditions.append(f"co.gmlid = ANY(${len(args)})")
+    if f.usage is not None:
+        args.append(f.usage)
+        conditions.append(f"b.usage = ${len(args)}")
+    if f.bbox is not None or f.area is not None or f.polygon is not None:
+        joins.append("JOIN citydb.building_footprints bf ON bf.gmlid = co.gmlid")
+    if f.bbox is not None:
+        args.extend(f.bbox)
+        n = len(args)
+        conditions.append(
+            f"ST_Intersects(bf.geometry, ST_MakeEnvelope(${n - 3}, ${n - 2}, ${n - 1}, ${n}, 4326))"
+        )
+    if f.area is not None:
+        args.append(f.area)
+        conditions.append(
+            f"ST_Within(bf.geometry, (SELECT geometry FROM citydb.census_boundaries WHERE key_code = ${len(args)}))"
+        )
+    if f.polygon is not None:
+        args.append(json.dumps(f.polygon))
+        conditions.append(f"ST_Within(bf.geometry, ST_SetSRID(ST_GeomFromGeoJSON(${len(args)}), 4326))")
+    args.append(_BULK_PATCH_MAX + 1)
+    return await conn.fetch(
+        f"""
+        SELECT b.id, co.gmlid
+        FROM citydb.building b
+        JOIN citydb.cityobject co ON co.id = b.id
+        {' '.join(joins)}
+        WHERE {' AND '.join(conditions)}
+        LIMIT ${len(args)}
+        """,
+        *args,
+    )
+
+
+@router.patch("/buildings")
+async def patch_buildings(body: BuildingBulkPatch):
+    """
+    Update attributes of many buildings in one transaction.
+
+    Send either {"patches": [{"gmlid": ..., <fields>}, ...]} or
+    {"filter": {gmlids | bbox | area | polygon | usage}, "patch": {<fields>}}. Buildings whose
+    attributes actually changed get one new version each (one statement for all)
+    and their footprints are recomputed in a single pass afterwards.
+    """
+    if (body.patches is None) == (body.filter is None):
+        raise HTTPException(status_code=400, detail="Send either patches, or filter and patch")
+    if body.filter is not None:
+        if body.patch is None:
+            raise HTTPException(status_code=400, detail="filter requires a patch")
+        f = body.filter
+        if not (f.gmlids or f.bbox or f.area or f.polygon or f.usage):
+            raise HTTPException(status_code=400, detail="filter must have at least one criterion")
+    if body.patches is not None and len(body.patches) > _BULK_PATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Too many patches (max {_BULK_PATCH_MAX})")
+
+    pool = await get_pool("write")
+    changed: list[str] = []
+    targets: list[tuple[int, str, tuple]] = []   # (building id, gmlid, patch columns)
+    try:
+        async with pool.acquire() as conn:
+            if body.patches is not None:
+                gmlids = [p.gmlid for p in body.patches]
+                if len(set(gmlids)) != len(gmlids):
+                    raise HTTPException(status_code=400, detail="Duplicate gmlid in patches")
+                rows = await conn.fetch(
+                    """
+                    SELECT b.id, co.gmlid
+                    FROM citydb.building b
+                    JOIN citydb.cityobject co ON co.id = b.id
+                    WHERE co.gmlid = ANY($1) AND b.building_root_id = b.id
+                    """,
+                    gmlids,
+                )
+                ids = {r["gmlid"]: r["id"] for r in rows}
+                missing = [g for g in gmlids if g not in ids]
+                if missing:
+                    raise HTTPException(status_code=404, detail=f"Buildings not found: {missing[:20]}")
+                targets = [(ids[p.gmlid], p.gmlid, _patch_columns(p)) for p in body.patches]
+            else:
+                rows = await _select_filtered_buildings(conn, body.filter)
+                if len(rows) > _BULK_PATCH_MAX:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Filter matches more than {_BULK_PATCH_MAX} buildings; narrow it down",
+                    )
+                columns = _patch_columns(body.patch)
+                targets = [(r["id"], r["gmlid"], columns) for r in rows]
+
+            if targets:
+                ids = [t[0] for t in targets]
+                cols = list(zip(*(t[2] for t in targets)))
+                async with conn.transaction():
+                    before = await _get_building_version_snapshots(conn, ids)
+                    named = [(i, name) for i, set_name, name in zip(ids, cols[0], cols[1]) if set_name]
+                    if named:
+                        await conn.execute(
+                            _BULK_UPDATE_NAME_SQL, [i for i, _ in named], [n for _, n in named],
+                        )
+                    await conn.execute(_BULK_UPDATE_BUILDING_SQL, ids, *map(list, cols[2:]))
+                    after = await _get_building_version_snapshots(conn, ids)
+
+                    changes = [
+                        (gmlid, "attr_update", snapshot)
+                        for building_id, (gmlid, snapshot) in after.items()
+                        if snapshot != before[building_id][1]
+                    ]
+                    await record_versions(conn, changes)
+                    changed = [gmlid for gmlid, _, _ in changes]
+                    await footprint_queue.enqueue(conn, changed, geometry=False)
+    except HTTPException:
+        raise
+    except asyncpg.DataError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for _, gmlid, _ in targets:
+            building_detail_cache.invalidate(gmlid)
+        bump_write_epoch()
+
+    await footprint_queue.drain()
+    return {
+        "matched": len(targets),
+        "updated": len(changed),
+        "gmlids": changed,
+    }
+
+
 # ── PATCH /api/buildings/{gmlid} ──────────────────────────────────────────────
 
 @router.patch("/buildings/{gmlid}")
@@ -181,14 +461,14 @@ async def patch_building(gmlid: str, body: BuildingPatch):
         raise HTTPException(status_code=404, detail=f"Building not found: {gmlid}")
 
     building_id = row["id"]
-    pool = await get_pool()
+    pool = await get_pool("write")
 
     try:
         async with pool.acquire() as conn:
             requested_fields = body.model_fields_set
             if not requested_fields:
-                from app.api.buildings import get_building_detail
-                return await get_building_detail(gmlid)
+                from app.api.buildings import load_building_detail
+                return await load_building_detail(gmlid, "write")
 
             async with conn.transaction():
                 before_snapshot = await _get_building_version_snapshot(conn, building_id)
@@ -239,16 +519,18 @@ async def patch_building(gmlid: str, body: BuildingPatch):
                 # Read updated attrs for snapshot
                 snapshot = await _get_building_version_snapshot(conn, building_id)
                 if snapshot != before_snapshot:
-                    next_ver = await archive_and_next_version(conn, gmlid)
-                    await insert_version(conn, gmlid, next_ver, "attr_update", snapshot)
+                    await record_version(conn, gmlid, "attr_update", snapshot)
+                    await footprint_queue.enqueue(conn, [gmlid], geometry=False)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        _invalidate_caches(gmlid)
 
-    await update_building_footprint(gmlid)
+    await footprint_queue.drain()
 
     # Return updated record in the same format as GET /api/buildings/{gmlid}
-    from app.api.buildings import get_building_detail
-    return await get_building_detail(gmlid)
+    from app.api.buildings import load_building_detail
+    return await load_building_detail(gmlid, "write")
 
 
 # ── DELETE /api/buildings/{gmlid} ─────────────────────────────────────────────
@@ -264,94 +546,73 @@ async def delete_building(gmlid: str):
     if not row:
         raise HTTPException(status_code=404, detail=f"Building not found: {gmlid}")
 
-    building_id = row["id"]
-    lod1_solid_id = row["lod1_solid_id"]
-    lod2_solid_id = row["lod2_solid_id"]
-
-    pool = await get_pool()
+    pool = await get_pool("write")
     try:
         async with pool.acquire() as conn:
-            # Collect thematic surface IDs
-            ts_rows = await conn.fetch(
-                "SELECT id, lod2_multi_surface_id FROM citydb.thematic_surface WHERE building_id = $1",
-                building_id,
-            )
-            ts_ids = [r["id"] for r in ts_rows]
-            ts_geom_ids = [r["lod2_multi_surface_id"] for r in ts_rows if r["lod2_multi_surface_id"]]
-
-            # Collect all geometry root IDs to delete
-            all_geom_root_ids = list({x for x in [lod1_solid_id, lod2_solid_id] + ts_geom_ids if x})
-
             async with conn.transaction():
                 # Version: archive current, insert 'deleted' marker
-                next_ver = await archive_and_next_version(conn, gmlid)
-                await insert_version(conn, gmlid, next_ver, "delete", {}, status="deleted")
-                # 1. Break FK: building → surface_geometry (all geometry columns)
-                await conn.execute(
-                    """
-                    UPDATE citydb.building
-                    SET lod0_footprint_id = NULL, lod0_roofprint_id = NULL,
-                        lod1_solid_id = NULL, lod2_solid_id = NULL,
-                        lod3_solid_id = NULL, lod4_solid_id = NULL
-                    WHERE id = $1
-                    """,
-                    building_id,
-                )
+                await record_version(conn, gmlid, "delete", {})
+                await delete_buildings(conn, [row["id"]])
+                await footprint_queue.enqueue(conn, [gmlid])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        _invalidate_caches(gmlid)
 
-                # 2. Break FK: thematic_surface → surface_geometry
-                if ts_ids:
-                    await conn.execute(
-                        "UPDATE citydb.thematic_surface "
-                        "SET lod2_multi_surface_id = NULL, lod3_multi_surface_id = NULL, lod4_multi_surface_id = NULL "
-                        "WHERE building_id = $1",
-                        building_id,
-                    )
+    await footprint_queue.drain()
+    return {"deleted": gmlid}
 
-                # 3. Delete surface_geometry (root_id self-references all children)
-                if all_geom_root_ids:
-                    await conn.execute(
-                        "DELETE FROM citydb.surface_geometry WHERE root_id = ANY($1)",
-                        all_geom_root_ids,
-                    )
-                # Also delete any remaining surface_geometry referencing this building directly
-                await conn.execute(
-                    "DELETE FROM citydb.surface_geometry WHERE cityobject_id = $1",
-                    building_id,
-                )
 
-                # 4. Delete thematic_surface rows, then their cityobject entries
-                await conn.execute(
-                    "DELETE FROM citydb.thematic_surface WHERE building_id = $1",
-                    building_id,
-                )
-                if ts_ids:
-                    await conn.execute(
-                        "DELETE FROM citydb.cityobject WHERE id = ANY($1)",
-                        ts_ids,
-                    )
+# ── DELETE /api/buildings ─────────────────────────────────────────────────────
 
-                # 5. Delete genericattrib, address links, building, cityobject
-                await conn.execute(
-                    "DELETE FROM citydb.cityobject_genericattrib WHERE cityobject_id = $1",
-                    building_id,
-                )
-                await conn.execute(
-                    "DELETE FROM citydb.address_to_building WHERE building_id = $1",
-                    building_id,
-                )
-                await conn.execute(
-                    "DELETE FROM citydb.building WHERE id = $1",
-                    building_id,
-                )
-                await conn.execute(
-                    "DELETE FROM citydb.cityobject WHERE id = $1",
-                    building_id,
+@router.delete("/buildings")
+async def delete_buildings_in_area(body: BuildingAreaDelete):
+    """
+    Delete every building whose footprint lies inside a census tract or a polygon
+    (e.g. clearing a redevelopment site). dry_run only lists what would be deleted.
+    Versions, rows and footprints are removed with set-based statements, so the
+    cost does not grow with the number of buildings.
+    """
+    if (body.area is None) == (body.polygon is None):
+        raise HTTPException(status_code=400, detail="Send either area or polygon")
+
+    pool = await get_pool("write")
+    gmlids: list[str] = []
+    try:
+        async with pool.acquire() as conn:
+            if body.area is not None and not await conn.fetchval(
+                "SELECT 1 FROM citydb.census_boundaries WHERE key_code = $1", body.area
+            ):
+                raise HTTPException(status_code=404, detail=f"Area not found: {body.area}")
+            rows = await _select_filtered_buildings(
+                conn, BuildingFilter(area=body.area, polygon=body.polygon)
+            )
+            if len(rows) > _BULK_PATCH_MAX:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Area contains more than {_BULK_PATCH_MAX} buildings; split it up",
                 )
+            gmlids = [r["gmlid"] for r in rows]
+            if body.dry_run or not rows:
+                return {"deleted": 0, "matched": len(rows), "gmlids": gmlids, "dry_run": body.dry_run}
+
+            async with conn.transaction():
+                await record_versions(conn, [(g, "delete", {}) for g in gmlids])
+                deleted = await delete_buildings(conn, [r["id"] for r in rows])
+                await footprint_queue.enqueue(conn, gmlids)
+    except HTTPException:
+        raise
+    except asyncpg.DataError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for gmlid in gmlids:
+            building_detail_cache.invalidate(gmlid)
+        bump_write_epoch()
 
-    await delete_building_footprint(gmlid)
-    return {"deleted": gmlid}
+    await footprint_queue.drain()
+    return {"deleted": deleted, "matched": len(rows), "gmlids": gmlids, "dry_run": False}
 
 
 # ── PUT /api/buildings/{gmlid}/lod1 ──────────────────────────────────────────
@@ -379,73 +640,14 @@ async def put_building_lod1(gmlid: str, body: Lod1Put):
 
     face_wkts = _build_lod1_faces(coords, body.height)
 
-    pool = await get_pool()
+    pool = await get_pool("write")
     try:
         async with pool.acquire() as conn:
             async with conn.transaction():
-                # Version: archive current before geometry replacement
-                next_ver = await archive_and_next_version(conn, gmlid)
-
-                # 1. Break FK from building to old solid
-                await conn.execute(
-                    "UPDATE citydb.building SET lod1_solid_id = NULL WHERE id = $1",
-                    building_id,
-                )
-
-                # 2. Delete old surface_geometry
-                if old_lod1_solid_id:
-                    await conn.execute(
-                        "DELETE FROM citydb.surface_geometry WHERE root_id = $1",
-                        old_lod1_solid_id,
-                    )
-
-                # 3. Insert new root surface_geometry (solid, no geometry in root row)
-                new_root_id = await conn.fetchval(
-                    """
-                    INSERT INTO citydb.surface_geometry
-                        (parent_id, root_id, is_solid, is_composite, is_triangulated,
-                         is_xlink, is_reverse, cityobject_id)
-                    VALUES (NULL, NULL, 1, 0, 0, 0, 0, $1)
-                    RETURNING id
-                    """,
-                    building_id,
-                )
-                # Self-reference: root_id = id
-                await conn.execute(
-                    "UPDATE citydb.surface_geometry SET root_id = $1 WHERE id = $1",
-                    new_root_id,
-                )
-
-                # 4. Insert individual face polygons
-                for wkt in face_wkts:
-                    await conn.execute(
-                        """
-                        INSERT INTO citydb.surface_geometry
-                            (parent_id, root_id, is_solid, is_composite, is_triangulated,
-                             is_xlink, is_reverse, geometry, cityobject_id)
-                        VALUES ($1, $2, 0, 0, 0, 0, 0, ST_GeomFromText($3, 6668), $4)
-                        """,
-                        new_root_id, new_root_id, wkt, building_id,
-                    )
-
-                # 5. Update building LOD1 reference and measured_height
+                await replace_lod1_solid(conn, building_id, old_lod1_solid_id, face_wkts)
                 await conn.execute(
-                    "UPDATE citydb.building SET lod1_solid_id = $1, measured_height = $2 WHERE id = $3",
-                    new_root_id, body.height, building_id,
-                )
-
-                # 6. Update cityobject envelope (3D bounding polygon in EPSG:6668)
-                await conn.execute(
-                    """
-                    UPDATE citydb.cityobject
-                    SET envelope = (
-                        SELECT ST_SetSRID(ST_Force3DZ(ST_Envelope(ST_Collect(sg.geometry))), 6668)
-                        FROM citydb.surface_geometry sg
-                        WHERE sg.root_id = $1 AND sg.geometry IS NOT NULL
-                    )
-                    WHERE id = $2
-                    """,
-                    new_root_id, building_id,
+                    "UPDATE citydb.building SET measured_height = $1 WHERE id = $2",
+                    body.height, building_id,
                 )
 
                 # Version: record geometry replacement
@@ -454,7 +656,7 @@ async def put_building_lod1(gmlid: str, body: Lod1Put):
                     "lod2_solid_id FROM citydb.building WHERE id = $1",
                     building_id,
                 )
-                await insert_version(conn, gmlid, next_ver, "geom_lod1", {
+                await record_version(conn, gmlid, "geom_lod1", {
                     "has_lod1":             True,
                     "height":               body.height,
                     "measured_height":      b_row["measured_height"],
@@ -463,13 +665,16 @@ async def put_building_lod1(gmlid: str, body: Lod1Put):
                     "class":                b_row["class"],
                     "has_lod2":             b_row["lod2_solid_id"] is not None,
                 })
+                await footprint_queue.enqueue(conn, [gmlid])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        _invalidate_caches(gmlid)
 
-    await update_building_footprint(gmlid)
+    await footprint_queue.drain()
 
-    from app.api.buildings import get_building_detail
-    return await get_building_detail(gmlid)
+    from app.api.buildings import load_building_detail
+    return await load_building_detail(gmlid, "write")
 
 
 # ── PUT /api/buildings/{gmlid}/lod2 ──────────────────────────────────────────
@@ -494,110 +699,18 @@ async def put_building_lod2(gmlid: str, body: Lod2Put):
     building_id = row["id"]
     old_lod2_solid_id = row["lod2_solid_id"]
 
-    pool = await get_pool()
+    pool = await get_pool("write")
     try:
         async with pool.acquire() as conn:
-            # Collect old thematic surface IDs and their geometry roots
-            ts_rows = await conn.fetch(
-                "SELECT id, lod2_multi_surface_id FROM citydb.thematic_surface WHERE building_id = $1",
-                building_id,
-            )
-            old_ts_ids = [r["id"] for r in ts_rows]
-            old_ms_ids = [r["lod2_multi_surface_id"] for r in ts_rows if r["lod2_multi_surface_id"]]
-            if old_lod2_solid_id:
-                old_ms_ids.append(old_lod2_solid_id)
-            old_ms_ids = list(set(old_ms_ids))
-
             async with conn.transaction():
-                # Version: archive current before geometry replacement
-                next_ver = await archive_and_next_version(conn, gmlid)
-
-                # 1. Break FK: building → lod2_solid_id
-                await conn.execute(
-                    "UPDATE citydb.building SET lod2_solid_id = NULL WHERE id = $1",
-                    building_id,
-                )
-
-                # 2. Break FK: thematic_surface → surface_geometry
-                if old_ts_ids:
-                    await conn.execute(
-                        "UPDATE citydb.thematic_surface "
-                        "SET lod2_multi_surface_id = NULL WHERE building_id = $1",
-                        building_id,
-                    )
-
-                # 3. Delete old surface_geometry
-                if old_ms_ids:
-                    await conn.execute(
-                        "DELETE FROM citydb.surface_geometry WHERE root_id = ANY($1)",
-                        old_ms_ids,
-                    )
-
-                # 4. Delete old thematic_surface rows and their cityobject entries
-                await conn.execute(
-                    "DELETE FROM citydb.thematic_surface WHERE building_id = $1",
-                    building_id,
-                )
-                if old_ts_ids:
-                    await conn.execute(
-                        "DELETE FROM citydb.cityobject WHERE id = ANY($1)",
-                        old_ts_ids,
-                    )
-
-                # 5. Insert new surfaces
-                for surface in body.surfaces:
-                    oc_id = _SURFACE_OC[surface.type]
-
-                    # 5a. Insert cityobject for this thematic surface
-                    ts_gmlid = f"TS-{gmlid}-{uuid.uuid4().hex[:8]}"
-                    ts_co_id = await conn.fetchval(
-                        "INSERT INTO citydb.cityobject (objectclass_id, gmlid) VALUES ($1, $2) RETURNING id",
-                        oc_id, ts_gmlid,
-                    )
-
-                    # 5b. Insert surface_geometry root (MultiSurface: is_composite=1)
-                    sg_root_id = await conn.fetchval(
-                        """
-                        INSERT INTO citydb.surface_geometry
-                            (parent_id, root_id, is_solid, is_composite, is_triangulated,
-                             is_xlink, is_reverse, cityobject_id)
-                        VALUES (NULL, NULL, 0, 1, 0, 0, 0, $1)
-                        RETURNING id
-                        """,
-                        ts_co_id,
-                    )
-                    await conn.execute(
-                        "UPDATE citydb.surface_geometry SET root_id = $1 WHERE id = $1",
-                        sg_root_id,
-                    )
-
-                    # 5c. Insert face polygons
-                    coords = surface.geometry.get("coordinates", [])
-                    wkt = _geojson_polygon_to_wkt_6668(coords)
-                    await conn.execute(
-                        """
-                        INSERT INTO citydb.surface_geometry
-                            (parent_id, root_id, is_solid, is_composite, is_triangulated,
-                             is_xlink, is_reverse, geometry, cityobject_id)
-                        VALUES ($1, $2, 0, 0, 0, 0, 0, ST_GeomFromText($3, 6668), $4)
-                        """,
-                        sg_root_id, sg_root_id, wkt, ts_co_id,
-                    )
-
-                    # 5d. Insert thematic_surface
-                    await conn.execute(
-                        """
-                        INSERT INTO citydb.thematic_surface
-                            (id, objectclass_id, building_id, lod2_multi_surface_id)
-                        VALUES ($1, $2, $3, $4)
-                        """,
-                        ts_co_id, oc_id, building_id, sg_root_id,
-                    )
-
-                # 6. Mark building as having LOD2 (use last sg_root_id as lod2_solid_id)
-                await conn.execute(
-                    "UPDATE citydb.building SET lod2_solid_id = $1 WHERE id = $2",
-                    sg_root_id, building_id,
+                await replace_lod2_surfaces(
+                    conn, building_id, gmlid, old_lod2_solid_id,
+                    [
+                        (_SURFACE_OC[surface.type],
+                         [_geojson_polygon_to_wkt_6668(surface.geometry.get("coordinates", []))],
+                         None)
+                        for surface in body.surfaces
+                    ],
                 )
 
                 # Version: record LOD2 geometry replacement
@@ -606,7 +719,7 @@ async def put_building_lod2(gmlid: str, body: Lod2Put):
                     "lod1_solid_id FROM citydb.building WHERE id = $1",
                     building_id,
                 )
-                await insert_version(conn, gmlid, next_ver, "geom_lod2", {
+                await record_version(conn, gmlid, "geom_lod2", {
                     "has_lod2":             True,
                     "surface_count":        len(body.surfaces),
                     "measured_height":      b_row["measured_height"],
@@ -615,11 +728,15 @@ async def put_building_lod2(gmlid: str, body: Lod2Put):
                     "class":                b_row["class"],
                     "has_lod1":             b_row["lod1_solid_id"] is not None,
                 })
+                # LOD2 only changes has_lod2 on the footprint row; no re-union
+                await footprint_queue.enqueue(conn, [gmlid], geometry=False)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        _invalidate_caches(gmlid)
 
-    await update_building_footprint(gmlid)
+    await footprint_queue.drain()
 
-    from app.api.buildings import get_building_detail
-    return await get_building_detail(gmlid)
+    from app.api.buildings import load_building_detail
+    return await load_building_detail(gmlid, "write")
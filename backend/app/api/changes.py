@@ -0,0 +1,123 @@
+"""
+Change feed endpoints.
+
+GET /api/changes?since=  — delta sync: feature versions recorded after a watermark, paged
+GET /api/changes/stream  — Server-Sent Events: one `data:` line per change event
+                           (see app/services/changes.py for the event shapes)
+"""
+
+import asyncio
+import re
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Query as QueryParam
+from fastapi.responses import StreamingResponse
+
+from app.config import get_settings
+from app.database import get_pool
+from app.services import changes
+
+router = APIRouter()
+
+_CHANGES_MAX_LIMIT = 10_000
+
+# Watermarks are "<xact_id>.<id>" (migration 016): rows are ordered by the writing
+# transaction's id, then by row id. Everything below the snapshot's xmin has
+# finished, so rows under that horizon are final and a page never passes a row
+# that could still commit later.
+_WATERMARK_RE = re.compile(r"^(\d+)\.(\d+)$")
+
+# Client starting from a point in time: xact_id follows the first write, not the
+# transaction start that changed_at records, so start from the oldest transaction
+# with a row changed at or after it — or from the oldest still running, which
+# may commit such rows later. Rows of later transactions changed just before the
+# timestamp come along too; a timestamp start over-fetches rather than skips.
+_WATERMARK_AT_SQL = """
+    SELECT least(min(xact_id), pg_snapshot_xmin(pg_current_snapshot()))::text || '.0'
+    FROM citydb.feature_versions
+    WHERE changed_at >= $1
+"""
+
+_CHANGES_SQL = """
+    SELECT id, xact_id::text AS xact_id, gmlid, change_type, version, source_tag, changed_at
+    FROM citydb.feature_versions
+    WHERE (xact_id, id) > ($1::text::xid8, $2::bigint)
+      AND xact_id < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY xact_id, id
+    LIMIT $3
+"""
+
+
+def _parse_since(since: str) -> tuple[str, int] | datetime:
+    m = _WATERMARK_RE.match(since)
+    if m:
+        return m.group(1), int(m.group(2))
+    try:
+        return datetime.fromisoformat(since.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be a watermark or an ISO 8601 timestamp")
+
+
+@router.get("/changes")
+async def get_changes(
+    since: str = QueryParam(..., description="watermark from a previous response, or an ISO 8601 timestamp"),
+    limit: int = QueryParam(1000, ge=1, le=_CHANGES_MAX_LIMIT),
+):
+    """
+    Feature versions recorded after a watermark, in commit-safe order. Pass the
+    returned watermark as the next since; has_more means another page is ready now.
+    """
+    since = _parse_since(since)
+    if isinstance(since, datetime) and since.tzinfo is None:
+        raise HTTPException(status_code=400, detail="since timestamp needs a time zone")
+    pool = await get_pool()
+    try:
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True, isolation="repeatable_read"):
+                if isinstance(since, datetime):
+                    xact_id, row_id = await conn.fetchval(_WATERMARK_AT_SQL, since).split(".")
+                    since = (xact_id, int(row_id))
+                rows = await conn.fetch(_CHANGES_SQL, since[0], since[1], limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    watermark = f"{rows[-1]['xact_id']}.{rows[-1]['id']}" if rows else f"{since[0]}.{since[1]}"
+    return {
+        "since": f"{since[0]}.{since[1]}",
+        "watermark": watermark,
+        "has_more": len(rows) == limit,
+        "changes": [
+            {
+                "gmlid":       r["gmlid"],
+                "change_type": r["change_type"],
+                "version":     r["version"],
+                "source_tag":  r["source_tag"],
+                "changed_at":  r["changed_at"].isoformat() if r["changed_at"] else None,
+            }
+            for r in rows
+        ],
+    }
+
+
+async def _event_stream():
+    keepalive = get_settings().change_stream_keepalive_seconds
+    with changes.client() as queue:
+        # Browsers reconnect after 3 s; events in between are lost, so clients
+        # revalidate their caches when a stream reopens
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"   # comment line: keeps proxies from closing the idle stream
+                continue
+            yield f"data: {payload}\n\n"
+
+
+@router.get("/changes/stream")
+async def change_stream():
+    return StreamingResponse(
+        _event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
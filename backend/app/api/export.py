@@ -2,11 +2,15 @@
 Export API — returns GeoJSON FeatureCollection for selected features.
 
 POST /api/export
-  Body: {"items": [{"gmlid": "...", "type": "building|land_use|road|flood_zone"}, ...]}
+  Body: {"items": [{"gmlid": "...", "type": "building|land_use|road|flood_zone"}, ...],
+         "resolution": 1.0}   (optional, metres)
   Response: GeoJSON FeatureCollection (RFC 7946)
 
 Geometry is read from pre-built materialized views (WGS84 / EPSG:4326),
 so coordinates are not tile-clipped and represent the full feature geometry.
+With a resolution, the coarsest generalized level whose tolerance fits it is
+used instead (app/services/generalize.py); features too small to have a row
+at that level are exported at full resolution rather than dropped.
 """
 
 import json
@@ -14,9 +18,10 @@ from decimal import Decimal
 from typing import Literal
 
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.database import get_pool
+from app.services.generalize import level_for_resolution
 
 router = APIRouter()
 
@@ -39,6 +44,7 @@ class ExportItem(BaseModel):
 
 class ExportRequest(BaseModel):
     items: list[ExportItem]
+    resolution: float | None = Field(default=None, gt=0)
 
 
 @router.post("/export")
@@ -55,7 +61,8 @@ async def export_geojson(body: ExportRequest):
     for item in body.items:
         by_type.setdefault(item.type, []).append(item.gmlid)
 
-    pool = await get_pool()
+    level = level_for_resolution(body.resolution)
+    pool = await get_pool("export")
     features: list[dict] = []
 
     try:
@@ -63,13 +70,15 @@ async def export_geojson(body: ExportRequest):
             for ftype, gmlids in by_type.items():
                 view, attr_cols = _VIEW_CONFIG[ftype]
                 # Build SELECT: all attr cols + geometry as GeoJSON
-                cols = ", ".join(attr_cols)
+                cols = ", ".join(f"v.{c}" for c in attr_cols)
                 sql = f"""
-                    SELECT {cols}, ST_AsGeoJSON(geometry) AS geom
-                    FROM {view}
-                    WHERE gmlid = ANY($1)
+                    SELECT {cols}, ST_AsGeoJSON(COALESCE(g.geometry, v.geometry)) AS geom
+                    FROM {view} v
+                    LEFT JOIN citydb.footprint_generalized g
+                           ON g.layer = $2 AND g.level = $3 AND g.gmlid = v.gmlid
+                    WHERE v.gmlid = ANY($1)
                 """
-                rows = await conn.fetch(sql, gmlids)
+                rows = await conn.fetch(sql, gmlids, view.removeprefix("citydb."), level)
                 for row in rows:
                     props = {col: row[col] for col in attr_cols}
                     # Convert non-serialisable types (e.g. asyncpg Decimal → float)
@@ -12,7 +12,9 @@ import json
 from fastapi import APIRouter, HTTPException, Request
 
 from app.database import get_pool
-from app.services.versioning import archive_and_next_version, insert_version
+from app.services.cache import bump_write_epoch
+from app.services.static_tiles import schedule_layer_refresh
+from app.services.versioning import record_version
 
 router = APIRouter()
 
@@ -66,6 +68,17 @@ CLASSNAME_TO_TABLE = {
     'SolitaryVegetationObject': 'citydb.solitary_vegetat_object',
 }
 
+# Materialized view (map layer) each class is drawn from
+CLASSNAME_TO_LAYER = {
+    'LandUse':       'land_use_footprints',
+    'Road':          'road_footprints',
+    'WaterBody':     'flood_zone_footprints',
+    'Bridge':        'bridge_footprints',
+    'CityFurniture': 'furniture_footprints',
+    'PlantCover':    'vegetation_footprints',
+    'SolitaryVegetationObject': 'vegetation_footprints',
+}
+
 EDITABLE_FIELDS = {
     'LandUse': {'name', 'class', 'function', 'usage'},
     'Road': {'name', 'class', 'function', 'usage'},
@@ -153,7 +166,7 @@ async def patch_feature(gmlid: str, request: Request):
     """Update name, class, function, usage for bridge/furniture/vegetation features."""
     body = await request.json()
     requested_fields = set(body.keys())
-    pool = await get_pool()
+    pool = await get_pool("write")
     try:
         async with pool.acquire() as conn:
             # Look up feature
@@ -215,9 +228,13 @@ async def patch_feature(gmlid: str, request: Request):
                         )
 
                 attr_snapshot = await _get_feature_attr_snapshot(conn, gmlid, classname, feature_id)
-                if attr_snapshot != before_snapshot:
-                    next_ver = await archive_and_next_version(conn, gmlid)
-                    await insert_version(conn, gmlid, next_ver, "attr_update", attr_snapshot)
+                changed = attr_snapshot != before_snapshot
+                if changed:
+                    await record_version(conn, gmlid, "attr_update", attr_snapshot)
+            bump_write_epoch()
+            if changed:
+                # The layer's view (and its PMTiles archive) carry class/usage
+                schedule_layer_refresh(CLASSNAME_TO_LAYER[classname])
 
             return await _get_feature_data(conn, gmlid)
     except HTTPException:
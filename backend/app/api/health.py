@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from app.database import get_pool
 from app.config import get_settings
+from app.services import footprint_queue
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -12,13 +13,16 @@ logger = logging.getLogger(__name__)
 async def health():
     settings = get_settings()
     db_ok = False
+    queue = None
     try:
         pool = await get_pool()
         async with pool.acquire() as conn:
             await conn.fetchval("SELECT 1")
-        db_ok = True
+            db_ok = True
+            queue = await footprint_queue.stats(conn)
     except Exception as e:
-        logger.warning("Health check: DB unreachable: %s", e)
+        if not db_ok:
+            logger.warning("Health check: DB unreachable: %s", e)
 
     llm_mode = "claude_api" if settings.use_llm else "placeholder"
     if not db_ok:
@@ -27,4 +31,4 @@ async def health():
             "db": "unreachable",
             "llm_mode": llm_mode,
         })
-    return {"status": "ok", "db": "connected", "llm_mode": llm_mode}
+    return {"status": "ok", "db": "connected", "llm_mode": llm_mode, "footprint_queue": queue}
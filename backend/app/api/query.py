@@ -1,12 +1,31 @@
+import datetime
+import decimal
+import json
+from typing import Literal
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from app.config import get_settings
 from app.services.sql_generator import generate_sql
-from app.database import run_query, QueryError
+from app.database import run_query, stream_query, QueryError
 
 router = APIRouter()
 
 
+class _JsonEncoder(json.JSONEncoder):
+    """Handle types asyncpg returns that stdlib json can't serialize."""
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return float(obj)
+        if isinstance(obj, (datetime.date, datetime.datetime)):
+            return obj.isoformat()
+        if isinstance(obj, bytes):
+            return obj.hex()
+        return super().default(obj)
+
+
 class QueryRequest(BaseModel):
     question: str
     execute: bool = True  # if False, return SQL without running it
@@ -61,3 +80,91 @@ async def query(req: QueryRequest):
             response.executed = False
 
     return response
+
+
+# ── Streaming mode ─────────────────────────────────────────────────────────────
+
+class QueryStreamRequest(BaseModel):
+    question: str
+    format: Literal["ndjson", "columnar"] = "ndjson"
+
+
+def _line(data: dict) -> bytes:
+    return (json.dumps(data, ensure_ascii=False, cls=_JsonEncoder) + "\n").encode("utf-8")
+
+
+async def _query_stream(req: QueryStreamRequest):
+    """
+    NDJSON event stream:
+      {"type": "meta", question, sql, explanation, mode}
+      {"type": "columns", "columns": [...]}
+      {"type": "row", "row": [...]}                        (format=ndjson)
+      {"type": "chunk", "data": [[col0...], [col1...]]}   (format=columnar)
+      {"type": "end", "row_count": N, "truncated": bool}
+    or {"type": "error", "message": ...} in place of the remaining events.
+    """
+    max_bytes = get_settings().query_stream_max_bytes
+
+    try:
+        gen = await generate_sql(req.question)
+    except Exception as e:
+        yield _line({"type": "error", "message": f"SQL generation failed: {str(e)}"})
+        return
+
+    yield _line({
+        "type": "meta",
+        "question": req.question,
+        "sql": gen["sql"],
+        "explanation": gen["explanation"],
+        "mode": gen["mode"],
+    })
+
+    sent_bytes = 0
+    row_count = 0
+    truncated = False
+    results = stream_query(gen["sql"])
+    try:
+        async for part in results:
+            if "columns" in part:
+                yield _line({"type": "columns", "columns": part["columns"]})
+                continue
+
+            if req.format == "columnar":
+                rows = part["rows"]
+                data = _line({"type": "chunk", "data": [list(col) for col in zip(*rows)]})
+                if sent_bytes + len(data) > max_bytes:
+                    truncated = True
+                    break
+                sent_bytes += len(data)
+                row_count += len(rows)
+                yield data
+            else:
+                for row in part["rows"]:
+                    data = _line({"type": "row", "row": row})
+                    if sent_bytes + len(data) > max_bytes:
+                        truncated = True
+                        break
+                    sent_bytes += len(data)
+                    row_count += 1
+                    yield data
+                if truncated:
+                    break
+    except QueryError as e:
+        yield _line({"type": "error", "message": str(e)})
+        return
+    finally:
+        await results.aclose()
+
+    yield _line({"type": "end", "row_count": row_count, "truncated": truncated})
+
+
+@router.post("/query/stream")
+async def query_stream(req: QueryStreamRequest):
+    """Like POST /query, but streams the result rows as NDJSON through a server-side cursor."""
+    if not req.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty.")
+    return StreamingResponse(
+        _query_stream(req),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,30 @@
+"""
+Vector tiles API — MVT for the map layers, rendered and cached by app/services/mvt.py.
+
+GET /api/tiles/{layer}/{z}/{x}/{y}
+    layer is one of the *_footprints tables/views, census_boundaries or
+    shelter_facilities (same names as the MVT source layers).
+"""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+
+from app.services.mvt import LAYERS, get_tile
+
+router = APIRouter()
+
+
+@router.get("/tiles/{layer}/{z}/{x}/{y}")
+async def get_vector_tile(layer: str, z: int, x: int, y: int):
+    """Return one Mapbox Vector Tile (204 when the tile has no features)."""
+    if layer not in LAYERS:
+        raise HTTPException(status_code=404, detail=f"Unknown layer: {layer}")
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f"Invalid tile: {z}/{x}/{y}")
+    try:
+        tile = await get_tile(layer, z, x, y)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not tile:
+        return Response(status_code=204)
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile")
@@ -0,0 +1,38 @@
+"""
+3D Tiles API — serves the locally generated tileset (app/services/tiles3d.py).
+
+GET /api/3dtiles/tileset.json
+GET /api/3dtiles/tiles/{name}.glb
+"""
+
+import re
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from app.services.tiles3d import tiles_dir
+
+router = APIRouter()
+
+_TILE_NAME = re.compile(r"^-?\d+_-?\d+$")
+
+
+@router.get("/3dtiles/tileset.json")
+async def get_tileset():
+    """Return the tileset root; 404 until the tileset has been generated."""
+    path = tiles_dir() / "tileset.json"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="3D Tiles not generated yet (python -m app.services.tiles3d)")
+    # Rewritten after every rebuild: always revalidate
+    return FileResponse(path, media_type="application/json", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/3dtiles/tiles/{name}.glb")
+async def get_tile(name: str):
+    """Return one leaf tile; URIs carry ?v=<revision>, so a tile is immutable per URL."""
+    if not _TILE_NAME.match(name):
+        raise HTTPException(status_code=404, detail=f"Tile not found: {name}")
+    path = tiles_dir() / "tiles" / f"{name}.glb"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"Tile not found: {name}")
+    return FileResponse(path, media_type="model/gltf-binary", headers={"Cache-Control": "public, max-age=31536000, immutable"})
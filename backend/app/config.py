@@ -8,6 +8,90 @@ class Settings(BaseSettings):
     query_row_limit: int = 1000
     query_timeout_seconds: int = 30
 
+    # Connection pools per workload class (see app.database.get_pool).
+    # timeout = asyncpg command_timeout for every statement on that pool.
+    pool_interactive_min_size: int = 2      # map clicks, detail, search, areas
+    pool_interactive_max_size: int = 10
+    pool_interactive_timeout_seconds: float = 30
+    pool_export_min_size: int = 0           # GeoJSON / CityJSON / batch exports
+    pool_export_max_size: int = 4
+    pool_export_timeout_seconds: float = 300
+    pool_analytics_min_size: int = 0        # LLM-generated SQL
+    pool_analytics_max_size: int = 4
+    pool_analytics_timeout_seconds: float = 60
+    pool_write_min_size: int = 1            # transactional edits + read-your-writes
+    pool_write_max_size: int = 4
+    pool_write_timeout_seconds: float = 60
+
+    # Optional read replicas (comma-separated DSNs) for the read-only classes.
+    # A replica lagging more than replica_max_lag_seconds, or unreachable, is
+    # skipped until the next check; with none usable, reads go to the primary.
+    replica_database_urls: str = ""
+    replica_max_lag_seconds: float = 5.0
+    replica_check_interval_seconds: float = 5.0
+    replica_connect_timeout_seconds: float = 2.0   # per connection attempt to a replica
+
+    # Streaming mode (POST /api/query/stream): rows are read through a
+    # server-side cursor and flushed in chunks, so the row limit can be much
+    # higher than query_row_limit; the byte budget caps the encoded response.
+    query_stream_row_limit: int = 100_000
+    query_stream_chunk_rows: int = 500
+    query_stream_max_bytes: int = 64 * 1024 * 1024
+
+    # Result cache for run_query(), keyed on normalized SQL and cleared on every write
+    query_cache_max_bytes: int = 32 * 1024 * 1024
+    query_cache_max_entries: int = 256
+
+    # GET /api/buildings/{gmlid} documents, invalidated per gmlid by the write paths
+    building_detail_cache_max_bytes: int = 64 * 1024 * 1024
+    building_detail_cache_max_entries: int = 5000
+
+    # Resource governor for generated SQL (run_query / stream_query):
+    # plans above these EXPLAIN estimates are rejected before execution,
+    # the session limits are SET LOCAL for the query's transaction, and at most
+    # query_max_concurrency generated queries hold a pool connection at once.
+    query_max_plan_cost: float = 5_000_000
+    query_max_plan_rows: float = 50_000_000
+    query_work_mem: str = "32MB"
+    query_temp_file_limit: str = "1GB"   # superuser-only GUC; "" to skip
+    query_role: str = ""                 # e.g. "citydb_query" (migration 007)
+    query_max_concurrency: int = 4
+
+    # CityJSON exports: vertex quantization step in metres (transform.scale)
+    cityjson_precision: float = 0.001
+
+    # MVT tile cache (app/services/mvt.py): memory LRU in front of files on disk,
+    # for zooms up to mvt_cache_max_zoom; invalidated per tile by the write paths
+    mvt_cache_dir: str = "data/mvt_cache"
+    mvt_cache_max_zoom: int = 16
+    mvt_cache_max_bytes: int = 128 * 1024 * 1024
+    mvt_cache_max_entries: int = 20_000
+
+    # PMTiles archives of the static layers (app/services/static_tiles.py)
+    pmtiles_dir: str = "data/pmtiles"
+    pmtiles_min_zoom: int = 0
+    pmtiles_max_zoom: int = 16
+    # Feature PATCHes within this window share one view refresh + archive rebuild
+    static_layer_refresh_debounce_seconds: float = 2.0
+
+    # Local 3D Tiles (app/services/tiles3d.py): output directory, leaf cell size in
+    # EPSG:6677 metres, and geoid height added to PLATEAU's orthometric heights
+    tiles3d_dir: str = "data/tiles3d"
+    tiles3d_leaf_size_m: float = 250.0
+    tiles3d_height_offset_m: float = 36.7
+
+    # Footprint maintenance queue (app/services/footprint_queue.py): edits within the
+    # debounce window share one recompute pass; a pass claims up to batch_size buildings.
+    # A building that failed max_attempts times is parked until it is edited again.
+    footprint_queue_debounce_ms: int = 50
+    footprint_queue_batch_size: int = 500
+    footprint_queue_max_attempts: int = 5
+
+    # Change feed (app/services/changes.py, GET /api/changes/stream): events a slow
+    # stream client may fall behind before it is sent a reset, and keepalive interval
+    change_stream_queue_size: int = 1000
+    change_stream_keepalive_seconds: float = 15.0
+
     @property
     def use_llm(self) -> bool:
         return bool(self.anthropic_api_key and self.anthropic_api_key.startswith("sk-ant-"))
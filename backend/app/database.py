@@ -1,29 +1,135 @@
 import asyncpg
 import asyncio
+import itertools
+import json
 import re
-from typing import Any
+import time
+from typing import Any, AsyncIterator
 from contextlib import asynccontextmanager
 
 from app.config import get_settings
+from app.services.cache import ResultCache, current_epoch, normalize_sql
 
-_pool: asyncpg.Pool | None = None
+# Workload classes — each has its own pool sized from Settings, so heavy exports
+# or LLM analytics cannot take the connections interactive map lookups need.
+# Read-only classes may be served by a replica; "write" is always the primary
+# and is also used for read-your-writes (re-reading a row right after editing it).
+WORKLOADS = ("interactive", "export", "analytics", "write")
+_READ_ONLY_WORKLOADS = {"interactive", "export", "analytics"}
 
+_pools: dict[tuple[str, str], asyncpg.Pool] = {}   # (workload, dsn) → pool
+_pool_locks: dict[tuple[str, str], asyncio.Lock] = {}   # one per pool being created
+_replica_health: dict[str, tuple[float, bool]] = {}  # dsn → (checked_at, healthy)
+_replica_cursor = itertools.count()
 
-async def get_pool() -> asyncpg.Pool:
-    global _pool
-    if _pool is None:
-        settings = get_settings()
-        # asyncpg uses its own DSN format (not SQLAlchemy)
-        dsn = settings.database_url.replace("postgresql+asyncpg://", "postgresql://")
-        _pool = await asyncpg.create_pool(dsn, min_size=2, max_size=10)
-    return _pool
+# Identical generated SQL (repeated dashboard questions) is answered from memory
+# until the next write bumps the epoch — see app.services.cache.
+_query_cache = ResultCache(
+    "query",
+    max_bytes=get_settings().query_cache_max_bytes,
+    max_entries=get_settings().query_cache_max_entries,
+    clear_on_write=True,
+)
+
+# Replay lag in seconds; 0 when the replica has applied everything it received
+# (pg_last_xact_replay_timestamp alone grows while the primary is idle).
+_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def _asyncpg_dsn(url: str) -> str:
+    # asyncpg uses its own DSN format (not SQLAlchemy)
+    return url.strip().replace("postgresql+asyncpg://", "postgresql://")
+
+
+def _replica_dsns() -> list[str]:
+    urls = get_settings().replica_database_urls
+    return [_asyncpg_dsn(u) for u in urls.split(",") if u.strip()]
+
+
+async def _get_or_create_pool(workload: str, dsn: str, **connect_kwargs) -> asyncpg.Pool:
+    pool = _pools.get((workload, dsn))
+    if pool is None:
+        # Per-pool lock: a replica that takes long to connect must not hold up
+        # creating the primary's pools
+        async with _pool_locks.setdefault((workload, dsn), asyncio.Lock()):
+            pool = _pools.get((workload, dsn))
+            if pool is None:
+                settings = get_settings()
+                pool = await asyncpg.create_pool(
+                    dsn,
+                    min_size=getattr(settings, f"pool_{workload}_min_size"),
+                    max_size=getattr(settings, f"pool_{workload}_max_size"),
+                    command_timeout=getattr(settings, f"pool_{workload}_timeout_seconds"),
+                    **connect_kwargs,
+                )
+                _pools[(workload, dsn)] = pool
+    return pool
+
+
+async def _replica_is_usable(workload: str, dsn: str) -> bool:
+    """Lag check, cached for replica_check_interval_seconds per replica."""
+    settings = get_settings()
+    now = time.monotonic()
+    checked_at, healthy = _replica_health.get(dsn, (float("-inf"), False))
+    if now - checked_at < settings.replica_check_interval_seconds:
+        return healthy
+    # Only one caller probes; the others go to the primary until it reports back
+    _replica_health[dsn] = (now, False)
+    try:
+        pool = await _get_or_create_pool(
+            workload, dsn, timeout=settings.replica_connect_timeout_seconds,
+        )
+        async with pool.acquire(timeout=settings.replica_connect_timeout_seconds) as conn:
+            lag = await conn.fetchval(_REPLICA_LAG_SQL, timeout=2)
+        healthy = float(lag) <= settings.replica_max_lag_seconds
+    except Exception:
+        # Unreachable, mid-handshake disconnect (InterfaceError), ...: fall back
+        healthy = False
+    _replica_health[dsn] = (time.monotonic(), healthy)
+    return healthy
+
+
+async def get_pool(workload: str = "interactive") -> asyncpg.Pool:
+    """
+    Return the pool for a workload class.
+    Read-only classes rotate over healthy replicas and fall back to the primary.
+    """
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown workload class: {workload}")
+    if workload in _READ_ONLY_WORKLOADS:
+        replicas = _replica_dsns()
+        start = next(_replica_cursor)
+        for i in range(len(replicas)):
+            dsn = replicas[(start + i) % len(replicas)]
+            if await _replica_is_usable(workload, dsn):
+                return await _get_or_create_pool(
+                    workload, dsn, timeout=get_settings().replica_connect_timeout_seconds,
+                )
+    return await _get_or_create_pool(workload, _asyncpg_dsn(get_settings().database_url))
+
+
+def is_replica_pool(pool: asyncpg.Pool) -> bool:
+    """
+    True if get_pool() returned a replica. Replicas may lag behind a write whose
+    epoch bump already happened, so their results must not be cached.
+    """
+    primary = _asyncpg_dsn(get_settings().database_url)
+    return any(p is pool and dsn != primary for (_, dsn), p in _pools.items())
 
 
 async def close_pool():
-    global _pool
-    if _pool:
-        await _pool.close()
-        _pool = None
+    pools = list(_pools.values())
+    _pools.clear()
+    _replica_health.clear()
+    _pool_locks.clear()
+    for pool in pools:
+        await pool.close()
 
 
 class QueryError(Exception):
@@ -49,10 +155,89 @@ def _inject_limit(sql: str, limit: int) -> str:
     return f"{sql}\nLIMIT {limit}"
 
 
+# ── Resource governor for generated SQL ────────────────────────────────────────
+# _validate_sql() only guarantees a single SELECT. The governor additionally
+# bounds what that SELECT may cost: client-side wait_for() alone leaves the
+# backend running after a timeout, so limits are enforced by the server.
+
+_query_slots: asyncio.Semaphore | None = None
+
+
+def _get_query_slots() -> asyncio.Semaphore:
+    global _query_slots
+    if _query_slots is None:
+        _query_slots = asyncio.Semaphore(get_settings().query_max_concurrency)
+    return _query_slots
+
+
+async def _apply_session_limits(conn: asyncpg.Connection) -> None:
+    """SET LOCAL the per-query limits, then drop to the low-privilege query role."""
+    settings = get_settings()
+    gucs = [
+        ("statement_timeout", f"{settings.query_timeout_seconds * 1000}"),
+        ("work_mem", settings.query_work_mem),
+        ("temp_file_limit", settings.query_temp_file_limit),
+        # role last: temp_file_limit can only be set before leaving the superuser
+        ("role", settings.query_role),
+    ]
+    gucs = [(name, value) for name, value in gucs if value]
+    calls = ", ".join(f"set_config('{name}', ${i}, true)" for i, (name, _) in enumerate(gucs, 1))
+    await conn.execute(f"SELECT {calls}", *[value for _, value in gucs])
+
+
+def _max_plan_rows(node: dict) -> float:
+    return max([node.get("Plan Rows", 0)] + [_max_plan_rows(c) for c in node.get("Plans", [])])
+
+
+async def _check_plan(conn: asyncpg.Connection, sql: str) -> None:
+    """Reject queries whose EXPLAIN estimate exceeds the configured cost or row limits."""
+    settings = get_settings()
+    plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}"))[0]["Plan"]
+
+    cost = plan["Total Cost"]
+    if cost > settings.query_max_plan_cost:
+        raise QueryError(
+            f"Query rejected: estimated cost {cost:,.0f} exceeds the limit of "
+            f"{settings.query_max_plan_cost:,.0f}. Add filters or aggregate the result."
+        )
+    # The top node is capped by LIMIT — intermediate nodes reveal runaway joins
+    rows = _max_plan_rows(plan)
+    if rows > settings.query_max_plan_rows:
+        raise QueryError(
+            f"Query rejected: an intermediate step is estimated at {rows:,.0f} rows "
+            f"(limit {settings.query_max_plan_rows:,.0f}). Check the join conditions."
+        )
+
+
+@asynccontextmanager
+async def _governed_connection(sql: str):
+    """
+    Yield (connection, from_replica) inside a read-only transaction that is ready
+    to run sql: a concurrency slot is held, session limits are applied, and the
+    plan passed the cost gate. Keeps generated queries from starving the map
+    endpoints' pool.
+    """
+    settings = get_settings()
+    slots = _get_query_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=settings.query_timeout_seconds)
+    except asyncio.TimeoutError:
+        raise QueryError("Too many queries are running right now. Please try again shortly.")
+    try:
+        pool = await get_pool("analytics")
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                await _apply_session_limits(conn)
+                await _check_plan(conn, sql)
+                yield conn, is_replica_pool(pool)
+    finally:
+        slots.release()
+
+
 async def run_query(sql: str) -> dict[str, Any]:
     """
     Validate and execute a SQL query safely.
-    Returns: {columns, rows, row_count}
+    Returns: {columns, rows, row_count} — possibly a cached object; do not mutate.
     Raises: QueryError on validation failure or DB error.
     """
     settings = get_settings()
@@ -63,21 +248,69 @@ async def run_query(sql: str) -> dict[str, Any]:
     except QueryError:
         raise
 
-    pool = await get_pool()
+    cache_key = normalize_sql(safe_sql)
+    cached = _query_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    epoch = current_epoch()
+
     try:
-        async with pool.acquire() as conn:
+        async with _governed_connection(safe_sql) as (conn, from_replica):
             result = await asyncio.wait_for(
                 conn.fetch(safe_sql),
                 timeout=settings.query_timeout_seconds,
             )
-    except asyncio.TimeoutError:
+    except (asyncio.TimeoutError, asyncpg.QueryCanceledError):
         raise QueryError(f"Query timed out after {settings.query_timeout_seconds} seconds.")
     except asyncpg.PostgresError as e:
         raise QueryError(f"Database error: {e}")
 
     if not result:
-        return {"columns": [], "rows": [], "row_count": 0}
+        response = {"columns": [], "rows": [], "row_count": 0}
+    else:
+        columns = list(result[0].keys())
+        rows = [list(row.values()) for row in result]
+        response = {"columns": columns, "rows": rows, "row_count": len(rows)}
 
-    columns = list(result[0].keys())
-    rows = [list(row.values()) for row in result]
-    return {"columns": columns, "rows": rows, "row_count": len(rows)}
+    if not from_replica:
+        size = len(json.dumps(response["rows"], default=str))
+        _query_cache.put(cache_key, response, size=size, epoch=epoch)
+    return response
+
+
+async def stream_query(sql: str) -> AsyncIterator[dict[str, Any]]:
+    """
+    Validate and execute a SQL query through a server-side cursor.
+
+    Runs inside the governor's read-only transaction so the cursor survives
+    between fetches.
+    Yields {"columns": [...]} once, then {"rows": [...]} chunks of at most
+    query_stream_chunk_rows rows. Closing the generator early closes the cursor
+    and releases the connection.
+    Raises: QueryError on validation failure or DB error.
+    """
+    settings = get_settings()
+
+    safe_sql = _validate_sql(sql)
+    safe_sql = _inject_limit(safe_sql, settings.query_stream_row_limit)
+
+    try:
+        # wait_for cannot wrap a generator — the governor's server-side
+        # statement_timeout bounds each fetch instead
+        async with _governed_connection(safe_sql) as (conn, _):
+            stmt = await conn.prepare(safe_sql)
+            yield {"columns": [a.name for a in stmt.get_attributes()]}
+
+            chunk_rows = settings.query_stream_chunk_rows
+            cursor = await stmt.cursor()
+            while True:
+                chunk = await cursor.fetch(chunk_rows)
+                if not chunk:
+                    break
+                yield {"rows": [list(row.values()) for row in chunk]}
+                if len(chunk) < chunk_rows:
+                    break
+    except asyncpg.QueryCanceledError:
+        raise QueryError(f"Query timed out after {settings.query_timeout_seconds} seconds.")
+    except asyncpg.PostgresError as e:
+        raise QueryError(f"Database error: {e}")
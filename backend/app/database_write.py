@@ -4,68 +4,348 @@ Write utilities for the 3DCityDB.
 Separated from database.py to keep the read path clearly SELECT-only.
 run_query() in database.py remains unchanged and still rejects non-SELECT.
 """
+import uuid
+
 from app.database import get_pool
+from app.services.bins import BIN_LAYER, apply_building_delta
+from app.services.cache import building_detail_cache, bump_write_epoch
+from app.services.generalize import refresh_generalized
+from app.services.mvt import invalidate_bbox
+from app.services.tiles3d import schedule_rebuild as schedule_tile_rebuild
+
+_BBOX_COLUMNS = "ST_XMin(geometry), ST_YMin(geometry), ST_XMax(geometry), ST_YMax(geometry)"
 
 
 async def execute_write(sql: str, *args) -> None:
     """Execute a single parameterized DML statement."""
-    pool = await get_pool()
+    pool = await get_pool("write")
     async with pool.acquire() as conn:
         await conn.execute(sql, *args)
 
 
 async def execute_transaction(ops: list[tuple[str, list]]) -> None:
     """Execute multiple DML statements atomically."""
-    pool = await get_pool()
+    pool = await get_pool("write")
     async with pool.acquire() as conn:
         async with conn.transaction():
             for sql, args in ops:
                 await conn.execute(sql, *args)
 
 
-async def update_building_footprint(gmlid: str) -> None:
-    """Recompute and update the single row for this building in the footprints table."""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+# Footprint rows are recomputed by app/services/footprint_queue.py from the gmlids the
+# edit transactions queued (migration 015), many buildings per pass.
+
+_UPSERT_FOOTPRINTS_SQL = f"""
+    INSERT INTO citydb.building_footprints AS fp
+        (gmlid, measured_height, usage, has_lod2, geometry)
+    SELECT
+        co.gmlid,
+        COALESCE(b.measured_height, 0)          AS measured_height,
+        b.usage,
+        (b.lod2_solid_id IS NOT NULL)           AS has_lod2,
+        ST_SetSRID(
+            ST_FlipCoordinates(
+                ST_Union(ST_Force2D(sg.geometry))
+            ), 4326
+        )::geometry(Geometry, 4326)             AS geometry
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    JOIN citydb.surface_geometry sg
+         ON sg.root_id = b.lod1_solid_id
+    WHERE b.building_root_id = b.id
+      AND sg.geometry IS NOT NULL
+      AND co.gmlid = ANY($1)
+    GROUP BY co.gmlid, b.id,
+             b.measured_height, b.usage, b.lod2_solid_id
+    ON CONFLICT (gmlid) DO UPDATE
+    SET geometry         = EXCLUDED.geometry,
+        has_lod2         = EXCLUDED.has_lod2,
+        measured_height  = EXCLUDED.measured_height,
+        usage            = EXCLUDED.usage
+    RETURNING fp.gmlid, {_BBOX_COLUMNS.replace("geometry", "fp.geometry")}
+"""
+
+# Attribute-only edits: copy the columns over, the outline is unchanged
+_UPDATE_FOOTPRINT_ATTRS_SQL = """
+    UPDATE citydb.building_footprints fp
+    SET measured_height = COALESCE(b.measured_height, 0),
+        usage           = b.usage,
+        has_lod2        = (b.lod2_solid_id IS NOT NULL)
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    WHERE b.building_root_id = b.id
+      AND co.gmlid = fp.gmlid
+      AND fp.gmlid = ANY($1)
+"""
+
+
+async def recompute_footprints(conn, geometry_gmlids: list[str], attr_gmlids: list[str]) -> list:
+    """
+    Bring the footprint rows, generalized levels and bins of these buildings up to date.
+
+    geometry_gmlids get their LOD1 faces re-unioned (rows of buildings that no longer
+    exist, or have no LOD1 geometry, are removed); attr_gmlids only get height, usage
+    and has_lod2 copied over. Returns (layer, bbox) pairs whose cached tiles are stale,
+    for invalidate_footprints() once the transaction has committed.
+    """
+    gmlids = list(geometry_gmlids) + list(attr_gmlids)
+    if not gmlids:
+        return []
+    old_bboxes = await conn.fetch(
+        f"SELECT {_BBOX_COLUMNS} FROM citydb.building_footprints WHERE gmlid = ANY($1)",
+        gmlids,
+    )
+    bins = await apply_building_delta(conn, gmlids, -1)
+    new_bboxes = []
+    if geometry_gmlids:
+        new_rows = await conn.fetch(_UPSERT_FOOTPRINTS_SQL, geometry_gmlids)
+        kept = {r["gmlid"] for r in new_rows}
+        gone = [g for g in geometry_gmlids if g not in kept]
+        if gone:
+            await conn.execute("DELETE FROM citydb.building_footprints WHERE gmlid = ANY($1)", gone)
+        await refresh_generalized(conn, "building_footprints", geometry_gmlids)
+        new_bboxes = [tuple(r)[1:] for r in new_rows]
+    if attr_gmlids:
+        await conn.execute(_UPDATE_FOOTPRINT_ATTRS_SQL, attr_gmlids)
+    bins += await apply_building_delta(conn, gmlids, 1)
+    # Old and new outlines: a shrunk or moved footprint must vanish from its old tiles
+    return (
+        [("building_footprints", bbox) for bbox in list(old_bboxes) + new_bboxes]
+        + [(BIN_LAYER, bbox) for bbox in bins]
+    )
+
+
+def invalidate_footprints(gmlids: list[str], stale: list) -> None:
+    """Drop cached tiles, details and 3D tiles after recompute_footprints() committed."""
+    for layer, bbox in stale:
+        invalidate_bbox(layer, bbox)
+    for gmlid in gmlids:
+        building_detail_cache.invalidate(gmlid)
+        schedule_tile_rebuild(gmlid)
+    bump_write_epoch()
+
+
+# Per-building rebuild of citydb.building_lod2_cache (migration 008).
+_LOD2_CACHE_SELECT = """
+    SELECT
+        co.gmlid,
+        json_agg(json_build_object(
+            'objectclass_id', ts.objectclass_id,
+            'geometry', ST_AsGeoJSON(ST_FlipCoordinates(sg.geometry), 15, 0)::json
+        ) ORDER BY sg.id),
+        json_agg(json_build_object(
+            'objectclass_id', ts.objectclass_id,
+            'geometry', ST_AsGeoJSON(
+                ST_Transform(ST_SetSRID(ST_FlipCoordinates(sg.geometry), 4326), 6677), 6, 0
+            )::json
+        ) ORDER BY sg.id),
+        now()
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    JOIN citydb.thematic_surface ts ON ts.building_id = b.id
+    JOIN citydb.surface_geometry sg ON sg.root_id = ts.lod2_multi_surface_id
+    WHERE sg.geometry IS NOT NULL
+      AND co.gmlid = $1
+    GROUP BY co.gmlid
+"""
+
+
+async def refresh_building_lod2_cache(conn, gmlid: str) -> None:
+    """Re-encode this building's LOD2 surfaces. Call inside the edit transaction."""
+    await conn.execute("DELETE FROM citydb.building_lod2_cache WHERE gmlid = $1", gmlid)
+    await conn.execute(
+        "INSERT INTO citydb.building_lod2_cache (gmlid, surfaces_wgs84, surfaces_6677, updated_at) "
+        + _LOD2_CACHE_SELECT,
+        gmlid,
+    )
+
+
+async def delete_building_lod2_cache(conn, gmlid: str) -> None:
+    """Remove the cached LOD2 encodings of a deleted building. Call inside the edit transaction."""
+    await conn.execute("DELETE FROM citydb.building_lod2_cache WHERE gmlid = $1", gmlid)
+
+
+# ── Building rows (shared by the edit endpoints and the diff importer) ─────────
+# Geometry is passed as WKT in EPSG:6668 axis order (lat lon z).
+
+async def delete_buildings(conn, building_ids: list[int]) -> int:
+    """
+    Cascade-delete root buildings and everything hanging off them, including their
+    LOD2 cache rows, in a fixed number of statements (citydb.delete_buildings,
+    migration 014). Returns the number deleted. Call inside a transaction.
+    """
+    if not building_ids:
+        return 0
+    return await conn.fetchval("SELECT citydb.delete_buildings($1)", building_ids)
+
+
+# New rows get ids preallocated from the 3DCityDB sequences in one round trip,
+# so a whole solid or surface set (root and faces, parents and children) goes
+# in as one unnest() INSERT per table regardless of the face count.
+
+_ALLOCATE_IDS_SQL = """
+    SELECT ARRAY(SELECT nextval('citydb.cityobject_seq') FROM generate_series(1, $1)),
+           ARRAY(SELECT nextval('citydb.surface_geometry_seq') FROM generate_series(1, $2))
+"""
+
+_INSERT_SURFACE_GEOMETRY_SQL = """
+    INSERT INTO citydb.surface_geometry
+        (id, parent_id, root_id, is_solid, is_composite, is_triangulated,
+         is_xlink, is_reverse, geometry, cityobject_id)
+    SELECT id, parent_id, root_id, is_solid, is_composite, 0, 0, 0,
+           ST_GeomFromText(wkt, 6668), cityobject_id
+    FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::int[], $5::int[], $6::text[], $7::bigint[])
+        AS t(id, parent_id, root_id, is_solid, is_composite, wkt, cityobject_id)
+"""
+
+
+async def _allocate_ids(conn, cityobjects: int, surface_geometries: int) -> tuple[list[int], list[int]]:
+    row = await conn.fetchrow(_ALLOCATE_IDS_SQL, cityobjects, surface_geometries)
+    return list(row[0]), list(row[1])
+
+
+async def _insert_surface_geometry(conn, rows: list[tuple]) -> None:
+    """rows: (id, parent_id, root_id, is_solid, is_composite, wkt or None, cityobject_id)."""
+    await conn.execute(_INSERT_SURFACE_GEOMETRY_SQL, *(list(col) for col in zip(*rows)))
+
+
+def _geometry_rows(root_id: int, face_ids: list[int], wkts: list[str], cityobject_id: int,
+                   is_solid: int, is_composite: int) -> list[tuple]:
+    """A geometry-less root row (root_id = id) followed by one row per face polygon."""
+    rows = [(root_id, None, root_id, is_solid, is_composite, None, cityobject_id)]
+    rows += [(face_id, root_id, root_id, 0, 0, wkt, cityobject_id) for face_id, wkt in zip(face_ids, wkts)]
+    return rows
+
+
+async def replace_lod1_solid(conn, building_id: int, old_solid_id, face_wkts: list[str]) -> int:
+    """
+    Replace the building's LOD1 solid with the given faces and refresh its envelope.
+    Returns the new solid's root id. Call inside a transaction.
+    """
+    # 1. Insert the new solid (root + faces) under preallocated ids
+    _, sg_ids = await _allocate_ids(conn, 0, len(face_wkts) + 1)
+    new_root_id = sg_ids[0]
+    await _insert_surface_geometry(
+        conn, _geometry_rows(new_root_id, sg_ids[1:], face_wkts, building_id, is_solid=1, is_composite=0)
+    )
+
+    # 2. Point the building at the new solid, then drop the old one
+    await conn.execute(
+        "UPDATE citydb.building SET lod1_solid_id = $1 WHERE id = $2",
+        new_root_id, building_id,
+    )
+    if old_solid_id:
         await conn.execute(
-            """
-            UPDATE citydb.building_footprints fp
-            SET geometry         = sub.geometry,
-                has_lod2         = sub.has_lod2,
-                measured_height  = sub.measured_height,
-                usage            = sub.usage
-            FROM (
-                SELECT
-                    co.gmlid,
-                    COALESCE(b.measured_height, 0)          AS measured_height,
-                    b.usage,
-                    (b.lod2_solid_id IS NOT NULL)           AS has_lod2,
-                    ST_SetSRID(
-                        ST_FlipCoordinates(
-                            ST_Union(ST_Force2D(sg.geometry))
-                        ), 4326
-                    )::geometry(Geometry, 4326)             AS geometry
-                FROM citydb.building b
-                JOIN citydb.cityobject co ON co.id = b.id
-                JOIN citydb.surface_geometry sg
-                     ON sg.root_id = b.lod1_solid_id
-                WHERE b.building_root_id = b.id
-                  AND sg.geometry IS NOT NULL
-                  AND co.gmlid = $1
-                GROUP BY co.gmlid, b.id,
-                         b.measured_height, b.usage, b.lod2_solid_id
-            ) sub
-            WHERE fp.gmlid = sub.gmlid
-            """,
-            gmlid,
+            "DELETE FROM citydb.surface_geometry WHERE root_id = $1",
+            old_solid_id,
         )
 
+    # 3. Update cityobject envelope (3D bounding polygon in EPSG:6668)
+    await conn.execute(
+        """
+        UPDATE citydb.cityobject
+        SET envelope = (
+            SELECT ST_SetSRID(ST_Force3DZ(ST_Envelope(ST_Collect(sg.geometry))), 6668)
+            FROM citydb.surface_geometry sg
+            WHERE sg.root_id = $1 AND sg.geometry IS NOT NULL
+        )
+        WHERE id = $2
+        """,
+        new_root_id, building_id,
+    )
+    return new_root_id
 
-async def delete_building_footprint(gmlid: str) -> None:
-    """Remove the footprint row for a deleted building."""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+
+async def replace_lod2_surfaces(
+    conn,
+    building_id: int,
+    gmlid: str,
+    old_solid_id,
+    surfaces: list[tuple[int, list[str], str | None]],
+) -> None:
+    """
+    Replace the building's LOD2 thematic surfaces and re-encode its LOD2 cache.
+
+    surfaces: (objectclass_id 33/34/35, polygon WKTs, surface gml:id or None).
+    Call inside a transaction.
+    """
+    # Collect old thematic surface IDs and their geometry roots
+    ts_rows = await conn.fetch(
+        "SELECT id, lod2_multi_surface_id FROM citydb.thematic_surface WHERE building_id = $1",
+        building_id,
+    )
+    old_ts_ids = [r["id"] for r in ts_rows]
+    old_ms_ids = [r["lod2_multi_surface_id"] for r in ts_rows if r["lod2_multi_surface_id"]]
+    if old_solid_id:
+        old_ms_ids.append(old_solid_id)
+    old_ms_ids = list(set(old_ms_ids))
+
+    # 1. Break FK: building → lod2_solid_id
+    await conn.execute(
+        "UPDATE citydb.building SET lod2_solid_id = NULL WHERE id = $1",
+        building_id,
+    )
+
+    # 2. Delete old thematic_surface rows (they hold the FK to their geometry),
+    #    then their geometry and cityobject entries
+    if old_ts_ids:
         await conn.execute(
-            "DELETE FROM citydb.building_footprints WHERE gmlid = $1",
-            gmlid,
+            "DELETE FROM citydb.thematic_surface WHERE building_id = $1",
+            building_id,
         )
+    if old_ms_ids:
+        await conn.execute(
+            "DELETE FROM citydb.surface_geometry WHERE root_id = ANY($1)",
+            old_ms_ids,
+        )
+    if old_ts_ids:
+        await conn.execute(
+            "DELETE FROM citydb.cityobject WHERE id = ANY($1)",
+            old_ts_ids,
+        )
+
+    if not surfaces:
+        await delete_building_lod2_cache(conn, gmlid)
+        return
+
+    # 3. Preallocate one cityobject per surface and one geometry row per root and face
+    co_ids, sg_ids = await _allocate_ids(
+        conn, len(surfaces), sum(len(wkts) + 1 for _, wkts, _ in surfaces)
+    )
+    sg_rows, ts_rows = [], []
+    next_sg = iter(sg_ids)
+    for ts_co_id, (oc_id, wkts, _) in zip(co_ids, surfaces):
+        root_id = next(next_sg)
+        face_ids = [next(next_sg) for _ in wkts]
+        # MultiSurface root: is_composite=1
+        sg_rows += _geometry_rows(root_id, face_ids, wkts, ts_co_id, is_solid=0, is_composite=1)
+        ts_rows.append((ts_co_id, oc_id, root_id))
+
+    # 4. cityobject → surface_geometry → thematic_surface, one statement each
+    await conn.execute(
+        """
+        INSERT INTO citydb.cityobject (id, objectclass_id, gmlid)
+        SELECT * FROM unnest($1::bigint[], $2::int[], $3::text[])
+        """,
+        co_ids,
+        [oc_id for oc_id, _, _ in surfaces],
+        [ts_gmlid or f"TS-{gmlid}-{uuid.uuid4().hex[:8]}" for _, _, ts_gmlid in surfaces],
+    )
+    await _insert_surface_geometry(conn, sg_rows)
+    await conn.execute(
+        """
+        INSERT INTO citydb.thematic_surface (id, objectclass_id, building_id, lod2_multi_surface_id)
+        SELECT id, objectclass_id, $4, root_id
+        FROM unnest($1::bigint[], $2::int[], $3::bigint[]) AS t(id, objectclass_id, root_id)
+        """,
+        [r[0] for r in ts_rows], [r[1] for r in ts_rows], [r[2] for r in ts_rows], building_id,
+    )
+
+    # 5. Mark building as having LOD2 (use last surface root as lod2_solid_id)
+    await conn.execute(
+        "UPDATE citydb.building SET lod2_solid_id = $1 WHERE id = $2",
+        ts_rows[-1][2], building_id,
+    )
+
+    # 6. Re-encode the served LOD2 payloads
+    await refresh_building_lod2_cache(conn, gmlid)
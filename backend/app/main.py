@@ -2,14 +2,19 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api import query, health, buildings, buildings_write, features, chat, export, versions, areas, shelters
+from app.api import query, health, buildings, buildings_write, features, chat, export, versions, areas, shelters, tiles, tiles3d, changes
 from app.database import get_pool, close_pool
+from app.services import changes as change_feed, footprint_queue
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await get_pool()   # warm up DB pool on startup
+    await get_pool()          # warm up interactive + write pools on startup
+    await get_pool("write")
+    footprint_queue.kick()    # footprint recomputes left queued by a previous run
+    change_feed.start()       # LISTEN for changes made by other workers and tools
     yield
+    await change_feed.stop()
     await close_pool()
 
 
@@ -37,3 +42,6 @@ app.include_router(export.router, prefix="/api")
 app.include_router(versions.router, prefix="/api")
 app.include_router(areas.router, prefix="/api")
 app.include_router(shelters.router, prefix="/api")
+app.include_router(tiles.router, prefix="/api")
+app.include_router(tiles3d.router, prefix="/api")
+app.include_router(changes.router, prefix="/api")
@@ -0,0 +1,181 @@
+"""
+Building statistics aggregated into square bins, served as the low-zoom tile layer.
+
+citydb.building_bins (migration 010) holds, per resolution, the buildings whose
+footprint centroid falls in each EPSG:6677 grid cell: count, summed height over
+buildings with a measured height, and a {usage: count} histogram. Cells of the
+coarser resolutions are exact unions of the finer ones (1000 = 2 × 500, ...),
+so the levels stay consistent with each other.
+
+    resolution  cell    zooms
+    1           1000 m  <= 11
+    2           500 m   12
+    3           250 m   13
+    4           100 m   >= 14
+
+Bins are maintained incrementally: recompute_footprints subtracts the
+buildings' old rows (apply_building_delta(conn, gmlids, -1) before the upsert)
+and adds the new ones afterwards, in the same transaction. rebuild_bins() recomputes
+every bin after the footprint table itself was rebuilt. BIN_SIZES must stay in
+sync with the VALUES list in data/migrations/010_building_bins.sql.
+"""
+
+BIN_LAYER = "building_bins"
+
+# resolution → (cell size m, highest zoom using it)
+BIN_SIZES = {
+    1: (1000.0, 11),
+    2: (500.0, 12),
+    3: (250.0, 13),
+    4: (100.0, None),
+}
+
+_SIZE_VALUES = ", ".join(f"({res}, {size})" for res, (size, _) in BIN_SIZES.items())
+
+# Add (delta=1) or remove (delta=-1) the contribution of a set of buildings at
+# every resolution; cells are aggregated first so each bin is upserted once
+_DELTA_SQL = f"""
+    WITH cells AS (
+        SELECT r.resolution, r.size,
+               floor(ST_X(fp.p) / r.size)::int AS i,
+               floor(ST_Y(fp.p) / r.size)::int AS j,
+               fp.h, fp.u
+        FROM (
+            SELECT ST_Transform(ST_Centroid(geometry), 6677) AS p,
+                   measured_height::float8                   AS h,
+                   COALESCE(usage, 'unknown')                AS u
+            FROM citydb.building_footprints
+            WHERE gmlid = ANY($1) AND geometry IS NOT NULL
+        ) fp
+        CROSS JOIN (VALUES {_SIZE_VALUES}) AS r(resolution, size)
+    ),
+    usage_per_cell AS (
+        SELECT resolution, i, j, jsonb_object_agg(u, $2::int * n) AS usage_counts
+        FROM (SELECT resolution, i, j, u, COUNT(*) AS n FROM cells GROUP BY resolution, i, j, u) t
+        GROUP BY resolution, i, j
+    )
+    INSERT INTO citydb.building_bins AS b
+        (resolution, i, j, building_count, height_count, height_sum, usage_counts, geometry)
+    SELECT c.resolution, c.i, c.j,
+           $2::int * COUNT(*),
+           $2::int * COUNT(*) FILTER (WHERE c.h > 0),
+           $2::int * COALESCE(SUM(c.h) FILTER (WHERE c.h > 0), 0),
+           u.usage_counts,
+           ST_Transform(ST_MakeEnvelope(
+               c.i * c.size, c.j * c.size, (c.i + 1) * c.size, (c.j + 1) * c.size, 6677
+           ), 4326)
+    FROM cells c
+    JOIN usage_per_cell u USING (resolution, i, j)
+    GROUP BY c.resolution, c.size, c.i, c.j, u.usage_counts
+    ON CONFLICT (resolution, i, j) DO UPDATE SET
+        building_count = b.building_count + EXCLUDED.building_count,
+        height_count   = b.height_count + EXCLUDED.height_count,
+        height_sum     = b.height_sum + EXCLUDED.height_sum,
+        usage_counts   = COALESCE((
+            SELECT jsonb_object_agg(key, n)
+            FROM (
+                SELECT key, sum(value::int) AS n
+                FROM (
+                    SELECT * FROM jsonb_each_text(b.usage_counts)
+                    UNION ALL
+                    SELECT * FROM jsonb_each_text(EXCLUDED.usage_counts)
+                ) kv
+                GROUP BY key
+                HAVING sum(value::int) > 0
+            ) merged
+        ), '{{}}'::jsonb)
+    RETURNING ST_XMin(b.geometry), ST_YMin(b.geometry), ST_XMax(b.geometry), ST_YMax(b.geometry)
+"""
+
+# Same as the bulk INSERT in migration 010
+_REBUILD_SQL = f"""
+    WITH centroids AS (
+        SELECT ST_Transform(ST_Centroid(geometry), 6677) AS p,
+               measured_height::float8                   AS h,
+               COALESCE(usage, 'unknown')                AS u
+        FROM citydb.building_footprints
+        WHERE geometry IS NOT NULL
+    ),
+    cells AS (
+        SELECT r.resolution, r.size,
+               floor(ST_X(c.p) / r.size)::int AS i,
+               floor(ST_Y(c.p) / r.size)::int AS j,
+               c.h, c.u
+        FROM centroids c
+        CROSS JOIN (VALUES {_SIZE_VALUES}) AS r(resolution, size)
+    ),
+    usage_per_cell AS (
+        SELECT resolution, i, j, jsonb_object_agg(u, n) AS usage_counts
+        FROM (SELECT resolution, i, j, u, COUNT(*) AS n FROM cells GROUP BY resolution, i, j, u) t
+        GROUP BY resolution, i, j
+    )
+    INSERT INTO citydb.building_bins
+    SELECT c.resolution, c.i, c.j,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE c.h > 0),
+           COALESCE(SUM(c.h) FILTER (WHERE c.h > 0), 0),
+           u.usage_counts,
+           ST_Transform(ST_MakeEnvelope(
+               c.i * c.size, c.j * c.size, (c.i + 1) * c.size, (c.j + 1) * c.size, 6677
+           ), 4326)
+    FROM cells c
+    JOIN usage_per_cell u USING (resolution, i, j)
+    GROUP BY c.resolution, c.size, c.i, c.j, u.usage_counts
+"""
+
+_TILE_SQL = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope($1, $2, $3) AS env,
+               ST_Transform(ST_TileEnvelope($1, $2, $3, margin => {margin}), 4326) AS filter
+    )
+    SELECT ST_AsMVT(t, '{layer}', {extent}, 'geom')
+    FROM (
+        SELECT b.building_count,
+               round((b.building_count / {hectares})::numeric, 2)             AS density,
+               round((b.height_sum / NULLIF(b.height_count, 0))::numeric, 1)  AS mean_height,
+               (SELECT key FROM jsonb_each_text(b.usage_counts)
+                ORDER BY value::int DESC, key LIMIT 1)                        AS dominant_usage,
+               ST_AsMVTGeom(ST_Transform(b.geometry, 3857), bounds.env, {extent}, {buffer}, true) AS geom
+        FROM citydb.building_bins b, bounds
+        WHERE b.resolution = {resolution}
+          AND b.geometry && bounds.filter
+    ) t
+    WHERE t.geom IS NOT NULL
+"""
+
+
+def resolution_for_zoom(z: int) -> int:
+    for resolution, (_, max_zoom) in sorted(BIN_SIZES.items()):
+        if max_zoom is None or z <= max_zoom:
+            return resolution
+    return max(BIN_SIZES)
+
+
+def bin_tile_sql(resolution: int, extent: int, buffer: int) -> str:
+    size = BIN_SIZES[resolution][0]
+    return _TILE_SQL.format(
+        layer=BIN_LAYER,
+        resolution=resolution,
+        hectares=size * size / 10000.0,
+        extent=extent,
+        buffer=buffer,
+        margin=buffer / extent,
+    )
+
+
+async def apply_building_delta(conn, gmlids: list[str], delta: int) -> list:
+    """
+    Apply the buildings' current footprint rows to their bins (delta=-1 removes them).
+    Returns the bounding boxes of the bins touched, for tile invalidation.
+    Call inside the transaction that changes the footprint row.
+    """
+    touched = await conn.fetch(_DELTA_SQL, gmlids, delta)
+    if delta < 0:
+        await conn.execute("DELETE FROM citydb.building_bins WHERE building_count <= 0")
+    return touched
+
+
+async def rebuild_bins(conn) -> None:
+    """Recompute every bin from the footprint table. Call inside a transaction."""
+    await conn.execute("DELETE FROM citydb.building_bins")
+    await conn.execute(_REBUILD_SQL)
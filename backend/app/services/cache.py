@@ -0,0 +1,132 @@
+"""
+In-process LRU result caches invalidated by a write epoch.
+
+Every write path calls bump_write_epoch() once its changes are committed.
+Caches created with clear_on_write=True (e.g. NL query results, which may
+depend on any table) are emptied on every bump; other caches are invalidated
+per key by the write path that knows which entries it touched.
+
+put() takes the epoch observed *before* the value was computed and silently
+drops the value if a write happened in between, so a read that raced a write
+is never cached. Neither is anything read from a replica (database.is_replica_pool):
+a lagging replica can return the pre-edit row after the epoch was bumped.
+
+Caches live in the worker process: with several uvicorn workers each one keeps
+its own copy and only sees its own writes.
+"""
+
+import re
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app.config import get_settings
+
+_write_epoch = 0
+_caches: list["ResultCache"] = []
+
+
+def current_epoch() -> int:
+    return _write_epoch
+
+
+def bump_write_epoch() -> int:
+    """Advance the write epoch and empty every clear_on_write cache."""
+    global _write_epoch
+    _write_epoch += 1
+    for cache in _caches:
+        if cache.clear_on_write:
+            cache.clear()
+    return _write_epoch
+
+
+class ResultCache:
+    """LRU mapping capped by entry count and by the caller-estimated byte size."""
+
+    def __init__(self, name: str, max_bytes: int, max_entries: int = 1024, clear_on_write: bool = False):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.clear_on_write = clear_on_write
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int, epoch: int) -> None:
+        if epoch != _write_epoch or size > self.max_bytes:
+            return
+        self.invalidate(key)
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def invalidate(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def keys(self) -> list[Hashable]:
+        return list(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Quoted literals/identifiers (including E'...' escape strings and $$...$$ /
+# $tag$...$tag$ dollar quotes) are kept verbatim; everything else is
+# whitespace-collapsed and lower-cased (PostgreSQL folds unquoted identifiers).
+_SQL_TOKEN = re.compile(r"""
+    (?P<literal>
+        [Ee]'(?:[^'\\]|\\.|'')*'
+      | '(?:[^']|'')*'
+      | "(?:[^"]|"")*"
+      | \$(?P<tag>[A-Za-z_]\w*|)\$[\s\S]*?\$(?P=tag)\$
+    )
+  | (?P<space>\s+)
+  | (?P<word>(?:(?![Ee]')[^'"\s$])+|[$'"])
+""", re.VERBOSE)
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical cache key for a SQL string."""
+    parts = []
+    for m in _SQL_TOKEN.finditer(sql.strip().rstrip(";")):
+        if m.lastgroup == "literal":
+            parts.append(m.group())
+        elif m.lastgroup == "space":
+            parts.append(" ")
+        else:
+            parts.append(m.group().lower())
+    return "".join(parts).strip()
+
+
+# ── Shared caches ──────────────────────────────────────────────────────────────
+
+# gmlid → JSON text of GET /api/buildings/{gmlid}; invalidated per building by
+# the write endpoints and footprint maintenance.
+building_detail_cache = ResultCache(
+    "building_detail",
+    max_bytes=get_settings().building_detail_cache_max_bytes,
+    max_entries=get_settings().building_detail_cache_max_entries,
+)
@@ -0,0 +1,180 @@
+"""
+Change feed: compact change events published with Postgres NOTIFY.
+
+Write paths call publish(conn, kind, items) inside their transaction; NOTIFY is
+transactional, so an event is delivered exactly when its change commits and
+never for a rolled-back one. Events are JSON objects on channel citydb_changes:
+
+    {"kind": "versions", "source": "manual-edit", "items": [[gmlid, change_type, version], ...]}
+        new feature versions (app/services/versioning.py)
+    {"kind": "tiles", "items": [[layer, [xmin, ymin, xmax, ymax]], ...]}
+        lon/lat boxes of MVT tiles made stale by a footprint recompute
+    {"kind": "reset"}
+        everything cached should be revalidated: published by command-line tools
+        that rewrite data out of band (publish_reset), or synthetic when the
+        listener reconnected or a client fell behind and events may be missed
+
+Large item lists are split over several notifications (the payload limit is
+8000 bytes).
+
+Each worker process holds one listener connection to the primary (start() /
+stop() from the app lifespan) and fans every event out to:
+  - in-process subscribers registered with subscribe(handler), so caches of
+    this worker also see writes made by other workers and by command-line tools
+  - GET /api/changes/stream clients, each with a bounded queue (client())
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from typing import Callable
+
+import asyncpg
+
+from app.config import get_settings
+from app.database import _asyncpg_dsn
+from app.services.cache import building_detail_cache, bump_write_epoch
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "citydb_changes"
+_MAX_PAYLOAD = 7900
+_RESET = json.dumps({"kind": "reset"})
+
+_handlers: list[Callable[[dict], None]] = []
+_clients: set[asyncio.Queue] = set()
+_listener: asyncio.Task | None = None
+
+
+async def publish(conn, kind: str, items: list, **fields) -> None:
+    """NOTIFY an event of this kind, split into as many payloads as the items need."""
+    if not items:
+        return
+    head = json.dumps({"kind": kind, **fields, "items": []}, ensure_ascii=False)[:-3]
+    payloads, chunk, size = [], [], len(head) + 2
+    for item in items:
+        encoded = json.dumps(item, ensure_ascii=False)
+        if chunk and size + len(encoded.encode()) + 1 > _MAX_PAYLOAD:
+            payloads.append(f"{head}[{','.join(chunk)}]}}")
+            chunk, size = [], len(head) + 2
+        chunk.append(encoded)
+        size += len(encoded.encode()) + 1
+    payloads.append(f"{head}[{','.join(chunk)}]}}")
+    await conn.execute(
+        "SELECT pg_notify($1, p) FROM unnest($2::text[]) AS p", CHANNEL, payloads,
+    )
+
+
+async def publish_reset(conn) -> None:
+    """
+    NOTIFY a reset: every worker drops its in-process caches and stream clients
+    revalidate. For command-line tools that rewrite data out of band.
+    """
+    await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, _RESET)
+
+
+def subscribe(handler: Callable[[dict], None]) -> None:
+    """Call handler(event) for every event this worker receives, including its own."""
+    _handlers.append(handler)
+
+
+@contextmanager
+def client():
+    """Register a stream client; yields the queue of raw JSON payloads it should send."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=get_settings().change_stream_queue_size)
+    _clients.add(queue)
+    try:
+        yield queue
+    finally:
+        _clients.discard(queue)
+
+
+def _dispatch(payload: str) -> None:
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.warning("change feed: ignoring malformed payload %r", payload[:200])
+        return
+    for handler in _handlers:
+        try:
+            handler(event)
+        except Exception:
+            logger.exception("change feed: handler %r failed", handler)
+    for queue in _clients:
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Too slow to keep up: replace the backlog with a single reset
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_RESET)
+
+
+def _on_notify(conn, pid, channel, payload) -> None:
+    _dispatch(payload)
+
+
+async def _listen() -> None:
+    dsn = _asyncpg_dsn(get_settings().database_url)
+    delay = 1.0
+    connected_before = False
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _: lost.set())
+            await conn.add_listener(CHANNEL, _on_notify)
+            if connected_before:
+                _dispatch(_RESET)   # events sent while disconnected are gone
+            connected_before, delay = True, 1.0
+            await lost.wait()
+            logger.warning("change feed: listener connection lost, reconnecting")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Any failure (refused connection, InterfaceError from add_listener, ...)
+            # must not end the task: without it invalidation and SSE stop silently
+            logger.warning("change feed: cannot listen (%r), retrying in %.0fs", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        finally:
+            if conn is not None and not conn.is_closed():
+                try:
+                    await conn.close(timeout=5)
+                except Exception:
+                    conn.terminate()
+
+
+def start() -> None:
+    """Start this worker's listener (app lifespan)."""
+    global _listener
+    if _listener is None:
+        _listener = asyncio.get_running_loop().create_task(_listen())
+
+
+async def stop() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        try:
+            await _listener
+        except asyncio.CancelledError:
+            pass
+        _listener = None
+
+
+def _invalidate_shared_caches(event: dict) -> None:
+    """Keep app.services.cache in step with writes made outside this worker."""
+    kind = event.get("kind")
+    if kind == "versions":
+        for gmlid, _, _ in event["items"]:
+            building_detail_cache.invalidate(gmlid)
+        bump_write_epoch()
+    elif kind == "reset":
+        building_detail_cache.clear()
+        bump_write_epoch()
+
+
+subscribe(_invalidate_shared_caches)
@@ -0,0 +1,98 @@
+"""
+CityJSON geometry encoding with quantized, deduplicated vertices.
+
+Surfaces come from citydb.building_lod2_cache.surfaces_6677 (EPSG:6677 metres,
+GeoJSON Polygon/MultiPolygon per thematic surface). Usage:
+
+    vertices = VertexCollector()
+    pending = [vertices.add_surfaces(surfaces) for surfaces in ...]
+    verts, transform = vertices.finish(precision)
+    geometry = [p.resolve(vertices) for p in pending]
+
+All coordinates of a document are quantized in one NumPy pass:
+round((xyz - translate) / scale) as int64, then np.unique(axis=0) merges
+vertices that fall into the same cell and gives every input coordinate its
+index. Vertices are written as integers with the matching CityJSON transform.
+"""
+
+import numpy as np
+
+_CITYJSON_TYPE = {33: "RoofSurface", 34: "WallSurface", 35: "GroundSurface"}
+
+
+class PendingGeometry:
+    """Solid of one building whose boundaries still refer to collector positions."""
+
+    def __init__(self):
+        self.faces: list[list[tuple[int, int]]] = []   # face → rings as (start, count)
+        self.semantic_surfaces: list[dict] = []
+        self.semantic_values: list[int] = []
+
+    def resolve(self, collector: "VertexCollector") -> list[dict]:
+        """CityJSON geometry list with final vertex indices (after collector.finish())."""
+        if not self.faces:
+            return []
+        idx = collector.indices
+        shell = [[idx[start:start + count] for start, count in face] for face in self.faces]
+        return [{
+            "type": "Solid",
+            "lod": "2",
+            "boundaries": [shell],
+            "semantics": {
+                "surfaces": self.semantic_surfaces,
+                "values": [self.semantic_values],
+            },
+        }]
+
+
+class VertexCollector:
+    """Accumulates ring coordinates for one CityJSON document or feature."""
+
+    def __init__(self):
+        self._coords: list[list[float]] = []
+        self.indices: list[int] = []
+
+    def add_surfaces(self, surfaces: list) -> PendingGeometry:
+        pending = PendingGeometry()
+        for surface in surfaces:
+            geom = surface["geometry"]
+            sem_idx = len(pending.semantic_surfaces)
+            pending.semantic_surfaces.append({"type": _CITYJSON_TYPE.get(surface["objectclass_id"], "WallSurface")})
+            polygons = (
+                [geom["coordinates"]] if geom["type"] == "Polygon"
+                else geom["coordinates"] if geom["type"] == "MultiPolygon"
+                else []
+            )
+            for poly_coords in polygons:
+                face = []
+                for ring in poly_coords:
+                    # CityJSON rings are implicitly closed: drop the repeated end point
+                    if len(ring) > 1 and ring[0] == ring[-1]:
+                        ring = ring[:-1]
+                    face.append((len(self._coords), len(ring)))
+                    self._coords.extend(ring)
+                pending.faces.append(face)
+                pending.semantic_values.append(sem_idx)
+        return pending
+
+    def min_corner(self) -> list[float]:
+        if not self._coords:
+            return [0.0, 0.0, 0.0]
+        return np.asarray(self._coords, dtype=np.float64).min(axis=0).tolist()
+
+    def finish(self, precision: float, translate: list[float] | None = None) -> tuple[list, dict]:
+        """
+        Quantize and deduplicate everything collected.
+
+        Returns (vertices, transform). translate defaults to the minimum corner,
+        so all vertices are small non-negative integers; a CityJSONSeq feature
+        passes the header's translate instead.
+        """
+        coords = np.asarray(self._coords, dtype=np.float64).reshape(-1, 3)
+        if translate is None:
+            translate = coords.min(axis=0).tolist() if len(coords) else [0.0, 0.0, 0.0]
+        quantized = np.rint((coords - np.asarray(translate)) / precision).astype(np.int64)
+        vertices, inverse = np.unique(quantized, axis=0, return_inverse=True)
+        self.indices = inverse.reshape(-1).tolist()
+        transform = {"scale": [precision] * 3, "translate": translate}
+        return vertices.tolist(), transform
@@ -0,0 +1,378 @@
+"""
+Incremental PLATEAU building re-import: apply only what changed between releases.
+
+    # once, against the release that is loaded today
+    python -m app.services.diff_import /tmp/bldg --baseline --source-tag PLATEAU-2024
+    # for each new release
+    python -m app.services.diff_import /tmp/bldg --source-tag PLATEAU-2025 [--dry-run]
+
+(data/import/run-diff-import.sh copies the GML into the backend container and
+runs this.) Every bldg:Building is streamed with iterparse and hashed: one
+sha1 over its attributes, one over its LOD1 solid and LOD2 thematic surface
+coordinates. The hashes are compared with citydb.import_feature_hashes
+(migration 011), i.e. with the previous release rather than the live tables:
+
+    not in the baseline                → insert (update if the gmlid exists)
+    attribute hash differs             → attribute update
+    geometry hash differs              → LOD1 solid + LOD2 surfaces replaced
+    in the baseline, missing from a
+    mesh that was imported             → delete
+
+Each change runs in its own transaction through the same row writers as the
+edit endpoints (app/database_write.py) and is recorded in feature_versions
+with the new source_tag. Buildings whose latest version is a manual edit are
+left untouched and reported as conflicts unless --overwrite-edits is given;
+buildings edited locally that did not change upstream are never touched.
+
+Only root buildings are handled (BuildingParts are not imported). The other
+feature types are small and still reloaded with run-import.sh.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from app.database import get_pool
+from app.database_write import delete_buildings, replace_lod1_solid, replace_lod2_surfaces
+from app.services import footprint_queue
+from app.services.tiles3d import flush_rebuilds
+from app.services.versioning import record_version
+
+logger = logging.getLogger(__name__)
+
+_GML = "{http://www.opengis.net/gml}"
+_CORE = "{http://www.opengis.net/citygml/2.0}"
+_BLDG = "{http://www.opengis.net/citygml/building/2.0}"
+
+_BUILDING_OC = 26
+_SURFACE_OC = {"RoofSurface": 33, "WallSurface": 34, "GroundSurface": 35}
+
+_BUILDING_ROW_SQL = """
+    SELECT b.id, b.lod1_solid_id, b.lod2_solid_id
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    WHERE co.gmlid = $1 AND b.building_root_id = b.id
+    LIMIT 1
+"""
+
+_UPSERT_HASH_SQL = """
+    INSERT INTO citydb.import_feature_hashes (gmlid, mesh, attr_hash, geom_hash, source_tag, imported_at)
+    VALUES ($1, $2, $3, $4, $5, now())
+    ON CONFLICT (gmlid) DO UPDATE
+    SET mesh = EXCLUDED.mesh, attr_hash = EXCLUDED.attr_hash, geom_hash = EXCLUDED.geom_hash,
+        source_tag = EXCLUDED.source_tag, imported_at = now()
+"""
+
+
+# ── Parsing ───────────────────────────────────────────────────────────────────
+
+def _text(el, path: str) -> str | None:
+    found = el.find(path)
+    return found.text.strip() if found is not None and found.text and found.text.strip() else None
+
+
+def _ring(pos_list) -> str:
+    # GML posList is already in EPSG:6668 axis order (lat lon h)
+    nums = pos_list.text.split()
+    return "(" + ", ".join(" ".join(nums[i:i + 3]) for i in range(0, len(nums) - 2, 3)) + ")"
+
+
+def _polygon_wkt(poly) -> str | None:
+    ext = poly.find(f"{_GML}exterior/{_GML}LinearRing/{_GML}posList")
+    if ext is None or not ext.text:
+        return None
+    rings = [_ring(ext)]
+    for intr in poly.findall(f"{_GML}interior/{_GML}LinearRing/{_GML}posList"):
+        if intr.text:
+            rings.append(_ring(intr))
+    return "POLYGON Z(" + ", ".join(rings) + ")"
+
+
+def _to_float(v: str | None) -> float | None:
+    try:
+        return float(v) if v is not None else None
+    except ValueError:
+        return None
+
+
+def _to_int(v: str | None) -> int | None:
+    try:
+        return int(v) if v is not None else None
+    except ValueError:
+        return None
+
+
+def parse_building(el) -> dict:
+    """Attributes and geometry (WKT, EPSG:6668) of one bldg:Building element."""
+    attrs = {
+        "name": _text(el, f"{_GML}name"),
+        "class": _text(el, f"{_BLDG}class"),
+        "usage": _text(el, f"{_BLDG}usage"),
+        "measured_height": _to_float(_text(el, f"{_BLDG}measuredHeight")),
+        "storeys_above_ground": _to_int(_text(el, f"{_BLDG}storeysAboveGround")),
+    }
+    lod1 = [w for w in (_polygon_wkt(p) for p in el.iterfind(f"{_BLDG}lod1Solid//{_GML}Polygon")) if w]
+    lod2 = []
+    for bounded in el.findall(f"{_BLDG}boundedBy"):
+        for surface in bounded:
+            oc = _SURFACE_OC.get(surface.tag.removeprefix(_BLDG))
+            if oc is None:
+                continue
+            polys = [w for w in (_polygon_wkt(p) for p in surface.iterfind(f".//{_GML}Polygon")) if w]
+            if polys:
+                lod2.append((oc, polys, surface.get(f"{_GML}id")))
+
+    attr_hash = hashlib.sha1(json.dumps(attrs, sort_keys=True).encode()).hexdigest()
+    geom = "|".join(lod1) + "#" + "|".join(f"{oc}:{';'.join(polys)}" for oc, polys, _ in lod2)
+    return {
+        "gmlid": el.get(f"{_GML}id"),
+        "attrs": attrs,
+        "lod1": lod1,
+        "lod2": lod2,
+        "attr_hash": attr_hash,
+        "geom_hash": hashlib.sha1(geom.encode()).hexdigest(),
+    }
+
+
+def iter_buildings(path: Path):
+    """Yield parsed root buildings of one GML file, clearing each member once read."""
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, el in context:
+        if event == "end" and el.tag == f"{_CORE}cityObjectMember":
+            for child in el:
+                if child.tag == f"{_BLDG}Building" and child.get(f"{_GML}id"):
+                    yield parse_building(child)
+            root.clear()
+
+
+def gml_files(source: Path) -> list[Path]:
+    return sorted(source.rglob("*.gml")) if source.is_dir() else [source]
+
+
+def mesh_of(path: Path) -> str:
+    """PLATEAU file names start with the mesh code: 53394611_bldg_6697_op.gml."""
+    return path.name.split("_", 1)[0]
+
+
+# ── Applying changes ──────────────────────────────────────────────────────────
+
+def _snapshot(attrs: dict, has_lod1: bool, has_lod2: bool) -> dict:
+    return {**attrs, "has_lod1": has_lod1, "has_lod2": has_lod2}
+
+
+async def _apply_upsert(conn, f: dict, geometry_changed: bool, source_tag: str) -> str:
+    """Write one new or changed building; returns "inserted", "attr_updates" or "geometry_updates"."""
+    gmlid, attrs = f["gmlid"], f["attrs"]
+    row = await conn.fetchrow(_BUILDING_ROW_SQL, gmlid)
+    if row is None:
+        building_id = await conn.fetchval(
+            "INSERT INTO citydb.cityobject (objectclass_id, gmlid, name, creation_date) "
+            "VALUES ($1, $2, $3, now()) RETURNING id",
+            _BUILDING_OC, gmlid, attrs["name"],
+        )
+        await conn.execute(
+            """
+            INSERT INTO citydb.building
+                (id, objectclass_id, building_root_id, class, usage,
+                 measured_height, measured_height_unit, storeys_above_ground)
+            VALUES ($1, $2, $1, $3, $4, $5, 'm', $6)
+            """,
+            building_id, _BUILDING_OC, attrs["class"], attrs["usage"],
+            attrs["measured_height"], attrs["storeys_above_ground"],
+        )
+        lod1_solid_id = lod2_solid_id = None
+        change_type, outcome = "import", "inserted"
+        geometry_changed = True
+    else:
+        building_id, lod1_solid_id, lod2_solid_id = row["id"], row["lod1_solid_id"], row["lod2_solid_id"]
+        await conn.execute("UPDATE citydb.cityobject SET name = $1 WHERE id = $2", attrs["name"], building_id)
+        await conn.execute(
+            "UPDATE citydb.building SET class = $1, usage = $2, measured_height = $3, "
+            "storeys_above_ground = $4 WHERE id = $5",
+            attrs["class"], attrs["usage"], attrs["measured_height"],
+            attrs["storeys_above_ground"], building_id,
+        )
+        change_type, outcome = ("import", "geometry_updates") if geometry_changed else ("attr_update", "attr_updates")
+
+    if geometry_changed:
+        await replace_lod1_solid(conn, building_id, lod1_solid_id, f["lod1"])
+        await replace_lod2_surfaces(conn, building_id, gmlid, lod2_solid_id, f["lod2"])
+        has_lod1, has_lod2 = bool(f["lod1"]), bool(f["lod2"])
+    else:
+        has_lod1, has_lod2 = lod1_solid_id is not None, lod2_solid_id is not None
+
+    await record_version(conn, gmlid, change_type, _snapshot(attrs, has_lod1, has_lod2),
+                         source_tag=source_tag, note="diff import")
+    return outcome
+
+
+async def _apply_delete(conn, gmlid: str, source_tag: str) -> bool:
+    row = await conn.fetchrow(_BUILDING_ROW_SQL, gmlid)
+    await conn.execute("DELETE FROM citydb.import_feature_hashes WHERE gmlid = $1", gmlid)
+    if row is None:
+        return False
+    await record_version(conn, gmlid, "delete", {}, source_tag=source_tag, note="diff import")
+    await delete_buildings(conn, [row["id"]])
+    return True
+
+
+async def _locally_edited(conn, gmlids: list[str]) -> set[str]:
+    """Buildings whose latest version is a manual edit."""
+    rows = await conn.fetch(
+        """
+        SELECT gmlid FROM (
+            SELECT DISTINCT ON (gmlid) gmlid, source_tag
+            FROM citydb.feature_versions
+            WHERE gmlid = ANY($1)
+            ORDER BY gmlid, version DESC
+        ) latest
+        WHERE source_tag = 'manual-edit'
+        """,
+        gmlids,
+    )
+    return {r["gmlid"] for r in rows}
+
+
+# ── Entry points ──────────────────────────────────────────────────────────────
+
+async def record_baseline(source: Path, source_tag: str) -> dict:
+    """Hash a release that is already loaded, without touching the feature tables."""
+    files = gml_files(source)
+    meshes = sorted({mesh_of(p) for p in files})
+
+    def records():
+        for path in files:
+            mesh = mesh_of(path)
+            for f in iter_buildings(path):
+                yield f["gmlid"], mesh, f["attr_hash"], f["geom_hash"], source_tag
+
+    pool = await get_pool("write")
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM citydb.import_feature_hashes WHERE mesh = ANY($1)", meshes)
+            await conn.copy_records_to_table(
+                "import_feature_hashes",
+                schema_name="citydb",
+                columns=["gmlid", "mesh", "attr_hash", "geom_hash", "source_tag"],
+                records=records(),
+            )
+        count = await conn.fetchval(
+            "SELECT count(*) FROM citydb.import_feature_hashes WHERE mesh = ANY($1)", meshes
+        )
+    return {"files": len(files), "meshes": len(meshes), "buildings": count}
+
+
+async def diff_import(source: Path, source_tag: str, dry_run: bool = False,
+                      overwrite_edits: bool = False) -> dict:
+    started = time.monotonic()
+    files = gml_files(source)
+    meshes = sorted({mesh_of(p) for p in files})
+
+    pool = await get_pool("write")
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT gmlid, attr_hash, geom_hash FROM citydb.import_feature_hashes WHERE mesh = ANY($1)",
+            meshes,
+        )
+    if not rows:
+        raise RuntimeError(
+            "no baseline for these meshes — run once with --baseline against the loaded release"
+        )
+    baseline = {r["gmlid"]: (r["attr_hash"], r["geom_hash"]) for r in rows}
+
+    # Only changed features are kept in memory
+    changed: list[tuple[str, dict, bool]] = []   # (mesh, feature, geometry_changed)
+    seen: set[str] = set()
+    scanned = 0
+    for path in files:
+        mesh = mesh_of(path)
+        for f in iter_buildings(path):
+            scanned += 1
+            seen.add(f["gmlid"])
+            old = baseline.get(f["gmlid"])
+            if old is None or old[1] != f["geom_hash"]:
+                changed.append((mesh, f, True))
+            elif old[0] != f["attr_hash"]:
+                changed.append((mesh, f, False))
+        logger.info("scanned %s: %d buildings so far, %d changed", path.name, scanned, len(changed))
+    deleted = sorted(set(baseline) - seen)
+
+    async with pool.acquire() as conn:
+        conflicts = await _locally_edited(conn, [f["gmlid"] for _, f, _ in changed] + deleted)
+    if overwrite_edits:
+        conflicts = set()
+
+    stats = {
+        "scanned": scanned,
+        "inserted": 0, "attr_updates": 0, "geometry_updates": 0, "deleted": 0,
+        "conflicts": sorted(conflicts),
+    }
+    if dry_run:
+        stats.update(
+            to_insert_or_update=sum(1 for _, f, _ in changed if f["gmlid"] not in conflicts),
+            to_delete=sum(1 for g in deleted if g not in conflicts),
+        )
+        return stats
+
+    for n, (mesh, f, geometry_changed) in enumerate(changed, 1):
+        gmlid = f["gmlid"]
+        if gmlid in conflicts:
+            continue
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # Versions are recorded explicitly below, with this release's tag (migration 012)
+                await conn.execute("SET LOCAL citydb.versioning = 'deferred'")
+                outcome = await _apply_upsert(conn, f, geometry_changed, source_tag)
+                await conn.execute(_UPSERT_HASH_SQL, gmlid, mesh, f["attr_hash"], f["geom_hash"], source_tag)
+                await footprint_queue.enqueue(conn, [gmlid], geometry=outcome != "attr_updates")
+        stats[outcome] += 1
+        if n % 100 == 0:
+            logger.info("applied %d/%d changes", n, len(changed))
+
+    for gmlid in deleted:
+        if gmlid in conflicts:
+            continue
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                removed = await _apply_delete(conn, gmlid, source_tag)
+                await footprint_queue.enqueue(conn, [gmlid])
+        if removed:
+            stats["deleted"] += 1
+
+    # Footprints, generalized levels and bins of every applied change, in batches
+    await footprint_queue.drain()
+    await flush_rebuilds()
+    stats["seconds"] = round(time.monotonic() - started, 1)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply only the buildings that changed in a new PLATEAU release")
+    parser.add_argument("source", type=Path, help="bldg GML file or directory (searched recursively)")
+    parser.add_argument("--source-tag", required=True, help="e.g. PLATEAU-2025")
+    parser.add_argument("--baseline", action="store_true",
+                        help="only record hashes of the release that is already loaded")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change")
+    parser.add_argument("--overwrite-edits", action="store_true",
+                        help="apply upstream changes to locally edited buildings too")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main():
+        from app.database import close_pool
+        try:
+            if args.baseline:
+                result = await record_baseline(args.source, args.source_tag)
+            else:
+                result = await diff_import(args.source, args.source_tag, args.dry_run, args.overwrite_edits)
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        finally:
+            await close_pool()
+
+    asyncio.run(_main())
@@ -0,0 +1,210 @@
+"""
+Durable, coalescing maintenance queue for citydb.building_footprints.
+
+Building edits call enqueue(conn, gmlids) inside their own transaction: the
+gmlids land in citydb.footprint_queue (migration 015) atomically with the
+edit, so a committed edit always has its footprint recompute pending, even if
+the process dies right after the commit. Repeated edits of a building collapse
+into one queue row.
+
+After the commit the endpoint calls drain(). A single worker task waits
+footprint_queue_debounce_ms (so a burst of edits shares one pass), then claims
+up to footprint_queue_batch_size rows with FOR UPDATE SKIP LOCKED and, in the
+transaction that deletes them from the queue, recomputes all their footprint
+rows, generalized levels and bins set-based (recompute_footprints). If a batch
+fails, its rows are retried one by one, so one bad building (e.g. a LOD1 ring
+ST_Union rejects) cannot hold back the others. A failing row stays queued with
+attempts / last_error and is retried by later passes; after
+footprint_queue_max_attempts failures it is parked until the building is edited
+again (enqueue resets it). drain() returns once every gmlid queued before the
+call has been applied or has failed, so the map shows the edit as soon as the
+response arrives. Each pass publishes the stale tile boxes on
+the change feed ("tiles" events), so other workers and open maps refresh too.
+
+stats() reports the queue length, lag (age of the oldest pending edit) and the
+parked buildings; GET /api/health includes it.
+"""
+
+import asyncio
+import logging
+
+from app.config import get_settings
+from app.database import get_pool
+from app.database_write import invalidate_footprints, recompute_footprints
+from app.services.changes import publish
+
+logger = logging.getLogger(__name__)
+
+_ENQUEUE_SQL = """
+    INSERT INTO citydb.footprint_queue AS q (gmlid, geometry)
+    SELECT unnest($1::varchar[]), $2
+    ON CONFLICT (gmlid) DO UPDATE
+    SET geometry = q.geometry OR EXCLUDED.geometry, attempts = 0, last_error = NULL
+"""
+
+# Rows that already failed in this process_queue() call are left for the next one
+_CLAIM_SQL = """
+    SELECT gmlid, geometry
+    FROM citydb.footprint_queue
+    WHERE attempts < $2 AND gmlid <> ALL($3::varchar[])
+    ORDER BY enqueued_at
+    LIMIT $1
+    FOR UPDATE SKIP LOCKED
+"""
+
+_CLAIM_ONE_SQL = """
+    SELECT gmlid, geometry
+    FROM citydb.footprint_queue
+    WHERE gmlid = $1
+    FOR UPDATE SKIP LOCKED
+"""
+
+_STATS_SQL = """
+    SELECT count(*) FILTER (WHERE attempts < $1)                            AS pending,
+           COALESCE(EXTRACT(EPOCH FROM now() - min(enqueued_at) FILTER (WHERE attempts < $1)),
+                    0)::float8                                              AS lag_seconds,
+           COALESCE(max(attempts) FILTER (WHERE attempts < $1), 0)          AS max_attempts,
+           COALESCE(array_agg(gmlid ORDER BY enqueued_at) FILTER (WHERE attempts >= $1),
+                    '{}')                                                   AS parked
+    FROM citydb.footprint_queue
+"""
+
+_worker: asyncio.Task | None = None
+_requested = 0     # drain requests handed out
+_completed = 0     # highest request covered by a finished pass
+_progress: asyncio.Condition | None = None
+
+
+async def enqueue(conn, gmlids: list[str], geometry: bool = True) -> None:
+    """
+    Queue footprint recomputes for these buildings. Call inside the edit transaction.
+    geometry=False for edits that leave the LOD1 solid alone (attributes, LOD2).
+    """
+    if gmlids:
+        await conn.execute(_ENQUEUE_SQL, list(gmlids), geometry)
+
+
+async def _apply(conn, rows) -> list:
+    """Recompute and dequeue claimed rows in the caller's transaction; returns the stale tiles."""
+    gmlids = [r["gmlid"] for r in rows]
+    stale = await recompute_footprints(
+        conn,
+        [r["gmlid"] for r in rows if r["geometry"]],
+        [r["gmlid"] for r in rows if not r["geometry"]],
+    )
+    await conn.execute("DELETE FROM citydb.footprint_queue WHERE gmlid = ANY($1)", gmlids)
+    await publish(conn, "tiles", [
+        [layer, list(bbox)] for layer, bbox in stale
+        if bbox is not None and None not in tuple(bbox)
+    ])
+    return stale
+
+
+async def _apply_one(conn, gmlid: str) -> bool:
+    """Retry one row of a failed batch on its own; record the error if it fails again."""
+    try:
+        async with conn.transaction():
+            rows = await conn.fetch(_CLAIM_ONE_SQL, gmlid)
+            if not rows:
+                return True    # dequeued or claimed by someone else meanwhile
+            stale = await _apply(conn, rows)
+    except Exception as e:
+        logger.warning("footprint queue: recompute of %s failed: %s", gmlid, e)
+        await conn.execute(
+            "UPDATE citydb.footprint_queue "
+            "SET attempts = attempts + 1, last_error = $2 WHERE gmlid = $1",
+            gmlid, str(e),
+        )
+        return False
+    invalidate_footprints([gmlid], stale)
+    return True
+
+
+async def process_queue() -> int:
+    """
+    Apply queued recomputes, a batch per transaction, until none are left. Returns
+    the count applied; rows that fail stay queued for a later call.
+    """
+    pool = await get_pool("write")
+    settings = get_settings()
+    applied = 0
+    failed: list[str] = []
+    while True:
+        async with pool.acquire() as conn:
+            gmlids: list[str] = []
+            try:
+                async with conn.transaction():
+                    rows = await conn.fetch(
+                        _CLAIM_SQL, settings.footprint_queue_batch_size,
+                        settings.footprint_queue_max_attempts, failed,
+                    )
+                    if not rows:
+                        return applied
+                    gmlids = [r["gmlid"] for r in rows]
+                    stale = await _apply(conn, rows)
+            except Exception as e:
+                if not gmlids:
+                    raise
+                logger.warning("footprint queue: batch of %d failed (%s), retrying one by one", len(gmlids), e)
+                for gmlid in gmlids:
+                    if await _apply_one(conn, gmlid):
+                        applied += 1
+                    else:
+                        failed.append(gmlid)
+                continue
+        invalidate_footprints(gmlids, stale)
+        applied += len(gmlids)
+
+
+def _condition() -> asyncio.Condition:
+    global _progress
+    if _progress is None:
+        _progress = asyncio.Condition()
+    return _progress
+
+
+async def _run() -> None:
+    global _worker, _completed
+    try:
+        while _completed < _requested:
+            await asyncio.sleep(get_settings().footprint_queue_debounce_ms / 1000)
+            covered = _requested
+            count = await process_queue()
+            logger.debug("footprint queue: applied %d recomputes", count)
+            _completed = covered
+            async with _condition():
+                _condition().notify_all()
+    except Exception:
+        logger.exception("footprint queue: pass failed, entries stay queued")
+    finally:
+        _worker = None
+        async with _condition():
+            _condition().notify_all()
+
+
+def kick() -> int:
+    """Start a pass in the background (e.g. at startup to pick up leftovers). Returns its ticket."""
+    global _worker, _requested
+    _requested += 1
+    if _worker is None:
+        _worker = asyncio.get_running_loop().create_task(_run())
+    return _requested
+
+
+async def drain() -> None:
+    """Wait until everything queued before this call has been applied (or a pass failed)."""
+    ticket = kick()
+    async with _condition():
+        await _condition().wait_for(lambda: _completed >= ticket or _worker is None)
+
+
+async def stats(conn) -> dict:
+    """Queue length, lag (seconds since the oldest pending edit) and parked gmlids."""
+    row = await conn.fetchrow(_STATS_SQL, get_settings().footprint_queue_max_attempts)
+    return {
+        "pending": row["pending"],
+        "lag_seconds": round(row["lag_seconds"], 3),
+        "max_attempts": row["max_attempts"],
+        "parked": len(row["parked"]),
+        "parked_gmlids": row["parked"][:20],
+    }
@@ -0,0 +1,211 @@
+"""
+Parallel, resumable rebuild of citydb.building_footprints.
+
+    docker exec 3dcity-backend python -m app.services.footprint_rebuild [--partitions 64] [--restart]
+
+Migration 002 computes the whole table in one GROUP BY … ST_Union statement
+(30–90 s on one core, all-or-nothing). This command splits the buildings into
+ranges of building.id and computes the ranges concurrently, one per write-pool
+connection (raise POOL_WRITE_MAX_SIZE for more parallelism), into
+citydb.building_footprints_staging. Each range is inserted and checkpointed in
+citydb.footprint_rebuild_parts in one transaction, so an interrupted run picks
+up with the ranges that did not finish. When every range is done the staging
+table is indexed and renamed over the live table in a single transaction;
+readers see either the old table or the new one.
+
+After the swap the generalized levels and grid bins of the buildings are
+recomputed, the building tiles on disk are deleted, and a reset is published on
+the change feed (app/services/changes.py) so every running worker drops its
+in-memory tiles, detail cache and query cache. If a local 3D Tiles tileset
+exists it is regenerated as well. Edits committed while a
+rebuild runs may be computed before the edit; rebuild during a quiet period.
+The other footprint layers are materialized views and are refreshed with
+`python -m app.services.static_tiles --refresh`.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from app.config import get_settings
+from app.database import get_pool
+from app.services import tiles3d
+from app.services.bins import rebuild_bins
+from app.services.changes import publish_reset
+from app.services.generalize import refresh_generalized
+from app.services.mvt import clear_layer
+
+logger = logging.getLogger(__name__)
+
+# Same row shape as migration 002 / recompute_footprints, restricted to an id range
+_PARTITION_SQL = """
+    INSERT INTO citydb.building_footprints_staging (gmlid, measured_height, usage, has_lod2, geometry)
+    SELECT
+        co.gmlid,
+        COALESCE(b.measured_height, 0)       AS measured_height,
+        b.usage,
+        (b.lod2_solid_id IS NOT NULL)        AS has_lod2,
+        ST_SetSRID(
+            ST_FlipCoordinates(
+                ST_Union(ST_Force2D(sg.geometry))
+            ),
+            4326
+        )::geometry(Geometry, 4326)          AS geometry
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    JOIN citydb.surface_geometry sg ON sg.root_id = b.lod1_solid_id
+    WHERE b.building_root_id = b.id
+      AND sg.geometry IS NOT NULL
+      AND b.id BETWEEN $1 AND $2
+    GROUP BY co.gmlid, b.id, b.measured_height, b.usage, b.lod2_solid_id
+"""
+
+_SETUP_SQL = """
+    CREATE TABLE IF NOT EXISTS citydb.building_footprints_staging
+        (LIKE citydb.building_footprints INCLUDING DEFAULTS);
+    CREATE TABLE IF NOT EXISTS citydb.footprint_rebuild_parts (
+        part     integer PRIMARY KEY,
+        lo       bigint  NOT NULL,
+        hi       bigint  NOT NULL,
+        rows     integer,
+        seconds  double precision,
+        done_at  timestamptz
+    );
+"""
+
+_RESET_SQL = """
+    DROP TABLE IF EXISTS citydb.building_footprints_staging;
+    DROP TABLE IF EXISTS citydb.footprint_rebuild_parts;
+"""
+
+_SWAP_SQL = """
+    LOCK TABLE citydb.building_footprints IN ACCESS EXCLUSIVE MODE;
+    ALTER TABLE citydb.building_footprints RENAME TO building_footprints_old;
+    ALTER TABLE citydb.building_footprints_staging RENAME TO building_footprints;
+    DROP TABLE citydb.building_footprints_old;   -- frees the index names below
+    ALTER INDEX citydb.building_footprints_staging_gmlid_idx RENAME TO building_footprints_gmlid_idx;
+    ALTER INDEX citydb.building_footprints_staging_geometry_idx RENAME TO building_footprints_geometry_idx;
+    DROP TABLE citydb.footprint_rebuild_parts;
+"""
+
+
+async def _plan(conn, partitions: int) -> None:
+    """Split the building id range into equal parts (only when no run is in progress)."""
+    if await conn.fetchval("SELECT count(*) FROM citydb.footprint_rebuild_parts"):
+        return
+    lo, hi = await conn.fetchrow(
+        "SELECT min(id), max(id) FROM citydb.building WHERE building_root_id = id"
+    )
+    if lo is None:
+        return
+    step = max((hi - lo + 1 + partitions - 1) // partitions, 1)
+    await conn.executemany(
+        "INSERT INTO citydb.footprint_rebuild_parts (part, lo, hi) VALUES ($1, $2, $3)",
+        [(i, start, min(start + step - 1, hi)) for i, start in enumerate(range(lo, hi + 1, step))],
+    )
+
+
+async def _run_part(pool, part: int, lo: int, hi: int) -> int:
+    started = time.monotonic()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            status = await conn.execute(_PARTITION_SQL, lo, hi)
+            rows = int(status.split()[-1])
+            await conn.execute(
+                "UPDATE citydb.footprint_rebuild_parts "
+                "SET rows = $2, seconds = $3, done_at = now() WHERE part = $1",
+                part, rows, time.monotonic() - started,
+            )
+    return rows
+
+
+async def rebuild(partitions: int = 64, restart: bool = False) -> dict:
+    """Rebuild building_footprints; returns row count and timing."""
+    pool = await get_pool("write")
+    async with pool.acquire() as conn:
+        if restart:
+            await conn.execute(_RESET_SQL)
+        await conn.execute(_SETUP_SQL)
+        await _plan(conn, partitions)
+        parts = await conn.fetch(
+            "SELECT part, lo, hi FROM citydb.footprint_rebuild_parts WHERE done_at IS NULL ORDER BY part"
+        )
+        total_parts = await conn.fetchval("SELECT count(*) FROM citydb.footprint_rebuild_parts")
+        done_rows = await conn.fetchval(
+            "SELECT COALESCE(sum(rows), 0) FROM citydb.footprint_rebuild_parts WHERE done_at IS NOT NULL"
+        )
+    if len(parts) < total_parts:
+        logger.info("resuming: %d of %d partitions already done (%d rows)",
+                    total_parts - len(parts), total_parts, done_rows)
+
+    started = time.monotonic()
+    workers = get_settings().pool_write_max_size
+    queue: asyncio.Queue = asyncio.Queue()
+    for p in parts:
+        queue.put_nowait(p)
+    progress = {"parts": total_parts - len(parts), "rows": 0}
+
+    async def worker():
+        while not queue.empty():
+            p = queue.get_nowait()
+            rows = await _run_part(pool, p["part"], p["lo"], p["hi"])
+            progress["parts"] += 1
+            progress["rows"] += rows
+            elapsed = time.monotonic() - started
+            logger.info(
+                "partition %d/%d done: %d rows — %d rows in %.1f s (%.0f rows/s)",
+                progress["parts"], total_parts, rows,
+                progress["rows"], elapsed, progress["rows"] / max(elapsed, 1e-9),
+            )
+
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(parts)) or 1)))
+    computed = time.monotonic() - started
+
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS building_footprints_staging_gmlid_idx "
+            "ON citydb.building_footprints_staging (gmlid)"
+        )
+        await conn.execute(
+            "CREATE INDEX IF NOT EXISTS building_footprints_staging_geometry_idx "
+            "ON citydb.building_footprints_staging USING GIST (geometry)"
+        )
+        await conn.execute("ANALYZE citydb.building_footprints_staging")
+        async with conn.transaction():
+            await conn.execute(_SWAP_SQL)
+        total = await conn.fetchval("SELECT count(*) FROM citydb.building_footprints")
+        async with conn.transaction():
+            await refresh_generalized(conn, "building_footprints")
+            await rebuild_bins(conn)
+    clear_layer("building_footprints")
+    clear_layer("building_bins")
+    async with pool.acquire() as conn:
+        await publish_reset(conn)
+    if (tiles3d.tiles_dir() / "index.json").exists():
+        logger.info("regenerating local 3D Tiles")
+        await tiles3d.build_all()
+    return {
+        "rows": total,
+        "partitions": total_parts,
+        "workers": workers,
+        "compute_seconds": round(computed, 1),
+        "total_seconds": round(time.monotonic() - started, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild citydb.building_footprints in parallel")
+    parser.add_argument("--partitions", type=int, default=64, help="building id ranges (default 64)")
+    parser.add_argument("--restart", action="store_true", help="discard an interrupted run")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main():
+        from app.database import close_pool
+        try:
+            print(await rebuild(args.partitions, args.restart))
+        finally:
+            await close_pool()
+
+    asyncio.run(_main())
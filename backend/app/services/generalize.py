@@ -0,0 +1,90 @@
+"""
+Zoom-dependent generalized geometry for the footprint layers.
+
+citydb.footprint_generalized (migration 009) holds, per layer and level, a
+simplified copy of each feature's geometry (ST_SimplifyPreserveTopology in
+EPSG:6677 metres, stored back in 4326). Features whose area is below the
+level's threshold get no row at that level, i.e. they are dropped from the
+low-zoom tiles. Level 0 is the layer itself at full resolution.
+
+    level  tolerance  min area   used for
+    0      —          —          z >= 15, exports without a resolution
+    1      0.5 m      1 m²       z 14   (one MVT unit ≈ 0.5 m)
+    2      1.0 m      4 m²       z 13
+    3      2.5 m      25 m²      z <= 12
+
+The write paths keep the rows in step with the layers: refresh_generalized()
+for the buildings of a footprint recompute (recompute_footprints), or for a whole layer after
+its materialized view is refreshed. LEVELS must stay in sync with the VALUES
+list in data/migrations/009_footprint_generalized.sql.
+"""
+
+GENERALIZED_LAYERS = (
+    "building_footprints",
+    "land_use_footprints",
+    "road_footprints",
+    "flood_zone_footprints",
+    "bridge_footprints",
+    "furniture_footprints",
+    "vegetation_footprints",
+)
+
+# level → (tolerance m, minimum area m², highest zoom using it)
+LEVELS = {
+    1: (0.5, 1.0, 14),
+    2: (1.0, 4.0, 13),
+    3: (2.5, 25.0, 12),
+}
+
+_LEVEL_VALUES = ", ".join(f"({lvl}, {tol}, {area})" for lvl, (tol, area, _) in LEVELS.items())
+
+_INSERT_SQL = """
+    INSERT INTO citydb.footprint_generalized (layer, level, gmlid, geometry)
+    SELECT '{layer}', l.level, f.gmlid,
+           ST_Transform(ST_SimplifyPreserveTopology(f.g, l.tolerance), 4326)
+    FROM (
+        SELECT gmlid, ST_Transform(geometry, 6677) AS g
+        FROM citydb.{layer}
+        WHERE geometry IS NOT NULL {where}
+    ) f
+    CROSS JOIN (VALUES {levels}) AS l(level, tolerance, min_area)
+    WHERE ST_Area(f.g) >= l.min_area
+"""
+
+
+def level_for_zoom(z: int) -> int:
+    """Generalization level to render a tile of zoom z with (0 = full resolution)."""
+    for level in sorted(LEVELS, reverse=True):
+        if z <= LEVELS[level][2]:
+            return level
+    return 0
+
+
+def level_for_resolution(metres: float | None) -> int:
+    """Coarsest level whose tolerance does not exceed the requested resolution."""
+    if not metres:
+        return 0
+    fitting = [level for level, (tol, _, _) in LEVELS.items() if tol <= metres]
+    return max(fitting, default=0)
+
+
+async def refresh_generalized(conn, layer: str, gmlids: str | list[str] | None = None) -> None:
+    """Rebuild the generalized rows of some features (one gmlid or a list) or of the whole layer."""
+    if layer not in GENERALIZED_LAYERS:
+        return
+    if gmlids is None:
+        await conn.execute("DELETE FROM citydb.footprint_generalized WHERE layer = $1", layer)
+        await conn.execute(_INSERT_SQL.format(layer=layer, where="", levels=_LEVEL_VALUES))
+    else:
+        await delete_generalized(conn, layer, gmlids)
+        await conn.execute(
+            _INSERT_SQL.format(layer=layer, where="AND gmlid = ANY($1)", levels=_LEVEL_VALUES),
+            [gmlids] if isinstance(gmlids, str) else gmlids,
+        )
+
+
+async def delete_generalized(conn, layer: str, gmlids: str | list[str]) -> None:
+    await conn.execute(
+        "DELETE FROM citydb.footprint_generalized WHERE layer = $1 AND gmlid = ANY($2)",
+        layer, [gmlids] if isinstance(gmlids, str) else gmlids,
+    )
@@ -0,0 +1,390 @@
+"""
+Binary glTF 2.0 (GLB) encoding of building surfaces.
+
+Input is the surfaces_6677 encoding of citydb.building_lod2_cache
+([{"objectclass_id", "geometry"}, ...], EPSG:6677 metres). Each polygon is
+triangulated here (ear clipping in its own plane, holes bridged into the outer
+ring), so clients upload the buffers straight to the GPU.
+
+Layout: one node + mesh per building, one primitive per surface type
+(roof / wall / ground, or "lod1" for buildings without LOD2) sharing one
+material per type. Vertices are not shared between polygons so every face
+keeps its flat normal.
+
+Axes: positions are metres relative to an origin in EPSG:6677, converted to
+glTF's y-up frame as (east, up, -north). The origin is recorded in the root
+node's extras.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+# objectclass_id → (material name, baseColorFactor); 0 marks LOD1 solid faces
+SURFACE_MATERIALS = {
+    33: ("roof", [0.72, 0.36, 0.27, 1.0]),
+    34: ("wall", [0.86, 0.85, 0.82, 1.0]),
+    35: ("ground", [0.45, 0.45, 0.45, 1.0]),
+    0: ("lod1", [0.80, 0.80, 0.80, 1.0]),
+}
+LOD1_OBJECTCLASS = 0
+
+_GLB_MAGIC = 0x46546C67   # "glTF"
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+_FLOAT, _UINT32 = 5126, 5125
+_ARRAY_BUFFER, _ELEMENT_ARRAY_BUFFER = 34962, 34963
+
+
+# ── Triangulation ──────────────────────────────────────────────────────────────
+
+def _clean_ring(ring: list) -> list:
+    """Drop the closing point and consecutive duplicates."""
+    out = []
+    for p in ring:
+        if not out or p != out[-1]:
+            out.append(p)
+    if len(out) > 1 and out[0] == out[-1]:
+        out.pop()
+    return out
+
+
+def _newell_normal(pts: np.ndarray) -> np.ndarray:
+    nxt = np.roll(pts, -1, axis=0)
+    return np.array([
+        np.sum((pts[:, 1] - nxt[:, 1]) * (pts[:, 2] + nxt[:, 2])),
+        np.sum((pts[:, 2] - nxt[:, 2]) * (pts[:, 0] + nxt[:, 0])),
+        np.sum((pts[:, 0] - nxt[:, 0]) * (pts[:, 1] + nxt[:, 1])),
+    ])
+
+
+def _signed_area(pts2d: list) -> float:
+    return 0.5 * sum(
+        pts2d[i - 1][0] * pts2d[i][1] - pts2d[i][0] * pts2d[i - 1][1]
+        for i in range(len(pts2d))
+    )
+
+
+def _bridge_holes(outer: list[int], holes: list[list[int]], pts2d: list) -> list[int]:
+    """Merge holes into the outer ring via a bridge from each hole's rightmost vertex."""
+    poly = list(outer)
+    for hole in sorted(holes, key=lambda h: -max(pts2d[i][0] for i in h)):
+        k = max(range(len(hole)), key=lambda j: pts2d[hole[j]][0])
+        hx, hy = pts2d[hole[k]]
+        j = min(range(len(poly)), key=lambda m: (pts2d[poly[m]][0] - hx) ** 2 + (pts2d[poly[m]][1] - hy) ** 2)
+        poly = poly[:j + 1] + hole[k:] + hole[:k + 1] + poly[j:]
+    return poly
+
+
+def _ear_clip(poly: list[int], pts2d: list) -> list[tuple[int, int, int]]:
+    """Ear clipping of a counter-clockwise simple polygon given as point indices."""
+    def cross(a, b, c):
+        (ax, ay), (bx, by), (cx, cy) = pts2d[a], pts2d[b], pts2d[c]
+        return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+    def inside(p, a, b, c):
+        return cross(a, b, p) > 0 and cross(b, c, p) > 0 and cross(c, a, p) > 0
+
+    idx = list(poly)
+    tris = []
+    while len(idx) > 3:
+        n = len(idx)
+        for i in range(n):
+            a, b, c = idx[i - 1], idx[i], idx[(i + 1) % n]
+            if cross(a, b, c) <= 0:
+                continue
+            if any(inside(p, a, b, c) for p in idx if p not in (a, b, c)):
+                continue
+            tris.append((a, b, c))
+            del idx[i]
+            break
+        else:
+            # Degenerate input (self-touching, collinear run): clip anyway
+            tris.append((idx[-1], idx[0], idx[1]))
+            del idx[0]
+    if len(idx) == 3:
+        tris.append(tuple(idx))
+    return tris
+
+
+def triangulate_polygon(rings: list) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+    """
+    Triangulate one planar polygon given as GeoJSON rings of [x, y, z].
+
+    Returns (positions (n, 3) float64, triangles (m, 3) int, unit normal) or
+    None for degenerate polygons. Triangles are wound counter-clockwise
+    around the polygon's own normal.
+    """
+    rings = [_clean_ring(r) for r in rings]
+    if len(rings[0]) < 3:
+        return None
+    rings = [rings[0]] + [r for r in rings[1:] if len(r) >= 3]
+    pts = np.array([p[:3] for r in rings for p in r], dtype=np.float64)
+    normal = _newell_normal(pts[:len(rings[0])])
+    length = np.linalg.norm(normal)
+    if length == 0:
+        return None
+    normal /= length
+
+    # Project onto the plane of the two axes not dominated by the normal
+    drop = int(np.argmax(np.abs(normal)))
+    axes = [a for a in range(3) if a != drop]
+    pts2d = [(float(p[axes[0]]), float(p[axes[1]])) for p in pts]
+
+    ring_idx = []
+    start = 0
+    for r in rings:
+        ring_idx.append(list(range(start, start + len(r))))
+        start += len(r)
+    outer = ring_idx[0]
+    if _signed_area([pts2d[i] for i in outer]) < 0:
+        outer = outer[::-1]
+    holes = []
+    for h in ring_idx[1:]:
+        holes.append(h if _signed_area([pts2d[i] for i in h]) < 0 else h[::-1])
+
+    poly = _bridge_holes(outer, holes, pts2d) if holes else outer
+    tris = np.array(_ear_clip(poly, pts2d), dtype=np.int64).reshape(-1, 3)
+
+    # The 2D projection may mirror the polygon: orient every triangle to the normal
+    if len(tris):
+        a, b, c = pts[tris[:, 0]], pts[tris[:, 1]], pts[tris[:, 2]]
+        flip = np.einsum("ij,j->i", np.cross(b - a, c - a), normal) < 0
+        tris[flip] = tris[flip][:, ::-1]
+    return pts, tris, normal
+
+
+def _surface_polygons(geometry: dict) -> list:
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def surfaces_origin(surfaces: list) -> list[float]:
+    """Bounding-box centre at ground level (x, y, min z) of some surfaces."""
+    pts = np.array(
+        [p[:3] for s in surfaces for poly in _surface_polygons(s["geometry"]) for ring in poly for p in ring],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    if not len(pts):
+        return [0.0, 0.0, 0.0]
+    lo, hi = pts.min(axis=0), pts.max(axis=0)
+    return [float((lo[0] + hi[0]) / 2), float((lo[1] + hi[1]) / 2), float(lo[2])]
+
+
+# ── GLB assembly ──────────────────────────────────────────────────────────────
+
+def _triangulate_surfaces(surfaces: list, origin: np.ndarray) -> dict[int, tuple]:
+    """objectclass_id → (positions, normals, indices) in glTF axes relative to origin."""
+    by_type: dict[int, list] = {}
+    for surface in surfaces:
+        by_type.setdefault(surface["objectclass_id"], []).append(surface["geometry"])
+
+    out = {}
+    for objectclass_id in sorted(by_type):
+        positions, normals, indices = [], [], []
+        offset = 0
+        for geometry in by_type[objectclass_id]:
+            for rings in _surface_polygons(geometry):
+                result = triangulate_polygon(rings)
+                if result is None or not len(result[1]):
+                    continue
+                pts, tris, normal = result
+                positions.append(pts)
+                normals.append(np.broadcast_to(normal, pts.shape))
+                indices.append(tris + offset)
+                offset += len(pts)
+        if not indices:
+            continue
+        pos = np.concatenate(positions) - origin
+        nrm = np.concatenate(normals)
+        # EPSG:6677 (east, north, up) → glTF y-up (east, up, -north)
+        pos = np.stack([pos[:, 0], pos[:, 2], -pos[:, 1]], axis=1).astype(np.float32)
+        nrm = np.stack([nrm[:, 0], nrm[:, 2], -nrm[:, 1]], axis=1).astype(np.float32)
+        out[objectclass_id] = (pos, nrm, np.concatenate(indices).astype(np.uint32).reshape(-1))
+    return out
+
+
+class GlbBuilder:
+    """
+    Collects buildings into one glTF scene and serializes it as GLB.
+
+    batched=False: one node + mesh per building (exports).
+    batched=True:  all buildings merged into one mesh, one primitive per surface
+                   type, with a per-vertex feature id (EXT_mesh_features) and a
+                   string property table (EXT_structural_metadata) — the 3D
+                   Tiles 1.1 layout, where each building stays pickable.
+    """
+
+    def __init__(self, origin: list[float], batched: bool = False):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.batched = batched
+        self._bin = bytearray()
+        self._buffer_views: list[dict] = []
+        self._accessors: list[dict] = []
+        self._meshes: list[dict] = []
+        self._nodes: list[dict] = []
+        self._material_index: dict[int, int] = {}
+        self._materials: list[dict] = []
+        self._features: list[dict] = []
+        self._batches: dict[int, list] = {}   # objectclass_id → [(pos, nrm, idx, feature_id)]
+        self._min = np.full(3, np.inf)
+        self._max = np.full(3, -np.inf)
+
+    def _material(self, objectclass_id: int) -> int:
+        if objectclass_id not in self._material_index:
+            name, color = SURFACE_MATERIALS.get(objectclass_id, SURFACE_MATERIALS[34])
+            self._material_index[objectclass_id] = len(self._materials)
+            self._materials.append({
+                "name": name,
+                "pbrMetallicRoughness": {"baseColorFactor": color, "metallicFactor": 0.0, "roughnessFactor": 1.0},
+                # PLATEAU surface orientation is not consistent across datasets
+                "doubleSided": True,
+            })
+        return self._material_index[objectclass_id]
+
+    def _buffer_view(self, data: bytes, target: int | None = None, align: int = 4) -> int:
+        self._bin.extend(b"\x00" * (-len(self._bin) % align))
+        view = {"buffer": 0, "byteOffset": len(self._bin), "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        self._buffer_views.append(view)
+        self._bin.extend(data)
+        return len(self._buffer_views) - 1
+
+    def _accessor(self, array: np.ndarray, target: int, type_: str, with_bounds: bool = False) -> int:
+        accessor = {
+            "bufferView": self._buffer_view(array.tobytes(), target),
+            "componentType": _UINT32 if array.dtype == np.uint32 else _FLOAT,
+            "count": int(array.shape[0]) if array.ndim > 1 else int(array.size),
+            "type": type_,
+        }
+        if with_bounds:
+            accessor["min"] = array.min(axis=0).tolist()
+            accessor["max"] = array.max(axis=0).tolist()
+        self._accessors.append(accessor)
+        return len(self._accessors) - 1
+
+    def _primitive(self, objectclass_id: int, pos, nrm, idx, feature_ids=None) -> dict:
+        attributes = {
+            "POSITION": self._accessor(pos, _ARRAY_BUFFER, "VEC3", with_bounds=True),
+            "NORMAL": self._accessor(nrm, _ARRAY_BUFFER, "VEC3"),
+        }
+        primitive = {
+            "attributes": attributes,
+            "indices": self._accessor(idx, _ELEMENT_ARRAY_BUFFER, "SCALAR"),
+            "material": self._material(objectclass_id),
+            "mode": 4,
+        }
+        if feature_ids is not None:
+            attributes["_FEATURE_ID_0"] = self._accessor(feature_ids, _ARRAY_BUFFER, "SCALAR")
+            primitive["extensions"] = {"EXT_mesh_features": {"featureIds": [{
+                "featureCount": len(self._features), "attribute": 0, "propertyTable": 0,
+            }]}}
+        return primitive
+
+    def add_building(self, gmlid: str, surfaces: list, extras: dict | None = None) -> int | None:
+        """
+        Triangulate one building's surfaces.
+
+        Returns its node index (feature id when batched), or None if nothing
+        could be drawn. When batched, extras become the building's row in the
+        property table (string values).
+        """
+        parts = _triangulate_surfaces(surfaces, self.origin)
+        if not parts:
+            return None
+        for pos, _, _ in parts.values():
+            self._min = np.minimum(self._min, pos.min(axis=0))
+            self._max = np.maximum(self._max, pos.max(axis=0))
+
+        if self.batched:
+            feature_id = len(self._features)
+            self._features.append(extras or {"gml_id": gmlid})
+            for objectclass_id, (pos, nrm, idx) in parts.items():
+                self._batches.setdefault(objectclass_id, []).append((pos, nrm, idx, feature_id))
+            return feature_id
+
+        primitives = [self._primitive(oc, pos, nrm, idx) for oc, (pos, nrm, idx) in parts.items()]
+        self._meshes.append({"name": gmlid, "primitives": primitives})
+        node = {"name": gmlid, "mesh": len(self._meshes) - 1}
+        if extras:
+            node["extras"] = extras
+        self._nodes.append(node)
+        return len(self._nodes) - 1
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._nodes and not self._features
+
+    def bounds(self) -> tuple[list[float], list[float]]:
+        """(min, max) of everything added, as (east, north, up) metres from the origin."""
+        lo, hi = self._min, self._max
+        return [float(lo[0]), float(-hi[2]), float(lo[1])], [float(hi[0]), float(-lo[2]), float(hi[1])]
+
+    def _flush_batches(self) -> dict:
+        """Merge the batched buildings into one mesh and build the property table."""
+        primitives = []
+        for objectclass_id in sorted(self._batches):
+            chunks = self._batches[objectclass_id]
+            offsets = np.cumsum([0] + [len(pos) for pos, _, _, _ in chunks[:-1]])
+            pos = np.concatenate([c[0] for c in chunks])
+            nrm = np.concatenate([c[1] for c in chunks])
+            idx = np.concatenate([c[2] + np.uint32(o) for c, o in zip(chunks, offsets)])
+            fid = np.concatenate([np.full(len(c[0]), c[3], dtype=np.float32) for c in chunks])
+            primitives.append(self._primitive(objectclass_id, pos, nrm, idx, fid))
+        self._meshes.append({"name": "buildings", "primitives": primitives})
+        self._nodes.append({"name": "buildings", "mesh": len(self._meshes) - 1})
+
+        names = sorted({k for f in self._features for k in f})
+        table = {}
+        for name in names:
+            encoded = [str(f.get(name) if f.get(name) is not None else "").encode("utf-8") for f in self._features]
+            offsets = np.cumsum([0] + [len(e) for e in encoded], dtype=np.uint32)
+            table[name] = {
+                # Property table buffer views must be 8-byte aligned
+                "values": self._buffer_view(b"".join(encoded), align=8),
+                "stringOffsets": self._buffer_view(offsets.tobytes(), align=8),
+                "stringOffsetType": "UINT32",
+            }
+        return {"EXT_structural_metadata": {
+            "schema": {
+                "id": "plateau_buildings",
+                "classes": {"building": {"properties": {name: {"type": "STRING"} for name in names}}},
+            },
+            "propertyTables": [{"class": "building", "count": len(self._features), "properties": table}],
+        }}
+
+    def to_glb(self) -> bytes:
+        extensions = self._flush_batches() if self.batched and self._features else None
+        root = {
+            "name": "root",
+            "children": list(range(len(self._nodes))),
+            "extras": {"crs": "EPSG:6677", "origin": self.origin.tolist(), "up": "y"},
+        }
+        gltf = {
+            "asset": {"version": "2.0", "generator": "plateau-3dcitydb"},
+            "scene": 0,
+            "scenes": [{"nodes": [len(self._nodes)]}],
+            "nodes": self._nodes + [root],
+            "meshes": self._meshes,
+            "materials": self._materials,
+            "accessors": self._accessors,
+            "bufferViews": self._buffer_views,
+            "buffers": [{"byteLength": len(self._bin)}],
+        }
+        if extensions:
+            gltf["extensionsUsed"] = ["EXT_mesh_features", "EXT_structural_metadata"]
+            gltf["extensions"] = extensions
+        json_chunk = json.dumps(gltf, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        json_chunk += b" " * (-len(json_chunk) % 4)
+        bin_chunk = bytes(self._bin) + b"\x00" * (-len(self._bin) % 4)
+        total = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+        return b"".join([
+            struct.pack("<III", _GLB_MAGIC, 2, total),
+            struct.pack("<II", len(json_chunk), _CHUNK_JSON), json_chunk,
+            struct.pack("<II", len(bin_chunk), _CHUNK_BIN), bin_chunk,
+        ])
@@ -0,0 +1,272 @@
+"""
+Mapbox Vector Tiles rendered by PostGIS, with a two-level tile cache.
+
+Layers are the tables / materialized views Martin used to auto-discover;
+layer name = table name = MVT source-layer, so the map style is unchanged.
+Every non-geometry column becomes a feature property (as with Martin).
+
+Cache: an in-memory LRU (ResultCache) in front of files under
+settings.mvt_cache_dir/{layer}/{z}/{x}/{y}.mvt. Only z <= mvt_cache_max_zoom is
+cached. Nothing expires on its own: write paths call invalidate_bbox() with
+the old and new bounding boxes of the rows they changed, which drops exactly
+the tiles (plus the 64-unit render buffer) those boxes touch at every cached
+zoom. A tile rendered while a write was committing is not cached (write
+epoch check, see app/services/cache.py).
+
+Loads that bypass the write paths (run-import.sh, the census and shelter
+imports, re-running the layer migrations) must purge the cache afterwards:
+    docker exec 3dcity-backend python -m app.services.mvt --clear [layer ...]
+
+The memory level is per worker process; the disk level is shared. Each worker
+also drops its memory tiles for the "tiles" events of the change feed
+(app/services/changes.py), so edits made through another worker show up too.
+
+STATIC_LAYERS are answered from their PMTiles archive when one has been built
+(app/services/pmtiles.py) and only fall back to PostGIS otherwise.
+
+Below z15 the footprint layers are rendered from their generalized geometry
+(app/services/generalize.py): simplified outlines, small features dropped.
+building_bins is not a table layer: its tiles aggregate building statistics
+into grid cells sized by zoom (app/services/bins.py).
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import shutil
+from pathlib import Path
+
+from app.config import get_settings
+from app.database import get_pool, is_replica_pool
+from app.services.bins import BIN_LAYER, bin_tile_sql, resolution_for_zoom
+from app.services import changes
+from app.services.cache import ResultCache, current_epoch
+from app.services.generalize import GENERALIZED_LAYERS, level_for_zoom
+from app.services.pmtiles import read_archived_tile
+
+LAYERS = (
+    "building_footprints",
+    "land_use_footprints",
+    "road_footprints",
+    "flood_zone_footprints",
+    "bridge_footprints",
+    "furniture_footprints",
+    "vegetation_footprints",
+    "census_boundaries",
+    "shelter_facilities",
+    "building_bins",
+)
+
+# Layers that change only on re-import or an occasional feature PATCH
+STATIC_LAYERS = (
+    "land_use_footprints",
+    "road_footprints",
+    "flood_zone_footprints",
+    "bridge_footprints",
+    "furniture_footprints",
+    "vegetation_footprints",
+)
+
+_EXTENT = 4096
+_BUFFER = 64
+
+# Property columns per layer, looked up once from the catalog
+_COLUMNS_SQL = """
+    SELECT attname
+    FROM pg_attribute
+    WHERE attrelid = ('citydb.' || $1)::regclass
+      AND attnum > 0 AND NOT attisdropped
+      AND atttypid <> 'geometry'::regtype
+    ORDER BY attnum
+"""
+
+_TILE_SQL = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope($1, $2, $3) AS env,
+               ST_Transform(ST_TileEnvelope($1, $2, $3, margin => {margin}), 4326) AS filter
+    )
+    SELECT ST_AsMVT(t, '{layer}', {extent}, 'geom')
+    FROM (
+        SELECT {columns}
+               ST_AsMVTGeom(ST_Transform(f.geometry, 3857), bounds.env, {extent}, {buffer}, true) AS geom
+        FROM {source} f, bounds
+        WHERE f.geometry && bounds.filter
+    ) t
+    WHERE t.geom IS NOT NULL
+"""
+
+# Generalized level: same properties, geometry from citydb.footprint_generalized
+_GENERALIZED_FROM = """(
+            SELECT {columns}g.geometry
+            FROM citydb.footprint_generalized g
+            JOIN citydb.{layer} l ON l.gmlid = g.gmlid
+            WHERE g.layer = '{layer}' AND g.level = {level}
+        )"""
+
+_layer_sql: dict[tuple[str, int], str] = {}
+
+_tile_cache = ResultCache(
+    "mvt",
+    max_bytes=get_settings().mvt_cache_max_bytes,
+    max_entries=get_settings().mvt_cache_max_entries,
+)
+
+
+def _tile_path(layer: str, z: int, x: int, y: int) -> Path:
+    return Path(get_settings().mvt_cache_dir) / layer / str(z) / str(x) / f"{y}.mvt"
+
+
+async def _get_layer_sql(conn, layer: str, level: int = 0) -> str:
+    if (layer, level) not in _layer_sql and layer == BIN_LAYER:
+        _layer_sql[(layer, level)] = bin_tile_sql(level, _EXTENT, _BUFFER)
+    if (layer, level) not in _layer_sql:
+        columns = [r["attname"] for r in await conn.fetch(_COLUMNS_SQL, layer)]
+        source = f"citydb.{layer}"
+        if level:
+            source = _GENERALIZED_FROM.format(
+                layer=layer,
+                level=level,
+                columns="".join(f'l."{c}", ' for c in columns),
+            )
+        _layer_sql[(layer, level)] = _TILE_SQL.format(
+            layer=layer,
+            source=source,
+            columns="".join(f'f."{c}", ' for c in columns),
+            extent=_EXTENT,
+            buffer=_BUFFER,
+            margin=_BUFFER / _EXTENT,
+        )
+    return _layer_sql[(layer, level)]
+
+
+async def render_tile(conn, layer: str, z: int, x: int, y: int) -> bytes:
+    """Render one tile from PostGIS, bypassing every cache (b"" when empty)."""
+    if layer == BIN_LAYER:
+        level = resolution_for_zoom(z)
+    else:
+        level = level_for_zoom(z) if layer in GENERALIZED_LAYERS else 0
+    return await conn.fetchval(await _get_layer_sql(conn, layer, level), z, x, y) or b""
+
+
+async def get_tile(layer: str, z: int, x: int, y: int) -> bytes:
+    """Return the MVT bytes of one tile (b"" when the tile is empty)."""
+    if layer in STATIC_LAYERS:
+        tile = read_archived_tile(layer, z, x, y)
+        if tile is not None:
+            return tile
+
+    cacheable = z <= get_settings().mvt_cache_max_zoom
+    key = (layer, z, x, y)
+    if cacheable:
+        tile = _tile_cache.get(key)
+        if tile is not None:
+            return tile
+        path = _tile_path(layer, z, x, y)
+        if path.exists():
+            tile = path.read_bytes()
+            _tile_cache.put(key, tile, len(tile), current_epoch())
+            return tile
+
+    epoch = current_epoch()
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        tile = await render_tile(conn, layer, z, x, y)
+
+    if cacheable and epoch == current_epoch() and not is_replica_pool(pool):
+        _tile_cache.put(key, tile, len(tile), epoch)
+        path = _tile_path(layer, z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(tile)
+        tmp.replace(path)
+    return tile
+
+
+def tile_range(lon_min: float, lat_min: float, lon_max: float, lat_max: float, z: int):
+    """x/y index ranges of the tiles at zoom z whose buffered extent touches the box."""
+    n = 2 ** z
+    pad = _BUFFER / _EXTENT
+
+    def tx(lon):
+        return (lon + 180.0) / 360.0 * n
+
+    def ty(lat):
+        lat = max(min(lat, 85.0511), -85.0511)
+        r = math.radians(lat)
+        return (1.0 - math.asinh(math.tan(r)) / math.pi) / 2.0 * n
+
+    x0 = max(int(math.floor(tx(lon_min) - pad)), 0)
+    x1 = min(int(math.floor(tx(lon_max) + pad)), n - 1)
+    y0 = max(int(math.floor(ty(lat_max) - pad)), 0)
+    y1 = min(int(math.floor(ty(lat_min) + pad)), n - 1)
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def invalidate_bbox(layer: str, bbox) -> int:
+    """
+    Drop every cached tile of this layer touched by a lon/lat box.
+
+    bbox is (xmin, ymin, xmax, ymax) or None (no geometry: nothing to drop).
+    Returns the number of tile keys dropped.
+    """
+    if bbox is None or any(v is None for v in bbox):
+        return 0
+    dropped = 0
+    for z in range(get_settings().mvt_cache_max_zoom + 1):
+        xs, ys = tile_range(*bbox, z)
+        for x in xs:
+            for y in ys:
+                _tile_cache.invalidate((layer, z, x, y))
+                _tile_path(layer, z, x, y).unlink(missing_ok=True)
+                dropped += 1
+    return dropped
+
+
+def _on_change(event: dict) -> None:
+    if event.get("kind") == "tiles":
+        for layer, bbox in event["items"]:
+            invalidate_bbox(layer, bbox)
+    elif event.get("kind") == "reset":
+        _tile_cache.clear()
+
+
+changes.subscribe(_on_change)
+
+
+def clear_layer(layer: str) -> None:
+    """Drop every cached tile of one layer (after a whole-layer refresh)."""
+    for key in [k for k in _tile_cache.keys() if k[0] == layer]:
+        _tile_cache.invalidate(key)
+    shutil.rmtree(Path(get_settings().mvt_cache_dir) / layer, ignore_errors=True)
+
+
+async def purge(layers: list[str]) -> None:
+    """Delete the layers' disk tiles and have every running worker drop its memory tiles."""
+    for layer in layers:
+        clear_layer(layer)
+    pool = await get_pool("write")
+    async with pool.acquire() as conn:
+        await changes.publish_reset(conn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the MVT tile cache")
+    parser.add_argument("layers", nargs="*", help=f"default: all of {', '.join(LAYERS)}")
+    parser.add_argument("--clear", action="store_true", required=True,
+                        help="purge cached tiles (after imports and migrations that bypass the API)")
+    args = parser.parse_args()
+    unknown = set(args.layers) - set(LAYERS)
+    if unknown:
+        parser.error(f"not a tile layer: {', '.join(sorted(unknown))}")
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main():
+        from app.database import close_pool
+        try:
+            await purge(args.layers or list(LAYERS))
+            print(f"cleared: {', '.join(args.layers or LAYERS)}")
+        finally:
+            await close_pool()
+
+    asyncio.run(_main())
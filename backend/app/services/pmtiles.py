@@ -0,0 +1,259 @@
+"""
+PMTiles v3 archives: writer, and a reader doing range reads over mmap.
+
+Format: https://github.com/protomaps/PMTiles/blob/main/spec/v3/spec.md
+Tiles are stored uncompressed MVT (served as-is); directories are gzipped.
+Identical tiles are stored once, and runs of them share one directory entry.
+
+Archives live at settings.pmtiles_dir/{layer}.pmtiles; read_archived_tile()
+keeps one mmap per layer and reopens it when the file is replaced (rebuilds
+write a temp file and rename it over the old one).
+"""
+
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from pathlib import Path
+
+from app.config import get_settings
+
+_HEADER_LEN = 127
+_ROOT_MAX_BYTES = 16384 - _HEADER_LEN
+_COMPRESSION_NONE, _COMPRESSION_GZIP = 1, 2
+_TILE_TYPE_MVT = 1
+
+
+def archive_path(layer: str) -> Path:
+    return Path(get_settings().pmtiles_dir) / f"{layer}.pmtiles"
+
+
+# ── Tile ids & directories ─────────────────────────────────────────────────────
+
+def zxy_to_tileid(z: int, x: int, y: int) -> int:
+    """Hilbert-curve tile id, counting all tiles of lower zooms first."""
+    acc = ((1 << (2 * z)) - 1) // 3
+    d = 0
+    s = (1 << z) // 2
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x, y = s - 1 - x, s - 1 - y
+            x, y = y, x
+        s //= 2
+    return acc + d
+
+
+def _write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf: bytes, pos: int) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _encode_directory(entries: list[tuple[int, int, int, int]]) -> bytes:
+    """entries: (tile_id, offset, length, run_length), sorted by tile_id."""
+    out = bytearray()
+    _write_varint(out, len(entries))
+    last = 0
+    for tile_id, _, _, _ in entries:
+        _write_varint(out, tile_id - last)
+        last = tile_id
+    for _, _, _, run_length in entries:
+        _write_varint(out, run_length)
+    for _, _, length, _ in entries:
+        _write_varint(out, length)
+    for i, (_, offset, _, _) in enumerate(entries):
+        if i > 0 and offset == entries[i - 1][1] + entries[i - 1][2]:
+            _write_varint(out, 0)
+        else:
+            _write_varint(out, offset + 1)
+    return gzip.compress(bytes(out))
+
+
+def _decode_directory(data: bytes) -> list[tuple[int, int, int, int]]:
+    buf = gzip.decompress(data)
+    n, pos = _read_varint(buf, 0)
+    ids, runs, lengths, offsets = [], [], [], []
+    last = 0
+    for _ in range(n):
+        delta, pos = _read_varint(buf, pos)
+        last += delta
+        ids.append(last)
+    for _ in range(n):
+        v, pos = _read_varint(buf, pos)
+        runs.append(v)
+    for _ in range(n):
+        v, pos = _read_varint(buf, pos)
+        lengths.append(v)
+    for i in range(n):
+        v, pos = _read_varint(buf, pos)
+        offsets.append(offsets[i - 1] + lengths[i - 1] if v == 0 and i > 0 else v - 1)
+    return list(zip(ids, offsets, lengths, runs))
+
+
+# ── Writer ─────────────────────────────────────────────────────────────────────
+
+def write_archive(
+    path: Path,
+    tiles: dict[tuple[int, int, int], bytes],
+    bounds: tuple[float, float, float, float],
+    min_zoom: int,
+    max_zoom: int,
+    metadata: dict,
+) -> None:
+    """Write all non-empty tiles of a layer to a PMTiles file (atomically replaced)."""
+    by_id = sorted((zxy_to_tileid(*zxy), data) for zxy, data in tiles.items() if data)
+
+    data_section = bytearray()
+    content_offsets: dict[bytes, tuple[int, int]] = {}
+    entries: list[list[int]] = []
+    for tile_id, data in by_id:
+        digest = hashlib.sha256(data).digest()
+        if digest not in content_offsets:
+            content_offsets[digest] = (len(data_section), len(data))
+            data_section.extend(data)
+        offset, length = content_offsets[digest]
+        last = entries[-1] if entries else None
+        if last and last[1] == offset and last[0] + last[3] == tile_id:
+            last[3] += 1
+        else:
+            entries.append([tile_id, offset, length, 1])
+    entries_t = [tuple(e) for e in entries]
+
+    # Root directory must fit in the first 16 KiB; otherwise split into leaves
+    root = _encode_directory(entries_t)
+    leaves = b""
+    leaf_size = 4096
+    while len(root) > _ROOT_MAX_BYTES:
+        root_entries, leaf_parts, leaf_offset = [], [], 0
+        for i in range(0, len(entries_t), leaf_size):
+            chunk = entries_t[i:i + leaf_size]
+            encoded = _encode_directory(chunk)
+            root_entries.append((chunk[0][0], leaf_offset, len(encoded), 0))
+            leaf_parts.append(encoded)
+            leaf_offset += len(encoded)
+        root = _encode_directory(root_entries)
+        leaves = b"".join(leaf_parts)
+        leaf_size *= 2
+
+    meta = gzip.compress(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+    root_offset = _HEADER_LEN
+    meta_offset = root_offset + len(root)
+    leaves_offset = meta_offset + len(meta)
+    data_offset = leaves_offset + len(leaves)
+
+    west, south, east, north = bounds
+    header = b"PMTiles" + struct.pack(
+        "<BQQQQQQQQQQQBBBBBBiiiiBii",
+        3,
+        root_offset, len(root),
+        meta_offset, len(meta),
+        leaves_offset, len(leaves),
+        data_offset, len(data_section),
+        len(by_id), len(entries_t), len(content_offsets),
+        1,                      # clustered: contents written in tile-id order
+        _COMPRESSION_GZIP,      # internal (directories, metadata)
+        _COMPRESSION_NONE,      # tiles
+        _TILE_TYPE_MVT,
+        min_zoom, max_zoom,
+        round(west * 1e7), round(south * 1e7), round(east * 1e7), round(north * 1e7),
+        max_zoom,
+        round((west + east) / 2 * 1e7), round((south + north) / 2 * 1e7),
+    )
+    assert len(header) == _HEADER_LEN
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(root)
+        f.write(meta)
+        f.write(leaves)
+        f.write(data_section)
+    os.replace(tmp, path)
+
+
+# ── Reader ─────────────────────────────────────────────────────────────────────
+
+class PMTilesReader:
+    """Memory-mapped archive; tiles are returned as slices of the mapping."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        stat = os.fstat(self._file.fileno())
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = struct.unpack_from("<BQQQQQQQQQQQBBBBBBiiiiBii", self._mm, 7)
+        (_, root_off, root_len, meta_off, meta_len, self._leaves_off, _,
+         self._data_off, _, _, _, _, _, _, _, _, self.min_zoom, self.max_zoom) = fields[:18]
+        self._root = _decode_directory(self._mm[root_off:root_off + root_len])
+        self.metadata = json.loads(gzip.decompress(self._mm[meta_off:meta_off + meta_len]))
+        self._leaves: dict[tuple[int, int], list] = {}
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def get(self, z: int, x: int, y: int) -> bytes:
+        """Tile bytes, or b"" when the archive has no tile there."""
+        tile_id = zxy_to_tileid(z, x, y)
+        directory = self._root
+        for _ in range(4):   # spec: at most 3 levels of leaf directories
+            i = bisect_right(directory, (tile_id, float("inf"))) - 1
+            if i < 0:
+                return b""
+            entry_id, offset, length, run_length = directory[i]
+            if run_length == 0:
+                key = (offset, length)
+                if key not in self._leaves:
+                    start = self._leaves_off + offset
+                    self._leaves[key] = _decode_directory(self._mm[start:start + length])
+                directory = self._leaves[key]
+                continue
+            if tile_id >= entry_id + run_length:
+                return b""
+            start = self._data_off + offset
+            return self._mm[start:start + length]
+        return b""
+
+
+_readers: dict[str, PMTilesReader] = {}
+
+
+def read_archived_tile(layer: str, z: int, x: int, y: int) -> bytes | None:
+    """
+    Tile from the layer's archive; None when there is no archive or z is outside
+    its zoom range (the caller renders from PostGIS instead).
+    """
+    path = archive_path(layer)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    reader = _readers.get(layer)
+    if reader is None or reader.identity != (stat.st_ino, stat.st_mtime_ns):
+        if reader is not None:
+            reader.close()
+        reader = _readers[layer] = PMTilesReader(path)
+    if not reader.min_zoom <= z <= reader.max_zoom:
+        return None
+    return reader.get(z, x, y)
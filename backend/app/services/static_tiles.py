@@ -0,0 +1,170 @@
+"""
+PMTiles archives for the static map layers (mvt.STATIC_LAYERS).
+
+Build (after migrations 002/003, and again after any re-import):
+    docker exec 3dcity-backend python -m app.services.static_tiles [--refresh] [layer ...]
+
+Every tile of zooms pmtiles_min_zoom..pmtiles_max_zoom that touches the layer's
+extent is rendered with the same SQL as the live tile endpoint and written to
+settings.pmtiles_dir/{layer}.pmtiles. The archive's metadata records a
+fingerprint of the layer's rows; a layer whose rows have not changed since its
+archive was built is skipped, so re-running the command is cheap.
+
+A feature PATCH calls schedule_layer_refresh(layer): after a short debounce the
+layer's materialized view is refreshed in the background and, if its rows
+changed, the archive is rebuilt. A PATCH that lands while a refresh is running
+marks the layer dirty, and the refresh runs again once it finishes. Views with
+the unique index of migration 017 are refreshed CONCURRENTLY, so tile reads are
+not blocked. Tiles keep coming from the old archive until the new one replaces it.
+"""
+
+import argparse
+import asyncio
+import logging
+
+import asyncpg
+
+from app.config import get_settings
+from app.database import get_pool
+from app.services.generalize import refresh_generalized
+from app.services.mvt import STATIC_LAYERS, clear_layer, render_tile, tile_range
+from app.services.pmtiles import PMTilesReader, archive_path, write_archive
+
+logger = logging.getLogger(__name__)
+
+_EXTENT_SQL = """
+    SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e)
+    FROM (SELECT ST_Extent(geometry) AS e FROM citydb.{layer}) t
+"""
+
+# Row-level fingerprint: independent of row order and of the layer's columns
+_FINGERPRINT_SQL = """
+    SELECT count(*)::text || ':' || COALESCE(md5(string_agg(h, '' ORDER BY h)), '')
+    FROM (SELECT md5(f::text) AS h FROM citydb.{layer} f) t
+"""
+
+_layer_locks: dict[str, asyncio.Lock] = {}
+_refresh_tasks: dict[str, asyncio.Task] = {}
+_dirty: set[str] = set()
+
+
+def _archived_fingerprint(layer: str) -> str | None:
+    path = archive_path(layer)
+    if not path.exists():
+        return None
+    reader = PMTilesReader(path)
+    try:
+        return reader.metadata.get("source_fingerprint")
+    finally:
+        reader.close()
+
+
+async def build_layer(conn, layer: str, force: bool = False) -> int | None:
+    """(Re)build one layer's archive; returns the tile count, or None if it was up to date."""
+    settings = get_settings()
+    fingerprint = await conn.fetchval(_FINGERPRINT_SQL.format(layer=layer))
+    if not force and fingerprint == _archived_fingerprint(layer):
+        return None
+
+    bbox = await conn.fetchrow(_EXTENT_SQL.format(layer=layer))
+    if bbox[0] is None:
+        archive_path(layer).unlink(missing_ok=True)
+        return 0
+    tiles = {}
+    for z in range(settings.pmtiles_min_zoom, settings.pmtiles_max_zoom + 1):
+        xs, ys = tile_range(*bbox, z)
+        for x in xs:
+            for y in ys:
+                tile = await render_tile(conn, layer, z, x, y)
+                if tile:
+                    tiles[(z, x, y)] = tile
+    write_archive(
+        archive_path(layer),
+        tiles,
+        tuple(bbox),
+        settings.pmtiles_min_zoom,
+        settings.pmtiles_max_zoom,
+        {
+            "name": layer,
+            "format": "pbf",
+            "vector_layers": [{"id": layer}],
+            "source_fingerprint": fingerprint,
+        },
+    )
+    return len(tiles)
+
+
+async def refresh_view(conn, layer: str) -> None:
+    """REFRESH the layer's materialized view, CONCURRENTLY when its unique index exists."""
+    try:
+        await conn.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY citydb.{layer}")
+    except asyncpg.ObjectNotInPrerequisiteStateError:
+        # No unique index yet (migration 017): blocking refresh
+        await conn.execute(f"REFRESH MATERIALIZED VIEW citydb.{layer}")
+
+
+async def _refresh_layer(layer: str) -> None:
+    """Refresh the layer's view and rebuild its archive if the rows changed, until no PATCH is pending."""
+    lock = _layer_locks.setdefault(layer, asyncio.Lock())
+    try:
+        while layer in _dirty:
+            await asyncio.sleep(get_settings().static_layer_refresh_debounce_seconds)
+            _dirty.discard(layer)
+            async with lock:
+                pool = await get_pool("write")
+                async with pool.acquire() as conn:
+                    await refresh_view(conn, layer)
+                    async with conn.transaction():
+                        await refresh_generalized(conn, layer)
+                clear_layer(layer)
+                if archive_path(layer).exists():
+                    export_pool = await get_pool("export")
+                    async with export_pool.acquire() as conn:
+                        count = await build_layer(conn, layer)
+                    if count is not None:
+                        logger.info("PMTiles: rebuilt %s (%d tiles)", layer, count)
+    except Exception:
+        logger.exception("PMTiles: refresh of %s failed", layer)
+    finally:
+        _refresh_tasks.pop(layer, None)
+
+
+def schedule_layer_refresh(layer: str) -> None:
+    """Refresh a static layer in the background; a running refresh picks the change up with another pass."""
+    if layer not in STATIC_LAYERS:
+        return
+    _dirty.add(layer)
+    if layer not in _refresh_tasks:
+        _refresh_tasks[layer] = asyncio.get_running_loop().create_task(_refresh_layer(layer))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build PMTiles archives for the static map layers")
+    parser.add_argument("layers", nargs="*", help=f"default: all of {', '.join(STATIC_LAYERS)}")
+    parser.add_argument(
+        "--refresh", action="store_true",
+        help="REFRESH the materialized views (and their generalized levels) first",
+    )
+    parser.add_argument("--force", action="store_true", help="rebuild even if the rows are unchanged")
+    args = parser.parse_args()
+    unknown = set(args.layers) - set(STATIC_LAYERS)
+    if unknown:
+        parser.error(f"not a static layer: {', '.join(sorted(unknown))}")
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main():
+        from app.database import close_pool
+        try:
+            pool = await get_pool("export")
+            async with pool.acquire() as conn:
+                for layer in args.layers or STATIC_LAYERS:
+                    if args.refresh:
+                        await refresh_view(conn, layer)
+                        async with conn.transaction():
+                            await refresh_generalized(conn, layer)
+                    count = await build_layer(conn, layer, force=args.force)
+                    print(f"{layer}: " + ("unchanged" if count is None else f"{count} tiles"))
+        finally:
+            await close_pool()
+
+    asyncio.run(_main())
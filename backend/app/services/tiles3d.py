@@ -0,0 +1,320 @@
+"""
+Local 3D Tiles 1.1 tileset of the buildings, generated from the database.
+
+Layout on disk (settings.tiles3d_dir):
+    tileset.json          quadtree; only leaves have content
+    index.json            leaf key → gmlids, region, transform, revision
+    tiles/{i}_{j}.glb     one batched GLB per leaf (app/services/gltf.py)
+
+Leaves are cells of a fixed grid in EPSG:6677 (tiles3d_leaf_size_m); a building
+belongs to the cell holding its footprint centroid. Parents are built by
+halving the cell indices until a single root remains. Geometry is LOD2 from
+citydb.building_lod2_cache, falling back to the LOD1 solid.
+
+Each leaf's GLB is in local metres around the cell centre; the tile transform
+maps that frame (grid axes, rotated by the meridian convergence) to ECEF.
+PLATEAU heights are orthometric, so tiles3d_height_offset_m (the geoid height)
+is added to sit the buildings on the WGS84 ellipsoid.
+
+Full build:
+    docker exec 3dcity-backend python -m app.services.tiles3d
+
+After that, building writes call schedule_rebuild(gmlid): the leaves that held
+the building and the one that holds it now are regenerated in the background
+and tileset.json is rewritten. Nothing happens until a full build exists.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+from pathlib import Path
+
+from app.config import get_settings
+from app.database import get_pool
+from app.services.gltf import LOD1_OBJECTCLASS, GlbBuilder
+
+logger = logging.getLogger(__name__)
+
+# Building footprint centroids in EPSG:6677 metres ($1 NULL = all buildings)
+_CENTROID_SQL = """
+    SELECT gmlid, ST_X(c) AS x, ST_Y(c) AS y
+    FROM (
+        SELECT gmlid, ST_Transform(ST_Centroid(geometry), 6677) AS c
+        FROM citydb.building_footprints
+        WHERE geometry IS NOT NULL
+          AND ($1::text[] IS NULL OR gmlid = ANY($1))
+    ) t
+"""
+
+# LOD2 surfaces from the cache, else the LOD1 solid faces, in the surfaces_6677 shape
+_SURFACES_SQL = f"""
+    SELECT co.gmlid, b.usage,
+           COALESCE(c.surfaces_6677, (
+               SELECT json_agg(json_build_object(
+                   'objectclass_id', {LOD1_OBJECTCLASS},
+                   'geometry', ST_AsGeoJSON(
+                       ST_Transform(ST_SetSRID(ST_FlipCoordinates(sg.geometry), 4326), 6677), 6, 0
+                   )::json
+               ) ORDER BY sg.id)
+               FROM citydb.surface_geometry sg
+               WHERE sg.root_id = b.lod1_solid_id AND sg.geometry IS NOT NULL
+           )) AS surfaces
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    LEFT JOIN citydb.building_lod2_cache c ON c.gmlid = co.gmlid
+    WHERE co.gmlid = ANY($1) AND b.building_root_id = b.id
+    ORDER BY co.gmlid
+"""
+
+# Cell envelope, cell centre and a point 100 m grid-north of it, in lon/lat
+_CELL_GEODETIC_SQL = """
+    SELECT ST_XMin(e) AS west, ST_YMin(e) AS south, ST_XMax(e) AS east, ST_YMax(e) AS north,
+           ST_X(o) AS lon, ST_Y(o) AS lat, ST_X(n) AS lon_n, ST_Y(n) AS lat_n
+    FROM (
+        SELECT ST_Transform(ST_MakeEnvelope($1, $2, $3, $4, 6677), 4326) AS e,
+               ST_Transform(ST_SetSRID(ST_MakePoint($5, $6), 6677), 4326) AS o,
+               ST_Transform(ST_SetSRID(ST_MakePoint($5, $6 + 100), 6677), 4326) AS n
+    ) t
+"""
+
+_WGS84_A = 6378137.0
+_WGS84_E2 = 6.69437999014e-3
+
+_rebuild_lock = asyncio.Lock()
+_pending: set[str] = set()
+_worker: asyncio.Task | None = None
+
+
+def tiles_dir() -> Path:
+    return Path(get_settings().tiles3d_dir)
+
+
+def _key(i: int, j: int) -> str:
+    return f"{i}_{j}"
+
+
+def _cell(x: float, y: float, size: float) -> tuple[int, int]:
+    return math.floor(x / size), math.floor(y / size)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _enu_to_ecef(lon: float, lat: float, height: float, convergence: float) -> list[float]:
+    """Column-major 4x4 from the cell frame (grid east, grid north, up) to ECEF."""
+    lam, phi = math.radians(lon), math.radians(lat)
+    sl, cl, sp, cp = math.sin(lam), math.cos(lam), math.sin(phi), math.cos(phi)
+    n = _WGS84_A / math.sqrt(1 - _WGS84_E2 * sp * sp)
+    origin = [(n + height) * cp * cl, (n + height) * cp * sl, (n * (1 - _WGS84_E2) + height) * sp]
+    east = [-sl, cl, 0.0]
+    north = [-sp * cl, -sp * sl, cp]
+    up = [cp * cl, cp * sl, sp]
+    # Grid north is rotated clockwise from true north by the convergence angle
+    cg, sg = math.cos(convergence), math.sin(convergence)
+    x_axis = [cg * e - sg * nn for e, nn in zip(east, north)]
+    y_axis = [sg * e + cg * nn for e, nn in zip(east, north)]
+    return x_axis + [0.0] + y_axis + [0.0] + up + [0.0] + origin + [1.0]
+
+
+# ── Index ─────────────────────────────────────────────────────────────────────
+
+def _load_index() -> dict | None:
+    path = tiles_dir() / "index.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def _save_index(index: dict) -> None:
+    _write_atomic(tiles_dir() / "index.json", json.dumps(index).encode("utf-8"))
+
+
+def _write_tileset(index: dict) -> None:
+    """Rebuild tileset.json from the leaves in the index."""
+    size = index["leaf_size"]
+    nodes: dict[tuple[int, int], dict] = {}
+    for key, leaf in index["tiles"].items():
+        i, j = (int(v) for v in key.split("_"))
+        nodes[(i, j)] = {
+            "boundingVolume": {"region": leaf["region"]},
+            "geometricError": 0,
+            "transform": leaf["transform"],
+            "content": {"uri": f"tiles/{key}.glb?v={leaf['revision']}"},
+        }
+
+    level_size = size
+    while len(nodes) > 1:
+        level_size *= 2
+        parents: dict[tuple[int, int], dict] = {}
+        for (i, j), node in sorted(nodes.items()):
+            parent = parents.setdefault((i >> 1, j >> 1), {
+                "boundingVolume": {"region": list(node["boundingVolume"]["region"])},
+                "geometricError": level_size / 4,
+                "refine": "ADD",
+                "children": [],
+            })
+            region = parent["boundingVolume"]["region"]
+            child = node["boundingVolume"]["region"]
+            parent["boundingVolume"]["region"] = [
+                min(region[0], child[0]), min(region[1], child[1]),
+                max(region[2], child[2]), max(region[3], child[3]),
+                min(region[4], child[4]), max(region[5], child[5]),
+            ]
+            parent["children"].append(node)
+        nodes = parents
+
+    if nodes:
+        root = next(iter(nodes.values()))
+        root["refine"] = "ADD"
+    else:
+        root = {"boundingVolume": {"region": [0, 0, 0, 0, 0, 0]}, "geometricError": 0, "refine": "ADD"}
+    tileset = {
+        "asset": {"version": "1.1", "generator": "plateau-3dcitydb"},
+        "geometricError": max(root["geometricError"] * 2, size),
+        "root": root,
+    }
+    _write_atomic(tiles_dir() / "tileset.json", json.dumps(tileset).encode("utf-8"))
+
+
+# ── Tile generation ────────────────────────────────────────────────────────────
+
+async def _build_leaf(conn, i: int, j: int, gmlids: list[str], size: float, previous: dict | None) -> dict | None:
+    """Write tiles/{i}_{j}.glb for these buildings; returns the index entry (None if empty)."""
+    settings = get_settings()
+    path = tiles_dir() / "tiles" / f"{_key(i, j)}.glb"
+    cx, cy = (i + 0.5) * size, (j + 0.5) * size
+    builder = GlbBuilder([cx, cy, 0.0], batched=True)
+    built = []
+    for row in await conn.fetch(_SURFACES_SQL, gmlids):
+        if row["surfaces"] is None:
+            continue
+        if builder.add_building(
+            row["gmlid"], json.loads(row["surfaces"]), {"gml_id": row["gmlid"], "usage": row["usage"]}
+        ) is not None:
+            built.append(row["gmlid"])
+    if builder.is_empty:
+        path.unlink(missing_ok=True)
+        return None
+
+    lo, hi = builder.bounds()
+    geo = await conn.fetchrow(
+        _CELL_GEODETIC_SQL, cx + lo[0], cy + lo[1], cx + hi[0], cy + hi[1], cx, cy,
+    )
+    lat0 = math.radians(geo["lat"])
+    convergence = math.atan2(
+        (geo["lon_n"] - geo["lon"]) * math.cos(lat0), geo["lat_n"] - geo["lat"]
+    )
+    offset = settings.tiles3d_height_offset_m
+    _write_atomic(path, builder.to_glb())
+    return {
+        "gmlids": built,
+        "region": [
+            math.radians(geo["west"]), math.radians(geo["south"]),
+            math.radians(geo["east"]), math.radians(geo["north"]),
+            lo[2] + offset, hi[2] + offset,
+        ],
+        "transform": _enu_to_ecef(geo["lon"], geo["lat"], offset, convergence),
+        "revision": (previous or {}).get("revision", 0) + 1,
+    }
+
+
+async def build_all() -> dict:
+    """Generate the whole tileset from scratch."""
+    size = get_settings().tiles3d_leaf_size_m
+    index = {"leaf_size": size, "tiles": {}}
+    pool = await get_pool("export")
+    async with _rebuild_lock, pool.acquire() as conn:
+        cells: dict[tuple[int, int], list[str]] = {}
+        for row in await conn.fetch(_CENTROID_SQL, None):
+            cells.setdefault(_cell(row["x"], row["y"], size), []).append(row["gmlid"])
+        for n, ((i, j), gmlids) in enumerate(sorted(cells.items()), 1):
+            leaf = await _build_leaf(conn, i, j, gmlids, size, None)
+            if leaf:
+                index["tiles"][_key(i, j)] = leaf
+            if n % 50 == 0:
+                logger.info("3D Tiles: %d / %d leaves", n, len(cells))
+        _save_index(index)
+        _write_tileset(index)
+    return {"tiles": len(index["tiles"]), "buildings": sum(len(t["gmlids"]) for t in index["tiles"].values())}
+
+
+async def rebuild_buildings(gmlids: set[str]) -> None:
+    """Regenerate only the leaves that held or now hold these buildings."""
+    async with _rebuild_lock:
+        index = _load_index()
+        if index is None:
+            return
+        size = index["leaf_size"]
+        tiles = index["tiles"]
+        dirty: dict[str, set[str]] = {}
+        for key, leaf in tiles.items():
+            if gmlids.intersection(leaf["gmlids"]):
+                dirty[key] = set(leaf["gmlids"]) - gmlids
+
+        pool = await get_pool("export")
+        async with pool.acquire() as conn:
+            for row in await conn.fetch(_CENTROID_SQL, list(gmlids)):
+                key = _key(*_cell(row["x"], row["y"], size))
+                if key not in dirty:
+                    dirty[key] = set(tiles.get(key, {}).get("gmlids", []))
+                dirty[key].add(row["gmlid"])
+
+            for key, members in dirty.items():
+                i, j = (int(v) for v in key.split("_"))
+                leaf = await _build_leaf(conn, i, j, sorted(members), size, tiles.get(key)) if members else None
+                if leaf:
+                    tiles[key] = leaf
+                else:
+                    tiles.pop(key, None)
+                    (tiles_dir() / "tiles" / f"{key}.glb").unlink(missing_ok=True)
+        _save_index(index)
+        _write_tileset(index)
+
+
+async def _drain() -> None:
+    global _worker
+    try:
+        while _pending:
+            batch = set(_pending)
+            _pending.clear()
+            try:
+                await rebuild_buildings(batch)
+            except Exception:
+                logger.exception("3D Tiles rebuild failed for %d buildings", len(batch))
+    finally:
+        _worker = None
+
+
+def schedule_rebuild(gmlid: str) -> None:
+    """Queue a background rebuild of the leaves touched by a write to this building."""
+    global _worker
+    if not (tiles_dir() / "index.json").exists():
+        return
+    _pending.add(gmlid)
+    if _worker is None:
+        _worker = asyncio.get_running_loop().create_task(_drain())
+
+
+async def flush_rebuilds() -> None:
+    """Wait for queued rebuilds to be written (command-line tools, before exiting)."""
+    while _worker is not None:
+        await _worker
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main():
+        from app.database import close_pool
+        try:
+            print(await build_all())
+        finally:
+            await close_pool()
+
+    asyncio.run(_main())
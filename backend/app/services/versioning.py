@@ -1,13 +1,22 @@
 """
 Lightweight versioning helpers for city features.
 
-Call archive_and_next_version() + insert_version() inside an existing
-asyncpg transaction connection to atomically record a change.
+Call record_version() (one feature) or record_versions() (any number) inside
+an existing asyncpg transaction connection to atomically record a change.
+Both are a single round trip: citydb.fv_record_versions (migration 013)
+archives the current version, assigns the next number and inserts the record
+server-side. The new versions are also published on the change feed
+(app/services/changes.py), delivered when the transaction commits.
 """
 
 import decimal
 import json
 
+from app.services.changes import publish
+from app.services.cache import bump_write_epoch
+
+_RECORD_SQL = "SELECT ord, gmlid, version FROM citydb.fv_record_versions($1, $2, $3, $4, $5)"
+
 
 class _Encoder(json.JSONEncoder):
     def default(self, o):
@@ -16,51 +25,49 @@ class _Encoder(json.JSONEncoder):
         return super().default(o)
 
 
-async def archive_and_next_version(conn, gmlid: str) -> int:
+async def record_versions(
+    conn,
+    changes: list[tuple[str, str, dict]],
+    source_tag: str = "manual-edit",
+    note: str | None = None,
+) -> list[int]:
     """
-    Mark the current version of gmlid as 'archived' and return the next version number.
-    If no version exists yet, returns 1 (first version).
+    Record one version per (gmlid, change_type, attributes) and return the
+    assigned version numbers in the same order. 'delete' changes are stored
+    with status 'deleted', everything else becomes the current version.
     """
-    # Serialize version assignment per feature to avoid duplicate MAX(version)+1
-    # results under concurrent writes for the same gmlid.
-    await conn.fetchval(
-        "SELECT pg_advisory_xact_lock(hashtext($1), 0)",
-        gmlid,
-    )
-    await conn.execute(
-        "UPDATE citydb.feature_versions SET status = 'archived' "
-        "WHERE gmlid = $1 AND status = 'current'",
-        gmlid,
+    if not changes:
+        return []
+    rows = await conn.fetch(
+        _RECORD_SQL,
+        [gmlid for gmlid, _, _ in changes],
+        [change_type for _, change_type, _ in changes],
+        [json.dumps(attributes, cls=_Encoder) for _, _, attributes in changes],
+        source_tag,
+        note,
     )
-    next_ver = await conn.fetchval(
-        "SELECT COALESCE(MAX(version), 0) + 1 FROM citydb.feature_versions WHERE gmlid = $1",
-        gmlid,
+    # ord is the 1-based position in changes; the result order is not guaranteed
+    versions = [0] * len(changes)
+    for r in rows:
+        versions[r["ord"] - 1] = r["version"]
+    await publish(
+        conn, "versions",
+        [[gmlid, change_type, version] for (gmlid, change_type, _), version in zip(changes, versions)],
+        source=source_tag,
     )
-    return next_ver
+    # The caller bumps again after commit; this one covers callers that don't.
+    bump_write_epoch()
+    return versions
 
 
-async def insert_version(
+async def record_version(
     conn,
     gmlid: str,
-    version: int,
     change_type: str,
     attributes: dict,
     source_tag: str = "manual-edit",
     note: str | None = None,
-    status: str = "current",
-):
-    """Insert a new version record for gmlid."""
-    await conn.execute(
-        """
-        INSERT INTO citydb.feature_versions
-            (gmlid, version, status, source_tag, change_type, attributes, change_note)
-        VALUES ($1, $2, $3, $4, $5, $6, $7)
-        """,
-        gmlid,
-        version,
-        status,
-        source_tag,
-        change_type,
-        json.dumps(attributes, cls=_Encoder),
-        note,
-    )
+) -> int:
+    """Record a new version of gmlid and return its version number."""
+    versions = await record_versions(conn, [(gmlid, change_type, attributes)], source_tag, note)
+    return versions[0]
@@ -25,16 +25,19 @@ echo "=== Census boundary import ==="
 echo "GML: $GML_FILE"
 echo ""
 
-echo "[1/3] Copying files into backend container..."
+echo "[1/4] Copying files into backend container..."
 docker cp "$GML_FILE" "$BACKEND_CONTAINER:/tmp/census_input.gml"
 docker cp "$SCRIPT_DIR/import_census_direct.py" "$BACKEND_CONTAINER:/tmp/import_census_direct.py"
 
-echo "[2/3] Running import..."
+echo "[2/4] Running import..."
 docker exec "$BACKEND_CONTAINER" python /tmp/import_census_direct.py /tmp/census_input.gml
 
-echo "[3/3] Restarting Martin tile server to discover new table..."
+echo "[3/4] Restarting Martin tile server to discover new table..."
 docker compose restart martin
 
+echo "[4/4] Purging cached census_boundaries tiles..."
+docker exec "$BACKEND_CONTAINER" python -m app.services.mvt --clear census_boundaries
+
 echo ""
 echo "Done! Verify with:"
 echo "  curl http://localhost:3000/api/areas | python3 -m json.tool | head -20"
@@ -17,7 +17,7 @@ echo "=== Shelter facility import ==="
 echo "Source: $SOURCE"
 echo ""
 
-echo "[1/3] Copying import script into backend container..."
+echo "[1/4] Copying import script into backend container..."
 docker cp "$SCRIPT_DIR/import_shelters_direct.py" "$BACKEND_CONTAINER:/tmp/import_shelters_direct.py"
 
 if [ -f "$SOURCE" ]; then
@@ -27,12 +27,15 @@ else
   ARG="$SOURCE"
 fi
 
-echo "[2/3] Running import..."
+echo "[2/4] Running import..."
 docker exec "$BACKEND_CONTAINER" python /tmp/import_shelters_direct.py "$ARG"
 
-echo "[3/3] Restarting Martin tile server to discover new table..."
+echo "[3/4] Restarting Martin tile server to discover new table..."
 docker compose restart martin
 
+echo "[4/4] Purging cached shelter_facilities tiles..."
+docker exec "$BACKEND_CONTAINER" python -m app.services.mvt --clear shelter_facilities
+
 echo ""
 echo "Done! Verify with:"
 echo "  curl http://localhost:3000/api/shelters | python3 -m json.tool | head -30"
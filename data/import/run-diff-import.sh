@@ -0,0 +1,33 @@
+#!/bin/bash
+# Apply a new PLATEAU release of the buildings incrementally (only changed features).
+#
+# Usage:
+#   ./data/import/run-diff-import.sh <bldg-gml-file-or-directory> <source-tag> [options]
+#
+# Options are passed to app.services.diff_import: --baseline, --dry-run, --overwrite-edits
+#
+# Example:
+#   # once, for the release that is already loaded
+#   ./data/import/run-diff-import.sh data/citygml/13106_taito-ku_city_2024_citygml_1_op/udx/bldg PLATEAU-2024 --baseline
+#   # then for the new release
+#   ./data/import/run-diff-import.sh data/citygml/13106_taito-ku_city_2025_citygml_1_op/udx/bldg PLATEAU-2025 --dry-run
+
+set -e
+INPUT_PATH="${1:?Usage: $0 <bldg-gml-file-or-directory> <source-tag> [options]}"
+SOURCE_TAG="${2:?Usage: $0 <bldg-gml-file-or-directory> <source-tag> [options]}"
+shift 2
+BACKEND_CONTAINER=3dcity-backend
+
+if [ ! -e "$INPUT_PATH" ]; then
+  echo "Error: not found: $INPUT_PATH"
+  exit 1
+fi
+
+echo "=== PLATEAU diff import (${SOURCE_TAG}) ==="
+echo "[1/2] Copying GML into backend container..."
+docker exec "$BACKEND_CONTAINER" rm -rf /tmp/diff_import
+docker cp "$INPUT_PATH" "$BACKEND_CONTAINER:/tmp/diff_import"
+
+echo "[2/2] Applying changes..."
+docker exec "$BACKEND_CONTAINER" python -m app.services.diff_import /tmp/diff_import --source-tag "$SOURCE_TAG" "$@"
+docker exec "$BACKEND_CONTAINER" rm -rf /tmp/diff_import
@@ -7,10 +7,16 @@
 #
 # Example:
 #   ./data/import/run-import.sh data/citygml/13106_taito-ku_city_2024_citygml_1_op/udx/bldg/
+#
+# Version records (v1 in citydb.feature_versions) are written in one pass after the
+# load instead of by the insert triggers, tagged with SOURCE_TAG (default PLATEAU-2024):
+#   SOURCE_TAG=PLATEAU-2025 ./data/import/run-import.sh ...
 
 set -euo pipefail
 
 INPUT_PATH="${1:-data/citygml}"
+SOURCE_TAG="${SOURCE_TAG:-PLATEAU-2024}"
+DB_CONTAINER=3dcitydb-pg
 REPO_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../.." && pwd)"
 
 # Load environment variables
@@ -19,6 +25,15 @@ source "${REPO_ROOT}/.env" 2>/dev/null || source "${REPO_ROOT}/.env.example"
 echo "==> Importing: ${INPUT_PATH}"
 echo "==> Target DB: ${POSTGRES_HOST:-localhost}:${POSTGRES_PORT:-5432}/${POSTGRES_DB:-citydb}"
 
+psql_db() {
+  docker exec -i "${DB_CONTAINER}" psql -U "${POSTGRES_USER:-citydb}" -d "${POSTGRES_DB:-citydb}" -v ON_ERROR_STOP=1 -qc "$1" "${@:2}"
+}
+
+# The importer cannot set session options, so defer versioning (migration 012) for
+# every new session on the database while it runs, and always put it back.
+psql_db "ALTER DATABASE ${POSTGRES_DB:-citydb} SET citydb.versioning = 'deferred'"
+trap 'psql_db "ALTER DATABASE ${POSTGRES_DB:-citydb} RESET citydb.versioning"' EXIT
+
 docker run --rm \
   --network host \
   -v "${REPO_ROOT}/data/citygml:/data:ro" \
@@ -31,4 +46,10 @@ docker run --rm \
   -p "${POSTGRES_PASSWORD:-citydb}" \
   "/data/${INPUT_PATH#data/citygml/}"
 
+# Before migration 012 the row triggers of migration 005 have already written them
+if [ "$(psql_db "SELECT to_regprocedure('citydb.fv_backfill_versions(varchar)') IS NOT NULL" -tA)" = "t" ]; then
+  echo "==> Writing version records (${SOURCE_TAG})..."
+  psql_db "SELECT citydb.fv_backfill_versions('${SOURCE_TAG}') AS versions_written"
+fi
+
 echo "==> Import complete."
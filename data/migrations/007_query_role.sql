@@ -0,0 +1,30 @@
+-- Migration 007: Low-privilege role for LLM-generated SQL
+--
+-- run_query() / stream_query() switch to this role for the duration of each
+-- generated query (SET LOCAL ROLE via set_config) when the backend runs with
+--   QUERY_ROLE=citydb_query
+-- The role can only read. Resource limits (statement_timeout, work_mem,
+-- temp_file_limit) are applied per transaction by the backend, because role-level
+-- defaults (ALTER ROLE ... SET) only take effect at login, not on SET ROLE.
+--
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/007_query_role.sql
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'citydb_query') THEN
+        CREATE ROLE citydb_query NOLOGIN;
+    END IF;
+END
+$$;
+
+GRANT USAGE ON SCHEMA citydb, public TO citydb_query;
+GRANT SELECT ON ALL TABLES IN SCHEMA citydb TO citydb_query;
+GRANT SELECT ON ALL TABLES IN SCHEMA public TO citydb_query;   -- spatial_ref_sys
+
+-- Tables created later by the owner (footprint tables, census, shelters, ...)
+ALTER DEFAULT PRIVILEGES IN SCHEMA citydb GRANT SELECT ON TABLES TO citydb_query;
+
+-- The application login must be a member to SET ROLE (no-op for superusers)
+GRANT citydb_query TO CURRENT_USER;
@@ -0,0 +1,46 @@
+-- Migration 008: Per-building LOD2 geometry cache
+--
+-- Stores ready-to-serve GeoJSON encodings of every building's LOD2 thematic
+-- surfaces so the detail view and the GeoJSON 3D / CityJSON exports no longer
+-- run ST_FlipCoordinates / ST_Transform / ST_AsGeoJSON per surface per request.
+--
+--   surfaces_wgs84  [{"objectclass_id": 33, "geometry": {...}}, ...]  lon/lat/z, 15 digits
+--   surfaces_6677   same, projected to EPSG:6677 (metres, 6 digits) for CityJSON
+--
+-- Built in bulk here (like building_footprints in 002); afterwards rows are
+-- refreshed one building at a time by PUT /api/buildings/{gmlid}/lod2 and
+-- removed by DELETE /api/buildings/{gmlid} (app/database_write.py).
+-- The per-building SELECT must stay in sync with _LOD2_CACHE_SELECT there.
+--
+-- Runtime: a few minutes for the full ward (one ST_Transform per surface, once).
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/008_building_lod2_cache.sql
+
+DROP TABLE IF EXISTS citydb.building_lod2_cache;
+
+CREATE TABLE citydb.building_lod2_cache AS
+SELECT
+    co.gmlid,
+    json_agg(json_build_object(
+        'objectclass_id', ts.objectclass_id,
+        'geometry', ST_AsGeoJSON(ST_FlipCoordinates(sg.geometry), 15, 0)::json
+    ) ORDER BY sg.id)                    AS surfaces_wgs84,
+    -- Route through 4326: PROJ cannot transform EPSG:6668 directly (axis order)
+    json_agg(json_build_object(
+        'objectclass_id', ts.objectclass_id,
+        'geometry', ST_AsGeoJSON(
+            ST_Transform(ST_SetSRID(ST_FlipCoordinates(sg.geometry), 4326), 6677), 6, 0
+        )::json
+    ) ORDER BY sg.id)                    AS surfaces_6677,
+    now()                                AS updated_at
+FROM citydb.building b
+JOIN citydb.cityobject co ON co.id = b.id
+JOIN citydb.thematic_surface ts ON ts.building_id = b.id
+JOIN citydb.surface_geometry sg ON sg.root_id = ts.lod2_multi_surface_id
+WHERE sg.geometry IS NOT NULL
+GROUP BY co.gmlid;
+
+CREATE UNIQUE INDEX ON citydb.building_lod2_cache (gmlid);
+
+SELECT COUNT(*) AS cached_buildings FROM citydb.building_lod2_cache;
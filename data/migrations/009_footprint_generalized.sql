@@ -0,0 +1,74 @@
+-- Migration 009: Generalized footprint geometry for low zooms
+--
+-- Per layer and level, a topology-preserving simplification of every feature
+-- (tolerance in EPSG:6677 metres, stored back in 4326). Features smaller than
+-- the level's minimum area get no row, so they drop out of low-zoom tiles.
+--
+--   level  tolerance  min area   tiles
+--   1      0.5 m      1 m²       z14
+--   2      1.0 m      4 m²       z13
+--   3      2.5 m      25 m²      z <= 12
+--
+-- Level 0 is the layer itself. The levels must stay in sync with LEVELS in
+-- app/services/generalize.py, which refreshes one building's rows on every
+-- footprint update and a whole layer's rows after its view is refreshed.
+--
+-- Run after 002/003 (re-run after a full re-import):
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/009_footprint_generalized.sql
+
+DROP TABLE IF EXISTS citydb.footprint_generalized;
+
+CREATE TABLE citydb.footprint_generalized (
+    layer    text                     NOT NULL,
+    level    smallint                 NOT NULL,
+    gmlid    text                     NOT NULL,
+    geometry geometry(Geometry, 4326) NOT NULL,
+    PRIMARY KEY (layer, level, gmlid)
+);
+
+-- Tiles join the generalized rows back to their layer for the properties
+-- (unique, as migration 017 creates them for REFRESH ... CONCURRENTLY)
+CREATE UNIQUE INDEX IF NOT EXISTS land_use_footprints_gmlid_uidx    ON citydb.land_use_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS road_footprints_gmlid_uidx        ON citydb.road_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS flood_zone_footprints_gmlid_uidx  ON citydb.flood_zone_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS bridge_footprints_gmlid_uidx      ON citydb.bridge_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS furniture_footprints_gmlid_uidx   ON citydb.furniture_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS vegetation_footprints_gmlid_uidx  ON citydb.vegetation_footprints (gmlid);
+
+INSERT INTO citydb.footprint_generalized (layer, level, gmlid, geometry)
+SELECT f.layer, l.level, f.gmlid,
+       ST_Transform(ST_SimplifyPreserveTopology(f.g, l.tolerance), 4326)
+FROM (
+    SELECT 'building_footprints' AS layer, gmlid, ST_Transform(geometry, 6677) AS g
+    FROM citydb.building_footprints WHERE geometry IS NOT NULL
+    UNION ALL
+    SELECT 'land_use_footprints', gmlid, ST_Transform(geometry, 6677)
+    FROM citydb.land_use_footprints WHERE geometry IS NOT NULL
+    UNION ALL
+    SELECT 'road_footprints', gmlid, ST_Transform(geometry, 6677)
+    FROM citydb.road_footprints WHERE geometry IS NOT NULL
+    UNION ALL
+    SELECT 'flood_zone_footprints', gmlid, ST_Transform(geometry, 6677)
+    FROM citydb.flood_zone_footprints WHERE geometry IS NOT NULL
+    UNION ALL
+    SELECT 'bridge_footprints', gmlid, ST_Transform(geometry, 6677)
+    FROM citydb.bridge_footprints WHERE geometry IS NOT NULL
+    UNION ALL
+    SELECT 'furniture_footprints', gmlid, ST_Transform(geometry, 6677)
+    FROM citydb.furniture_footprints WHERE geometry IS NOT NULL
+    UNION ALL
+    SELECT 'vegetation_footprints', gmlid, ST_Transform(geometry, 6677)
+    FROM citydb.vegetation_footprints WHERE geometry IS NOT NULL
+) f
+CROSS JOIN (VALUES (1, 0.5, 1.0), (2, 1.0, 4.0), (3, 2.5, 25.0)) AS l(level, tolerance, min_area)
+WHERE ST_Area(f.g) >= l.min_area;
+
+CREATE INDEX ON citydb.footprint_generalized USING GIST (geometry);
+
+ANALYZE citydb.footprint_generalized;
+
+SELECT layer, level, COUNT(*) AS features
+FROM citydb.footprint_generalized
+GROUP BY layer, level
+ORDER BY layer, level;
@@ -0,0 +1,77 @@
+-- Migration 010: Building statistics binned on a square grid (low-zoom tiles)
+--
+-- Per resolution, every EPSG:6677 grid cell holding at least one building
+-- centroid: building count, height sum / count over buildings with a measured
+-- height, and a {usage: count} histogram (usage NULL → "unknown"). Served as
+-- the building_bins tile layer; dominant usage and mean height are derived at
+-- render time (app/services/bins.py).
+--
+--   resolution  cell    zooms
+--   1           1000 m  <= 11
+--   2           500 m   12
+--   3           250 m   13
+--   4           100 m   >= 14
+--
+-- Built in bulk here; afterwards app/database_write.py moves single buildings
+-- between bins as their footprint rows are updated or deleted. The resolutions
+-- must stay in sync with BIN_SIZES in app/services/bins.py.
+--
+-- Run after 002 (re-run after a full re-import):
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/010_building_bins.sql
+
+DROP TABLE IF EXISTS citydb.building_bins;
+
+CREATE TABLE citydb.building_bins (
+    resolution     smallint                NOT NULL,
+    i              integer                 NOT NULL,
+    j              integer                 NOT NULL,
+    building_count integer                 NOT NULL,
+    height_count   integer                 NOT NULL,
+    height_sum     double precision        NOT NULL,
+    usage_counts   jsonb                   NOT NULL,
+    geometry       geometry(Polygon, 4326) NOT NULL,
+    PRIMARY KEY (resolution, i, j)
+);
+
+WITH centroids AS (
+    SELECT ST_Transform(ST_Centroid(geometry), 6677) AS p,
+           measured_height::float8                   AS h,
+           COALESCE(usage, 'unknown')                AS u
+    FROM citydb.building_footprints
+    WHERE geometry IS NOT NULL
+),
+cells AS (
+    SELECT r.resolution, r.size,
+           floor(ST_X(c.p) / r.size)::int AS i,
+           floor(ST_Y(c.p) / r.size)::int AS j,
+           c.h, c.u
+    FROM centroids c
+    CROSS JOIN (VALUES (1, 1000.0), (2, 500.0), (3, 250.0), (4, 100.0)) AS r(resolution, size)
+),
+usage_per_cell AS (
+    SELECT resolution, i, j, jsonb_object_agg(u, n) AS usage_counts
+    FROM (SELECT resolution, i, j, u, COUNT(*) AS n FROM cells GROUP BY resolution, i, j, u) t
+    GROUP BY resolution, i, j
+)
+INSERT INTO citydb.building_bins
+SELECT c.resolution, c.i, c.j,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE c.h > 0),
+       COALESCE(SUM(c.h) FILTER (WHERE c.h > 0), 0),
+       u.usage_counts,
+       ST_Transform(ST_MakeEnvelope(
+           c.i * c.size, c.j * c.size, (c.i + 1) * c.size, (c.j + 1) * c.size, 6677
+       ), 4326)
+FROM cells c
+JOIN usage_per_cell u USING (resolution, i, j)
+GROUP BY c.resolution, c.size, c.i, c.j, u.usage_counts;
+
+CREATE INDEX ON citydb.building_bins USING GIST (geometry);
+
+ANALYZE citydb.building_bins;
+
+SELECT resolution, COUNT(*) AS bins, SUM(building_count) AS buildings
+FROM citydb.building_bins
+GROUP BY resolution
+ORDER BY resolution;
@@ -0,0 +1,27 @@
+-- Migration 011: Per-feature hashes of the last imported PLATEAU release
+--
+-- The diff importer (app/services/diff_import.py) compares a new release's
+-- CityGML against these hashes, not against the live tables, so features that
+-- were edited locally but did not change upstream are left alone.
+--
+--   mesh        PLATEAU mesh code of the source file (53394611_bldg_…gml → 53394611);
+--               deletions are only inferred within the meshes being imported
+--   attr_hash   sha1 of the feature's attributes (name, class, usage, height, storeys)
+--   geom_hash   sha1 of its LOD1 solid and LOD2 thematic surface coordinates
+--
+-- Filled by the first run with --baseline against the release that is loaded
+-- today, then kept up to date by every diff import.
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/011_import_feature_hashes.sql
+
+CREATE TABLE IF NOT EXISTS citydb.import_feature_hashes (
+    gmlid        varchar     PRIMARY KEY,
+    mesh         varchar     NOT NULL,
+    attr_hash    char(40)    NOT NULL,
+    geom_hash    char(40)    NOT NULL,
+    source_tag   varchar     NOT NULL,
+    imported_at  timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS import_feature_hashes_mesh_idx ON citydb.import_feature_hashes (mesh);
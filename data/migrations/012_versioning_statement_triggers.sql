@@ -0,0 +1,240 @@
+-- Migration 012: Set-based versioning triggers + import-session switch
+--
+-- Replaces the FOR EACH ROW triggers of migration 005 (one cityobject lookup and
+-- one feature_versions insert per imported row) with FOR EACH STATEMENT triggers
+-- that read the statement's transition table and write all v1 records in one
+-- INSERT … SELECT.
+--
+-- Two settings control the triggers (unset = previous behaviour):
+--
+--   citydb.versioning   'deferred' → triggers write nothing; run
+--                       SELECT citydb.fv_backfill_versions('<tag>') after the load
+--   citydb.source_tag   source_tag of trigger-written versions (default 'PLATEAU-2024')
+--
+-- Per session:   SET citydb.versioning = 'deferred';
+-- For a client that cannot set session options (the 3DCityDB importer),
+-- run-import.sh sets them on the database for the duration of the load.
+--
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/012_versioning_statement_triggers.sql
+
+-- ── 1. Settings ──────────────────────────────────────────────────────────────
+
+CREATE OR REPLACE FUNCTION citydb.fv_versioning_deferred()
+RETURNS boolean LANGUAGE sql STABLE AS $$
+    SELECT COALESCE(current_setting('citydb.versioning', true), '') = 'deferred'
+$$;
+
+CREATE OR REPLACE FUNCTION citydb.fv_source_tag()
+RETURNS varchar LANGUAGE sql STABLE AS $$
+    SELECT COALESCE(NULLIF(current_setting('citydb.source_tag', true), ''), 'PLATEAU-2024')
+$$;
+
+-- ── 2. Statement trigger functions ───────────────────────────────────────────
+-- new_rows is the transition table of the firing INSERT statement.
+
+CREATE OR REPLACE FUNCTION citydb.fv_insert_building_stmt()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF citydb.fv_versioning_deferred() THEN
+        RETURN NULL;
+    END IF;
+    INSERT INTO citydb.feature_versions
+        (gmlid, version, status, source_tag, change_type, attributes)
+    SELECT
+        co.gmlid, 1, 'current', citydb.fv_source_tag(), 'import',
+        jsonb_build_object(
+            'measured_height',      n.measured_height,
+            'storeys_above_ground', n.storeys_above_ground,
+            'usage',                n.usage,
+            'class',                n.class,
+            'has_lod1',             (n.lod1_solid_id IS NOT NULL),
+            'has_lod2',             (n.lod2_solid_id IS NOT NULL)
+        )
+    FROM new_rows n
+    JOIN citydb.cityobject co ON co.id = n.id
+    WHERE n.building_root_id = n.id
+    ON CONFLICT (gmlid, version) DO NOTHING;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION citydb.fv_insert_bridge_stmt()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF citydb.fv_versioning_deferred() THEN
+        RETURN NULL;
+    END IF;
+    INSERT INTO citydb.feature_versions
+        (gmlid, version, status, source_tag, change_type, attributes)
+    SELECT
+        co.gmlid, 1, 'current', citydb.fv_source_tag(), 'import',
+        jsonb_build_object(
+            'class',    n.class,
+            'function', n.function,
+            'usage',    n.usage,
+            'has_lod1', (n.lod1_solid_id IS NOT NULL)
+        )
+    FROM new_rows n
+    JOIN citydb.cityobject co ON co.id = n.id
+    ON CONFLICT (gmlid, version) DO NOTHING;
+    RETURN NULL;
+END;
+$$;
+
+-- Shared by the six tables whose v1 snapshot is class / function / usage.
+-- PL/pgSQL caches a separate plan per trigger table, so one function serves all.
+CREATE OR REPLACE FUNCTION citydb.fv_insert_feature_stmt()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF citydb.fv_versioning_deferred() THEN
+        RETURN NULL;
+    END IF;
+    INSERT INTO citydb.feature_versions
+        (gmlid, version, status, source_tag, change_type, attributes)
+    SELECT
+        co.gmlid, 1, 'current', citydb.fv_source_tag(), 'import',
+        jsonb_build_object(
+            'class',    n.class,
+            'function', n.function,
+            'usage',    n.usage
+        )
+    FROM new_rows n
+    JOIN citydb.cityobject co ON co.id = n.id
+    ON CONFLICT (gmlid, version) DO NOTHING;
+    RETURN NULL;
+END;
+$$;
+
+-- ── 3. Swap the triggers ─────────────────────────────────────────────────────
+
+DROP TRIGGER IF EXISTS trg_fv_building ON citydb.building;
+CREATE TRIGGER trg_fv_building
+    AFTER INSERT ON citydb.building
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION citydb.fv_insert_building_stmt();
+
+DROP TRIGGER IF EXISTS trg_fv_bridge ON citydb.bridge;
+CREATE TRIGGER trg_fv_bridge
+    AFTER INSERT ON citydb.bridge
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION citydb.fv_insert_bridge_stmt();
+
+DROP TRIGGER IF EXISTS trg_fv_city_furniture ON citydb.city_furniture;
+CREATE TRIGGER trg_fv_city_furniture
+    AFTER INSERT ON citydb.city_furniture
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION citydb.fv_insert_feature_stmt();
+
+DROP TRIGGER IF EXISTS trg_fv_plant_cover ON citydb.plant_cover;
+CREATE TRIGGER trg_fv_plant_cover
+    AFTER INSERT ON citydb.plant_cover
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION citydb.fv_insert_feature_stmt();
+
+DROP TRIGGER IF EXISTS trg_fv_solitary_veg ON citydb.solitary_vegetat_object;
+CREATE TRIGGER trg_fv_solitary_veg
+    AFTER INSERT ON citydb.solitary_vegetat_object
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION citydb.fv_insert_feature_stmt();
+
+DROP TRIGGER IF EXISTS trg_fv_land_use ON citydb.land_use;
+CREATE TRIGGER trg_fv_land_use
+    AFTER INSERT ON citydb.land_use
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION citydb.fv_insert_feature_stmt();
+
+DROP TRIGGER IF EXISTS trg_fv_transportation ON citydb.transportation_complex;
+CREATE TRIGGER trg_fv_transportation
+    AFTER INSERT ON citydb.transportation_complex
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION citydb.fv_insert_feature_stmt();
+
+DROP TRIGGER IF EXISTS trg_fv_waterbody ON citydb.waterbody;
+CREATE TRIGGER trg_fv_waterbody
+    AFTER INSERT ON citydb.waterbody
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION citydb.fv_insert_feature_stmt();
+
+DROP FUNCTION IF EXISTS citydb.fv_insert_building();
+DROP FUNCTION IF EXISTS citydb.fv_insert_bridge();
+DROP FUNCTION IF EXISTS citydb.fv_insert_city_furniture();
+DROP FUNCTION IF EXISTS citydb.fv_insert_plant_cover();
+DROP FUNCTION IF EXISTS citydb.fv_insert_solitary_veg();
+DROP FUNCTION IF EXISTS citydb.fv_insert_land_use();
+DROP FUNCTION IF EXISTS citydb.fv_insert_transportation();
+DROP FUNCTION IF EXISTS citydb.fv_insert_waterbody();
+
+-- ── 4. Post-load pass for deferred sessions ──────────────────────────────────
+-- Writes v1 for every feature that has no version history yet, one INSERT per
+-- feature table. Returns the number of versions written.
+
+CREATE OR REPLACE FUNCTION citydb.fv_backfill_versions(p_source_tag varchar DEFAULT NULL)
+RETURNS bigint LANGUAGE plpgsql AS $$
+DECLARE
+    tag   varchar := COALESCE(p_source_tag, citydb.fv_source_tag());
+    total bigint  := 0;
+    n     bigint;
+    tbl   text;
+BEGIN
+    INSERT INTO citydb.feature_versions
+        (gmlid, version, status, source_tag, change_type, attributes, changed_at)
+    SELECT
+        co.gmlid, 1, 'current', tag, 'import',
+        jsonb_build_object(
+            'measured_height',      b.measured_height,
+            'storeys_above_ground', b.storeys_above_ground,
+            'usage',                b.usage,
+            'class',                b.class,
+            'has_lod1',             (b.lod1_solid_id IS NOT NULL),
+            'has_lod2',             (b.lod2_solid_id IS NOT NULL)
+        ),
+        COALESCE(co.creation_date, now())
+    FROM citydb.building b
+    JOIN citydb.cityobject co ON co.id = b.id
+    WHERE b.building_root_id = b.id
+      AND NOT EXISTS (SELECT 1 FROM citydb.feature_versions fv WHERE fv.gmlid = co.gmlid)
+    ON CONFLICT (gmlid, version) DO NOTHING;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    total := total + n;
+
+    INSERT INTO citydb.feature_versions
+        (gmlid, version, status, source_tag, change_type, attributes, changed_at)
+    SELECT
+        co.gmlid, 1, 'current', tag, 'import',
+        jsonb_build_object(
+            'class',    br.class,
+            'function', br.function,
+            'usage',    br.usage,
+            'has_lod1', (br.lod1_solid_id IS NOT NULL)
+        ),
+        COALESCE(co.creation_date, now())
+    FROM citydb.bridge br
+    JOIN citydb.cityobject co ON co.id = br.id
+    WHERE NOT EXISTS (SELECT 1 FROM citydb.feature_versions fv WHERE fv.gmlid = co.gmlid)
+    ON CONFLICT (gmlid, version) DO NOTHING;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    total := total + n;
+
+    FOREACH tbl IN ARRAY ARRAY['city_furniture', 'plant_cover', 'solitary_vegetat_object',
+                               'land_use', 'transportation_complex', 'waterbody'] LOOP
+        EXECUTE format($sql$
+            INSERT INTO citydb.feature_versions
+                (gmlid, version, status, source_tag, change_type, attributes, changed_at)
+            SELECT
+                co.gmlid, 1, 'current', $1, 'import',
+                jsonb_build_object('class', t.class, 'function', t.function, 'usage', t.usage),
+                COALESCE(co.creation_date, now())
+            FROM citydb.%I t
+            JOIN citydb.cityobject co ON co.id = t.id
+            WHERE NOT EXISTS (SELECT 1 FROM citydb.feature_versions fv WHERE fv.gmlid = co.gmlid)
+            ON CONFLICT (gmlid, version) DO NOTHING
+        $sql$, tbl) USING tag;
+        GET DIAGNOSTICS n = ROW_COUNT;
+        total := total + n;
+    END LOOP;
+
+    RETURN total;
+END;
+$$;
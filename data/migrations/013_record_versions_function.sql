@@ -0,0 +1,88 @@
+-- Migration 013: One-statement version recording
+--
+-- citydb.fv_record_versions() archives the current versions, assigns the next
+-- version numbers and inserts the new records for any number of features in a
+-- single call, replacing the lock / archive / MAX+1 / insert round trips of
+-- services/versioning.py. Arrays are parallel, one element per change; a gmlid
+-- may appear more than once (its changes are numbered in array order and only
+-- the last one stays current). Each returned row carries ord, the 1-based
+-- position of its change in the arrays; callers match results by ord, since
+-- the row order of the result is not guaranteed.
+--
+--   SELECT * FROM citydb.fv_record_versions(
+--       ARRAY['bldg_1', 'bldg_2'], ARRAY['attr_update', 'delete'],
+--       ARRAY['{"usage": "411"}', '{}']::jsonb[], 'manual-edit', NULL);
+--
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/013_record_versions_function.sql
+
+-- Earlier revisions returned (gmlid, version); the result type cannot be replaced
+DROP FUNCTION IF EXISTS citydb.fv_record_versions(varchar[], varchar[], jsonb[], varchar, varchar);
+
+CREATE OR REPLACE FUNCTION citydb.fv_record_versions(
+    p_gmlids       varchar[],
+    p_change_types varchar[],
+    p_attributes   jsonb[],
+    p_source_tag   varchar DEFAULT 'manual-edit',
+    p_note         varchar DEFAULT NULL
+)
+RETURNS TABLE (ord bigint, gmlid varchar, version int)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+    -- Serialize version assignment per feature (same key as the old
+    -- pg_advisory_xact_lock(hashtext(gmlid), 0)); sorted so that two batches
+    -- touching the same features cannot deadlock.
+    PERFORM pg_advisory_xact_lock(hashtext(g), 0)
+    FROM (SELECT DISTINCT g FROM unnest(p_gmlids) AS g ORDER BY g) locks;
+
+    UPDATE citydb.feature_versions fv
+    SET status = 'archived'
+    WHERE fv.gmlid = ANY(p_gmlids) AND fv.status = 'current';
+
+    RETURN QUERY
+    WITH changes AS (
+        SELECT c.gmlid, c.change_type, c.attributes, c.ord,
+               row_number() OVER (PARTITION BY c.gmlid ORDER BY c.ord)      AS seq,
+               row_number() OVER (PARTITION BY c.gmlid ORDER BY c.ord DESC) AS from_last
+        FROM unnest(p_gmlids, p_change_types, p_attributes)
+             WITH ORDINALITY AS c(gmlid, change_type, attributes, ord)
+    ),
+    latest AS (
+        SELECT fv.gmlid, max(fv.version) AS version
+        FROM citydb.feature_versions fv
+        WHERE fv.gmlid = ANY(p_gmlids)
+        GROUP BY fv.gmlid
+    ),
+    numbered AS (
+        SELECT c.*, COALESCE(l.version, 0) + c.seq AS new_version
+        FROM changes c
+        LEFT JOIN latest l ON l.gmlid = c.gmlid
+    ),
+    inserted AS (
+        INSERT INTO citydb.feature_versions AS fv
+            (gmlid, version, status, source_tag, change_type, attributes, change_note)
+        SELECT
+            n.gmlid,
+            n.new_version,
+            CASE
+                WHEN n.from_last > 1            THEN 'archived'
+                WHEN n.change_type = 'delete'   THEN 'deleted'
+                ELSE 'current'
+            END,
+            p_source_tag,
+            n.change_type,
+            n.attributes,
+            p_note
+        FROM numbered n
+        ORDER BY n.ord
+        RETURNING fv.gmlid, fv.version
+    )
+    -- (gmlid, version) is unique, so it maps each inserted row back to its change
+    SELECT n.ord, i.gmlid, i.version
+    FROM inserted i
+    JOIN numbered n ON n.gmlid = i.gmlid AND n.new_version = i.version
+    ORDER BY n.ord;
+END;
+$$;
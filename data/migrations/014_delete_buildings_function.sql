@@ -0,0 +1,66 @@
+-- Migration 014: Set-based cascade delete of buildings
+--
+-- citydb.delete_buildings(ids) removes any number of root buildings with
+-- everything hanging off them, in a fixed number of statements:
+-- geometry (LOD solids and thematic surface multi-surfaces), thematic surfaces
+-- and their cityobjects, generic attributes, address links, the cached LOD2
+-- encodings, the building rows and their cityobjects. Returns the number of
+-- buildings deleted. Versioning and the footprint table are left to the caller
+-- (app/database_write.py). Call inside a transaction.
+--
+--   SELECT citydb.delete_buildings(ARRAY[101, 102, 103]);
+--
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/014_delete_buildings_function.sql
+
+CREATE OR REPLACE FUNCTION citydb.delete_buildings(p_ids bigint[])
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    ts_ids   bigint[];
+    root_ids bigint[];
+    deleted  integer;
+BEGIN
+    SELECT COALESCE(array_agg(id), '{}') INTO ts_ids
+    FROM citydb.thematic_surface
+    WHERE building_id = ANY(p_ids);
+
+    -- Geometry roots: the building's solids plus its surfaces' multi-surfaces
+    SELECT COALESCE(array_agg(DISTINCT r), '{}') INTO root_ids
+    FROM (
+        SELECT unnest(ARRAY[lod0_footprint_id, lod0_roofprint_id, lod1_solid_id,
+                            lod2_solid_id, lod3_solid_id, lod4_solid_id]) AS r
+        FROM citydb.building WHERE id = ANY(p_ids)
+        UNION ALL
+        SELECT unnest(ARRAY[lod2_multi_surface_id, lod3_multi_surface_id, lod4_multi_surface_id])
+        FROM citydb.thematic_surface WHERE id = ANY(ts_ids)
+    ) roots
+    WHERE r IS NOT NULL;
+
+    DELETE FROM citydb.building_lod2_cache c
+    USING citydb.cityobject co
+    WHERE co.id = ANY(p_ids) AND c.gmlid = co.gmlid;
+
+    -- Break FKs into surface_geometry, then drop the geometry trees
+    UPDATE citydb.building
+    SET lod0_footprint_id = NULL, lod0_roofprint_id = NULL,
+        lod1_solid_id = NULL, lod2_solid_id = NULL,
+        lod3_solid_id = NULL, lod4_solid_id = NULL
+    WHERE id = ANY(p_ids);
+
+    DELETE FROM citydb.thematic_surface WHERE id = ANY(ts_ids);
+
+    DELETE FROM citydb.surface_geometry
+    WHERE root_id = ANY(root_ids)
+       OR cityobject_id = ANY(p_ids || ts_ids);
+
+    DELETE FROM citydb.cityobject_genericattrib WHERE cityobject_id = ANY(p_ids || ts_ids);
+    DELETE FROM citydb.address_to_building WHERE building_id = ANY(p_ids);
+    DELETE FROM citydb.building WHERE id = ANY(p_ids);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    DELETE FROM citydb.cityobject WHERE id = ANY(p_ids || ts_ids);
+
+    RETURN deleted;
+END;
+$$;
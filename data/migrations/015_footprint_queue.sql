@@ -0,0 +1,25 @@
+-- Migration 015: Durable queue of buildings whose footprint row needs recomputing
+--
+-- Building edits insert their gmlids here inside the edit transaction, so a
+-- committed edit can never leave building_footprints out of step: the row stays
+-- queued until a worker (app/services/footprint_queue.py) has recomputed the
+-- footprint and dequeued it in one transaction.
+--
+--   gmlid         one row per building; repeated edits coalesce into it
+--   geometry      true if any queued edit touched LOD1 geometry (re-union needed);
+--                 attribute-only edits are applied without re-unioning faces
+--   enqueued_at   first unprocessed edit; now() - min(enqueued_at) is the queue lag
+--
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/015_footprint_queue.sql
+
+CREATE TABLE IF NOT EXISTS citydb.footprint_queue (
+    gmlid        varchar     PRIMARY KEY,
+    geometry     boolean     NOT NULL DEFAULT true,
+    enqueued_at  timestamptz NOT NULL DEFAULT now(),
+    attempts     integer     NOT NULL DEFAULT 0,
+    last_error   text
+);
+
+CREATE INDEX IF NOT EXISTS footprint_queue_enqueued_at_idx ON citydb.footprint_queue (enqueued_at);
@@ -0,0 +1,25 @@
+-- Migration 016: Commit-safe delta sync over citydb.feature_versions (GET /api/changes)
+--
+--   xact_id   id of the transaction that wrote the row (pg_current_xact_id()).
+--             Every transaction below pg_snapshot_xmin(pg_current_snapshot())
+--             has finished, so the rows under that horizon can no longer change
+--             and GET /api/changes pages through them by (xact_id, id) without
+--             ever skipping a late commit. Rows written before this migration
+--             read as 0 (the constant default does not rewrite the table).
+--
+-- The (changed_at, id) index lets a client without a watermark start from a
+-- timestamp: the oldest transaction with rows changed at or after it is found
+-- from an index range scan.
+--
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/016_feature_versions_changed_at_index.sql
+
+ALTER TABLE citydb.feature_versions ADD COLUMN IF NOT EXISTS xact_id xid8 NOT NULL DEFAULT '0';
+ALTER TABLE citydb.feature_versions ALTER COLUMN xact_id SET DEFAULT pg_current_xact_id();
+
+CREATE INDEX IF NOT EXISTS feature_versions_xact_id_idx
+    ON citydb.feature_versions (xact_id, id);
+
+CREATE INDEX IF NOT EXISTS feature_versions_changed_at_id_idx
+    ON citydb.feature_versions (changed_at, id);
@@ -0,0 +1,27 @@
+-- Migration 017: Unique indexes on the static layer materialized views
+--
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index on the view.
+-- With these in place, the background refresh after a feature PATCH
+-- (app/services/static_tiles.py) no longer takes an ACCESS EXCLUSIVE lock, so
+-- tile reads of the layer are not blocked while the view is recomputed.
+-- Re-run after re-creating the views (migrations 002/003).
+--
+-- Run with:
+--   docker exec -i 3dcitydb-pg psql -U citydb -d citydb \
+--     < data/migrations/017_static_layer_unique_indexes.sql
+
+-- Databases migrated before 009 created these as unique still carry its plain
+-- *_gmlid_idx indexes; the unique ones below serve the same lookups.
+DROP INDEX IF EXISTS citydb.land_use_footprints_gmlid_idx;
+DROP INDEX IF EXISTS citydb.road_footprints_gmlid_idx;
+DROP INDEX IF EXISTS citydb.flood_zone_footprints_gmlid_idx;
+DROP INDEX IF EXISTS citydb.bridge_footprints_gmlid_idx;
+DROP INDEX IF EXISTS citydb.furniture_footprints_gmlid_idx;
+DROP INDEX IF EXISTS citydb.vegetation_footprints_gmlid_idx;
+
+CREATE UNIQUE INDEX IF NOT EXISTS land_use_footprints_gmlid_uidx    ON citydb.land_use_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS road_footprints_gmlid_uidx        ON citydb.road_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS flood_zone_footprints_gmlid_uidx  ON citydb.flood_zone_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS bridge_footprints_gmlid_uidx      ON citydb.bridge_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS furniture_footprints_gmlid_uidx   ON citydb.furniture_footprints (gmlid);
+CREATE UNIQUE INDEX IF NOT EXISTS vegetation_footprints_gmlid_uidx  ON citydb.vegetation_footprints (gmlid);